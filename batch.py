@@ -0,0 +1,118 @@
+import argparse
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# generates many maps headlessly across a process pool, e.g.
+#   python batch.py --seeds 0-63
+#   python batch.py --seeds 0-9 --params params.json
+# where params.json holds a list of MapSettings keyword dicts, every seed is run with every set
+
+
+def parseSeeds(text):
+    '''"0-9", "3,7,11" or a mix like "0-3,10" -> list of ints'''
+    seeds = []
+    for part in text.split(','):
+        if '-' in part:
+            start, end = part.split('-')
+            seeds.extend(range(int(start), int(end)+1))
+        else:
+            seeds.append(int(part))
+    return seeds
+
+
+def generateOne(seed, params, filename, cacheDir=None, profile=False, world=False):
+    '''runs autoGenerate for one seed and parameter set in a worker process,
+    with profile a cProfile and tracemalloc report is written next to the PNG,
+    with world a world file (see worldfile.py)'''
+    from mapclasses import MapSettings
+    from mapengine import MapEngine
+    from stagecache import StageCache
+    from worldfile import saveWorld
+
+    startTime = time.time()
+    params = dict(params)
+    settings = MapSettings(params.pop('map_width', 1000), params.pop('win_height', 750), **params)
+    engine = MapEngine(settings, seed)
+    profiler = engine.profiler
+    if profile:
+        profiler.startCapture(memory=True)
+    engine.autoGenerate(StageCache(cacheDir) if cacheDir is not None else None)
+    # the write runs in the background, the worker only reports back once the file exists
+    with profiler.span('write'):
+        engine.export(filename).result()
+    if world:
+        with profiler.span('world'):
+            saveWorld(engine, os.path.splitext(filename)[0] + '.world')
+    if profile:
+        profiler.stopCapture()
+        profiler.writeReport(os.path.splitext(filename)[0] + '.json', seed=seed, params=params)
+
+    report = profiler.getReport()
+    return {'timings': engine.timings, 'spans': report['spans'], 'counters': report['counters'],
+            'total': time.time()-startTime}
+
+
+def runBatch(seeds, paramSets=None, outputDir='export', workers=None, cacheDir=None, profile=False, world=False):
+    '''generates every seed with every parameter set and writes the PNGs plus a manifest
+
+    returns the manifest entries, one per map, with its parameters and timings,
+    with a cacheDir the stages a parameter sweep shares are only generated once per seed
+    '''
+
+    if paramSets is None:
+        paramSets = [{}]
+    if workers is None:
+        workers = os.cpu_count() or 1
+
+    os.makedirs(outputDir, exist_ok=True)
+    stamp = time.strftime("%Y-%m-%d_%H-%M-%S")
+
+    jobs = []
+    for setIndex, params in enumerate(paramSets):
+        for seed in seeds:
+            filename = os.path.join(outputDir, f'map-generator_{stamp}_set{setIndex}_seed{seed}.png')
+            jobs.append({'seed': seed, 'paramSet': setIndex, 'params': params, 'filename': filename})
+
+    startTime = time.time()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(generateOne, job['seed'], job['params'], job['filename'], cacheDir, profile, world): job for job in jobs}
+        for future in as_completed(futures):
+            job = futures[future]
+            try:
+                job.update(future.result())
+            except Exception as error:
+                job['error'] = repr(error)
+            print(f"{job['filename']}: {job.get('total', job.get('error'))}")
+
+    manifest = {'created': stamp, 'workers': workers, 'wallTime': time.time()-startTime, 'maps': jobs}
+    manifestName = os.path.join(outputDir, f'map-generator_{stamp}_manifest.json')
+    with open(manifestName, 'w') as file:
+        json.dump(manifest, file, indent=2)
+
+    print(f'Wrote {len(jobs)} maps and {manifestName} in {manifest["wallTime"]:.1f}s')
+    return jobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description='generate a batch of maps without a window')
+    parser.add_argument('--seeds', default='0-7', help='seeds to generate, e.g. 0-99 or 1,5,9')
+    parser.add_argument('--params', help='json file with a list of MapSettings keyword dicts')
+    parser.add_argument('--output', default='export', help='directory for the PNGs and the manifest')
+    parser.add_argument('--workers', type=int, default=None, help='processes to use, defaults to the core count')
+    parser.add_argument('--cache', help='directory for cached stage outputs, off by default')
+    parser.add_argument('--profile', action='store_true', help='write a cProfile and memory report per map')
+    parser.add_argument('--world', action='store_true', help='also save every world, to restyle or export it later')
+    args = parser.parse_args()
+
+    paramSets = None
+    if args.params is not None:
+        with open(args.params) as file:
+            paramSets = json.load(file)
+
+    runBatch(parseSeeds(args.seeds), paramSets, args.output, args.workers, args.cache, args.profile, args.world)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,320 @@
+import argparse
+import copy
+import json
+import os
+import platform
+import random
+import subprocess
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import pygame
+from mapclasses import Graph, Line, LinePartition, MapSettings
+from mapengine import MapEngine
+from worldfile import readWorld, saveWorld
+
+# times the hot paths of the generator across map sizes and node counts, headless and
+# with fixed seeds, and appends the results to a JSON history (export/benchmark-history.json
+# by default) to compare commits, e.g.
+#   python benchmark.py                  full sweep, compared with the last entry
+#   python benchmark.py --quick          two small maps only
+#   python benchmark.py --cases refine   only the cases whose name starts with refine
+# Every case reports the best of a few runs and the peak Python/numpy memory of one more.
+
+# (scale, density): a scale s map is 1000s x 750s, at density 85 it holds about 566 s^2 nodes
+sweep = [(0.5, 85), (1, 85), (2, 85), (4, 85), (1, 170), (1, 340)]
+quickSweep = [(0.5, 85), (1, 85)]
+
+refineShapes = ['dot', 'square', 'triangle', 'water', 'blur', 'black-white']
+
+# amount of queries, tests and calls per run of the cases that sample
+queries = 2000
+
+
+def getSettings(scale, density):
+    width, height = int(1000*scale), int(750*scale)
+    # getNumPoints divides by the area, the coefficient grows with its square so the
+    # node count grows with the area and density keeps meaning nodes per area
+    return MapSettings(width, height, density=density, density_coefficient=5*10**6*scale**4)
+
+
+def buildEngine(settings, seed, indexed=False):
+    '''an engine with nodes, continents and coast distance, the state most cases start from'''
+    engine = MapEngine(settings, seed, indexed)
+    engine.seedStage('nodes')
+    engine.generateNodes()
+    engine.seedStage('continents')
+    engine.generateMultipleContinents()
+    engine.world.getCoastDistance()
+    return engine
+
+
+def getRandomPoints(rng, amount, width, height):
+    return [(rng.randint(0, width), rng.randint(0, height)) for _ in range(amount)]
+
+
+# every case takes the prepared engine and returns (setup, run), only run is timed,
+# setup runs before each repetition so every run starts from the same state
+
+def caseFill(engine):
+    graph = Graph(engine.world.graph.size, rng=random.Random(0))
+    return (lambda: (graph.reset(), graph.rng.seed(0)),
+            lambda: graph.fillMatrixRandom(0, 0, engine.width, engine.height))
+
+
+def casePartition(engine):
+    graph = engine.world.graph
+    length = engine.settings.getMaximumLength()
+    return None, lambda: graph.partition(0, engine.width, length, 0, engine.height, length)
+
+
+def caseCloseIds(engine):
+    graph = engine.world.graph
+    ids = graph.getActiveIds()[np.random.default_rng(0).integers(0, graph.nextIndex, size=queries)].tolist()
+    return None, lambda: [graph.getCloseIds(id) for id in ids]
+
+
+def caseAddLine(engine):
+    length = engine.settings.getMaximumLength()
+    segments = engine.world.lines.getSegments().tolist()
+    store = {}
+
+    def setup():
+        store['lines'] = LinePartition(0, engine.width, int(length*1.5), 0, engine.height, int(length*1.5))
+
+    def run():
+        partition = store['lines']
+        for x1, y1, x2, y2 in segments:
+            partition.addSegment((x1, y1), (x2, y2))
+    return setup, run
+
+
+def caseAddSegments(engine):
+    length = engine.settings.getMaximumLength()
+    segments = engine.world.lines.getSegments().copy()
+    store = {}
+
+    def setup():
+        store['lines'] = LinePartition(0, engine.width, int(length*1.5), 0, engine.height, int(length*1.5))
+    def run():
+        store['lines'].addSegments(segments[:, :2], segments[:, 2:])
+        store['lines'].indexCells()
+    return setup, run
+
+
+def caseCloseLines(engine):
+    points = getRandomPoints(random.Random(0), queries, engine.width, engine.height)
+    lines = engine.world.lines
+    return None, lambda: [lines.getCloseLines(point) for point in points]
+
+
+def caseCloseLineIds(engine):
+    points = getRandomPoints(random.Random(0), queries, engine.width, engine.height)
+    lines = engine.world.lines
+    return None, lambda: [lines.getCloseLineIds(point) for point in points]
+
+
+def caseIntersecting(engine):
+    rng = random.Random(0)
+    length = engine.settings.getMaximumLength()
+    pairs = []
+    for _ in range(queries*5):
+        x, y = rng.randint(0, engine.width), rng.randint(0, engine.height)
+        pairs.append((Line((x, y), (x+rng.randint(-length, length), y+rng.randint(-length, length))),
+                      Line((x+rng.randint(-length, length), y), (x, y+rng.randint(-length, length)))))
+    return None, lambda: [first.isIntersecting(second) for first, second in pairs]
+
+
+def caseEdges(engine):
+    '''the generateNodes edge loop on the engine's nodes'''
+    settings = engine.settings
+    world = engine.world
+    length = settings.getMaximumLength()
+
+    def setup():
+        world.graph.clearConnections()
+        world.clearLines(0, engine.width, length, 0, engine.height, length)
+        world.graph.partition(0, engine.width, length, 0, engine.height, length)
+    return setup, engine.connectGreedy
+
+
+def caseContinents(engine):
+    def setup():
+        engine.clearContinents()
+        engine.seedStage('continents')
+
+    def run():
+        for _ in range(engine.settings.getNumContinents()):
+            engine.generateContinent()
+    return setup, run
+
+
+def caseWaterDepth(engine):
+    rng = random.Random(0)
+    points = getRandomPoints(rng, queries*5, engine.width-1, engine.height-1)
+
+    def run():
+        for x, y in points:
+            engine.waterDepth(x, y, [0, 0, 0])
+    return None, run
+
+
+def caseRefine(shape):
+    def case(engine):
+        def setup():
+            engine.seedStage('refine')
+            engine.redraw()
+        return setup, lambda: engine.refine(shape, 1500)
+    return case
+
+
+def casePalette(engine):
+    '''a palette swap of a rendered indexed map, no redraw or refine'''
+    # its own settings and world, swapping palettes changes both
+    indexed = buildEngine(copy.copy(engine.settings), engine.seedValue, indexed=True)
+    indexed.updateColor()
+    indexed.seedStage('refine')
+    indexed.redraw()
+    indexed.refine('dot', 1500)
+    palettes = list(engine.settings.palettes)
+
+    def run():
+        for palette in palettes:
+            indexed.setPalette(palette)
+    return None, run
+
+
+def caseWorldLoad(engine):
+    '''reading a saved world without its pixels into an engine of the same size'''
+    filename = os.path.join(tempfile.mkdtemp(), 'benchmark.world')
+    saveWorld(engine, filename, raster=False)
+    loaded = MapEngine(engine.settings, engine.seedValue)
+    return None, lambda: loaded.restoreWorld(*readWorld(filename))
+
+
+cases = {
+    'graph.fillMatrixRandom': caseFill,
+    'graph.partition': casePartition,
+    'graph.getCloseIds': caseCloseIds,
+    'lines.addLine': caseAddLine,
+    'lines.addSegments': caseAddSegments,
+    'lines.getCloseLines': caseCloseLines,
+    'lines.getCloseLineIds': caseCloseLineIds,
+    'line.isIntersecting': caseIntersecting,
+    'nodes.edges': caseEdges,
+    'continents.generate': caseContinents,
+    'waterDepth': caseWaterDepth,
+    'palette.indexed': casePalette,
+    'world.load': caseWorldLoad,
+}
+for shape in refineShapes:
+    cases[f'refine.{shape}'] = caseRefine(shape)
+
+
+def measure(setup, run, repeat):
+    '''best time of repeat runs and the peak traced memory of one more'''
+    best = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        startTime = time.perf_counter()
+        run()
+        seconds = time.perf_counter()-startTime
+        best = seconds if best is None else min(best, seconds)
+
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return best, peak
+
+
+def runBenchmarks(configs, names, repeat=3, seed=0):
+    '''{case: [result per config]} for the chosen cases over (scale, density) configs'''
+    results = {name: [] for name in names}
+    for scale, density in configs:
+        settings = getSettings(scale, density)
+        engine = buildEngine(settings, seed)
+        config = {'scale': scale, 'density': density, 'width': settings.map_width,
+                  'height': settings.win_height, 'nodes': settings.getNumPoints()}
+        for name in names:
+            # the cases that rebuild edges or continents get their own engine, the rest share one
+            caseEngine = buildEngine(settings, seed) if name in ('nodes.edges', 'continents.generate') else engine
+            setup, run = cases[name](caseEngine)
+            seconds, peak = measure(setup, run, repeat)
+            results[name].append(dict(config, seconds=seconds, peakBytes=peak))
+            print(f"{name:24} {config['nodes']:7} nodes {config['width']:5}x{config['height']:<5} "
+                  f"{seconds*1000:10.2f} ms {peak/2**20:9.2f} MB")
+    return results
+
+
+def getCommit():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return f'{commit}-dirty' if dirty else commit
+
+
+def loadHistory(filename):
+    if not os.path.exists(filename):
+        return []
+    with open(filename) as file:
+        return json.load(file)
+
+
+def compare(previous, current):
+    '''prints the change of every case and config against an earlier history entry'''
+    print(f"\ncompared with {previous['commit']} from {previous['created']}")
+    for name, results in current['results'].items():
+        earlier = {(result['scale'], result['density']): result for result in previous['results'].get(name, [])}
+        for result in results:
+            before = earlier.get((result['scale'], result['density']))
+            if before is None or before['seconds'] == 0:
+                continue
+            ratio = result['seconds']/before['seconds']
+            print(f"{name:24} {result['nodes']:7} nodes  x{ratio:5.2f} time  "
+                  f"{(result['peakBytes']-before['peakBytes'])/2**20:+8.2f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='time the generator hot paths over a sweep of map sizes')
+    parser.add_argument('--quick', action='store_true', help='only the two smallest maps')
+    parser.add_argument('--cases', default='', help='comma separated case name prefixes, all cases by default')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per case, the best one counts')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--history', default='export/benchmark-history.json', help='json file the results are appended to')
+    parser.add_argument('--no-save', action='store_true', help='only print, leave the history alone')
+    args = parser.parse_args()
+
+    prefixes = [prefix for prefix in args.cases.split(',') if prefix]
+    names = [name for name in cases if not prefixes or any(name.startswith(prefix) for prefix in prefixes)]
+    if not names:
+        parser.error(f'no case matches {args.cases}')
+
+    pygame.init()
+    results = runBenchmarks(quickSweep if args.quick else sweep, names, args.repeat, args.seed)
+    entry = {'commit': getCommit(), 'created': time.strftime("%Y-%m-%d %H:%M:%S"), 'seed': args.seed,
+             'repeat': args.repeat, 'python': platform.python_version(), 'numpy': np.__version__,
+             'machine': platform.platform(), 'results': results}
+
+    history = loadHistory(args.history)
+    if history:
+        compare(history[-1], entry)
+    if not args.no_save:
+        history.append(entry)
+        os.makedirs(os.path.dirname(args.history) or '.', exist_ok=True)
+        with open(args.history, 'w') as file:
+            json.dump(history, file, indent=2)
+        print(f'\nAppended to {args.history}')
+
+
+if __name__ == '__main__':
+    main()
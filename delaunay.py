@@ -0,0 +1,157 @@
+import numpy as np
+
+# incremental Bowyer-Watson triangulation on integer coordinates. The orientation and
+# incircle predicates run on python ints, so they are exact and no epsilons are needed.
+
+
+def orient(ax, ay, bx, by, cx, cy):
+    '''> 0 when a, b, c turn counter clockwise'''
+    return (bx-ax)*(cy-ay) - (by-ay)*(cx-ax)
+
+
+def inCircle(ax, ay, bx, by, cx, cy, px, py):
+    '''> 0 when p is strictly inside the circumcircle of the counter clockwise triangle a, b, c'''
+    adx, ady = ax-px, ay-py
+    bdx, bdy = bx-px, by-py
+    cdx, cdy = cx-px, cy-py
+    ad = adx*adx + ady*ady
+    bd = bdx*bdx + bdy*bdy
+    cd = cdx*cdx + cdy*cdy
+    return (adx*(bdy*cd - bd*cdy) - ady*(bdx*cd - bd*cdx) + ad*(bdx*cdy - bdy*cdx))
+
+
+def getInsertionOrder(points):
+    '''snake order over a coarse grid, so each point lands next to the previous one
+    and the point location walk stays a few triangles long'''
+    n = len(points)
+    if n == 0:
+        return np.zeros(0, dtype=np.int64)
+    low = points.min(axis=0)
+    span = np.maximum(points.max(axis=0) - low, 1)
+    rows = max(1, int(np.sqrt(n/2)))
+    row = np.minimum((points[:, 1]-low[1])*rows//span[1], rows-1)
+    x = np.where(row % 2 == 0, points[:, 0], -points[:, 0])
+    return np.lexsort((x, row))
+
+
+def triangulate(points):
+    '''Delaunay triangles of an (n, 2) integer array as an (m, 3) array of point ids,
+    counter clockwise. Repeated points are only inserted once.'''
+    points = np.asarray(points, dtype=np.int64).reshape(-1, 2)
+    n = len(points)
+    if n < 3:
+        return np.zeros((0, 3), dtype=np.int64)
+
+    xs = points[:, 0].tolist()
+    ys = points[:, 1].tolist()
+
+    # a super triangle far outside the points, its corners are ids n, n+1, n+2
+    low = points.min(axis=0).tolist()
+    high = points.max(axis=0).tolist()
+    size = max(high[0]-low[0], high[1]-low[1], 1)
+    midX, midY = (low[0]+high[0])//2, (low[1]+high[1])//2
+    far = 64*size
+    xs += [midX-far, midX+far, midX]
+    ys += [midY-far, midY-far, midY+far]
+
+    # triangle t has corners vertices[t] counter clockwise, neighbors[t][i] is across from corner i
+    vertices = [[n, n+1, n+2]]
+    neighbors = [[-1, -1, -1]]
+    alive = [True]
+
+    last = 0
+    for pointId in getInsertionOrder(points).tolist():
+        px, py = xs[pointId], ys[pointId]
+
+        # walk towards the point until no edge has it on the outside
+        t = last
+        previous = -1
+        while True:
+            a, b, c = vertices[t]
+            corners = ((b, c), (c, a), (a, b))
+            moved = False
+            for i in range(3):
+                u, v = corners[i]
+                if neighbors[t][i] != previous and orient(xs[u], ys[u], xs[v], ys[v], px, py) < 0:
+                    previous = t
+                    t = neighbors[t][i]
+                    moved = True
+                    break
+            if not moved:
+                break
+
+        a, b, c = vertices[t]
+        if (px, py) in ((xs[a], ys[a]), (xs[b], ys[b]), (xs[c], ys[c])):
+            continue
+
+        # every triangle whose circumcircle holds the point, grown outwards from the one containing it
+        bad = {t}
+        stack = [t]
+        while stack:
+            current = stack.pop()
+            for other in neighbors[current]:
+                if other == -1 or other in bad:
+                    continue
+                a, b, c = vertices[other]
+                if inCircle(xs[a], ys[a], xs[b], ys[b], xs[c], ys[c], px, py) > 0:
+                    bad.add(other)
+                    stack.append(other)
+
+        # fan the hole's boundary edges out to the new point
+        starts = {}
+        ends = {}
+        for current in bad:
+            alive[current] = False
+            corners = vertices[current]
+            for i in range(3):
+                outside = neighbors[current][i]
+                if outside in bad:
+                    continue
+                u, v = corners[(i+1) % 3], corners[(i+2) % 3]
+                newId = len(vertices)
+                vertices.append([pointId, u, v])
+                neighbors.append([outside, -1, -1])
+                alive.append(True)
+                if outside != -1:
+                    links = neighbors[outside]
+                    links[links.index(current)] = newId
+                starts[u] = newId
+                ends[v] = newId
+
+        for u, newId in starts.items():
+            v = vertices[newId][2]
+            # across from u is the new triangle that starts at v, across from v the one ending at u
+            neighbors[newId][1] = starts[v]
+            neighbors[newId][2] = ends[u]
+        last = newId
+
+    triangles = np.array([vertices[t] for t in range(len(vertices)) if alive[t]], dtype=np.int64).reshape(-1, 3)
+    return triangles[(triangles < n).all(axis=1)]
+
+
+def getEdges(triangles):
+    '''unique (id1 < id2) edges of a triangle array'''
+    edges = np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]])
+    edges.sort(axis=1)
+    return np.unique(edges, axis=0)
+
+
+def pruneEdges(points, edges, maxLength, minConnections):
+    '''drops edges longer than maxLength, then removes the longest remaining edges
+    while both of their ends keep more than minConnections'''
+    points = np.asarray(points, dtype=np.float64)
+    lengths = np.hypot(*(points[edges[:, 0]] - points[edges[:, 1]]).T)
+    keep = lengths <= maxLength
+    edges = edges[keep]
+    lengths = lengths[keep]
+
+    degrees = np.bincount(edges.ravel(), minlength=len(points))
+    keep = np.ones(len(edges), dtype=bool)
+    ends = edges.tolist()
+    for edgeId in np.argsort(lengths, kind='stable')[::-1].tolist():
+        id1, id2 = ends[edgeId]
+        if degrees[id1] > minConnections and degrees[id2] > minConnections:
+            degrees[id1] -= 1
+            degrees[id2] -= 1
+            keep[edgeId] = False
+    return edges[keep]
@@ -0,0 +1,131 @@
+import itertools
+import os
+import struct
+import threading
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+# PNG encoding off the calling thread. zlib lets go of the GIL while it compresses,
+# so the window keeps drawing and generation keeps running while files are written.
+
+
+def writeChunk(file, kind: bytes, data: bytes):
+    file.write(struct.pack('>I', len(data)))
+    file.write(kind)
+    file.write(data)
+    file.write(struct.pack('>I', zlib.crc32(data, zlib.crc32(kind)) & 0xffffffff))
+
+
+def writePng(filename, canvas, compression=6, rowsPerBand=256):
+    '''streams an (height, width, 3) uint8 array, e.g. a memmap, into an RGB PNG'''
+    height, width = canvas.shape[:2]
+    compressor = zlib.compressobj(compression)
+
+    with open(filename, 'wb') as file:
+        file.write(b'\x89PNG\r\n\x1a\n')
+        writeChunk(file, b'IHDR', struct.pack('>IIBBBBB', width, height, 8, 2, 0, 0, 0))
+
+        band = np.zeros((rowsPerBand, width*3+1), dtype=np.uint8)
+        for start in range(0, height, rowsPerBand):
+            rows = min(rowsPerBand, height-start)
+            # every row starts with filter type 0, the pixels follow unchanged
+            band[:rows, 1:] = canvas[start:start+rows].reshape(rows, width*3)
+            data = compressor.compress(band[:rows].tobytes())
+            if data:
+                writeChunk(file, b'IDAT', data)
+
+        writeChunk(file, b'IDAT', compressor.flush())
+        writeChunk(file, b'IEND', b'')
+
+
+exportCounter = itertools.count()
+
+
+def getExportFilename(directory='export', suffix=''):
+    '''timestamped name that stays unique for many exports within the same second'''
+    return os.path.join(directory, f'map-generator_{time.strftime("%Y-%m-%d_%H-%M-%S")}_{next(exportCounter):04d}{suffix}.png')
+
+
+class ExportWriter:
+    '''writes PNGs on a few background threads
+
+    At most maxPending images wait in memory, submit blocks once that many are
+    queued so a fast producer cannot run out of memory. callback(filename, error)
+    runs on the writer thread when a file is done, error is None on success.
+    '''
+
+    def __init__(self, workers: int = 2, maxPending: int = 8, compression: int = 6):
+        self.compression = compression
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='export')
+        self.slots = threading.BoundedSemaphore(maxPending)
+        self.lock = threading.Lock()
+        self.pending = set()
+
+    def submit(self, pixels, filename=None, compression=None, callback=None):
+        '''queues an (width, height, 3) [x, y] pixel array like pygame.surfarray returns,
+        the caller must not change it afterwards. Returns a Future for the filename.'''
+        if filename is None:
+            filename = getExportFilename()
+        if compression is None:
+            compression = self.compression
+
+        self.slots.acquire()
+        future = self.executor.submit(self.write, pixels, filename, compression, callback)
+        with self.lock:
+            self.pending.add(future)
+        future.add_done_callback(self.finish)
+        return future
+
+    def write(self, pixels, filename, compression, callback):
+        error = None
+        try:
+            directory = os.path.dirname(filename)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            writePng(filename, pixels.transpose(1, 0, 2), compression)
+        except Exception as exception:
+            error = exception
+        if callback is not None:
+            callback(filename, error)
+        if error is not None:
+            raise error
+        return filename
+
+    def finish(self, future):
+        with self.lock:
+            self.pending.discard(future)
+        self.slots.release()
+
+    def getPending(self):
+        with self.lock:
+            return len(self.pending)
+
+    def wait(self):
+        '''blocks until everything queued so far is written'''
+        with self.lock:
+            futures = list(self.pending)
+        for future in futures:
+            future.exception()
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+
+
+writer = None
+
+
+def getWriter():
+    '''the shared writer, created on first use'''
+    global writer
+    if writer is None:
+        writer = ExportWriter()
+    return writer
+
+
+def printExport(filename, error):
+    if error is None:
+        print(f'Exported to {filename}')
+    else:
+        print(f'Export to {filename} failed: {error!r}')
@@ -0,0 +1,179 @@
+import numpy as np
+from spatial import PointIndex
+
+
+class FaceIndex:
+    '''the bounded faces of a planar Graph, found once and grown into continents
+
+    Every connection is split into two half edges. Following each half edge with
+    the next one clockwise around its end node walks the face on its left, so
+    every face is one cycle of that permutation. Counter clockwise cycles are the
+    bounded faces, clockwise ones the outside of each connected piece of the graph.
+    '''
+
+    def __init__(self, graph, maxSides=100):
+
+        self.graph = graph
+        self.maxSides = maxSides
+
+        edges = graph.getEdges().astype(np.int64)
+        nodes = graph.getNodes(np.arange(graph.size)).astype(np.int64)
+
+        # half edge h goes origins[h] -> targets[h], its twin is h ^ 1
+        self.origins = np.stack([edges[:, 0], edges[:, 1]], axis=1).ravel()
+        self.targets = np.stack([edges[:, 1], edges[:, 0]], axis=1).ravel()
+        count = len(self.origins)
+
+        delta = nodes[self.targets] - nodes[self.origins]
+        angles = np.arctan2(delta[:, 1], delta[:, 0])
+        order = np.lexsort((angles, self.origins))
+        rank = np.empty(count, dtype=np.int64)
+        rank[order] = np.arange(count)
+        starts = np.searchsorted(self.origins[order], np.arange(graph.size))
+        ends = np.searchsorted(self.origins[order], np.arange(graph.size), side='right')
+
+        # after arriving at a node, leave on the edge just before the way back in angle order
+        twins = np.arange(count) ^ 1
+        twinRank = rank[twins]
+        twinOrigins = self.origins[twins]
+        previous = np.where(twinRank > starts[twinOrigins], twinRank-1, ends[twinOrigins]-1)
+        self.next = order[previous] if count else np.zeros(0, dtype=np.int64)
+
+        self.faceOf = np.full(count, -1, dtype=np.int64)
+        self.faces = []
+        nextList = self.next.tolist()
+        faceOf = self.faceOf
+        for start in range(count):
+            if faceOf[start] != -1:
+                continue
+            faceId = len(self.faces)
+            face = []
+            halfEdge = start
+            while faceOf[halfEdge] == -1:
+                faceOf[halfEdge] = faceId
+                face.append(halfEdge)
+                halfEdge = nextList[halfEdge]
+            self.faces.append(face)
+
+        # a usable face is bounded, no longer than a continent may be, and touches no node twice
+        xs = nodes[:, 0].tolist()
+        ys = nodes[:, 1].tolist()
+        origins = self.origins.tolist()
+        self.usable = np.zeros(len(self.faces), dtype=bool)
+        centers = np.zeros((len(self.faces), 2))
+        for faceId, face in enumerate(self.faces):
+            corners = [origins[h] for h in face]
+            area = sum(xs[a]*ys[b] - xs[b]*ys[a] for a, b in zip(corners, corners[1:]+corners[:1]))
+            if area > 0 and len(face) <= maxSides and len(set(corners)) == len(corners):
+                self.usable[faceId] = True
+                centers[faceId] = (sum(xs[a] for a in corners)/len(corners), sum(ys[a] for a in corners)/len(corners))
+
+        self.usableIds = np.flatnonzero(self.usable)
+        self.centerPoints = centers
+        self.centers = PointIndex(centers[self.usableIds], labels=self.usableIds)
+        # seeds that could not grow past minSides, they are skipped from then on
+        self.failedSeeds = {}
+
+    def limitTo(self, xMin, yMin, xMax, yMax):
+        '''stops using faces with a corner outside the box, e.g. faces near the edge
+        of a window cut out of a bigger graph, which may be missing edges'''
+        nodes = self.graph.getNodes(self.origins)
+        outside = (nodes[:, 0] < xMin) | (nodes[:, 0] > xMax) | (nodes[:, 1] < yMin) | (nodes[:, 1] > yMax)
+        self.usable[np.unique(self.faceOf[outside])] = False
+        self.usableIds = np.flatnonzero(self.usable)
+        self.centers = PointIndex(self.centerPoints[self.usableIds], labels=self.usableIds)
+        self.failedSeeds = {}
+
+    def getFace(self, faceId: int):
+        '''corner node ids of a face, counter clockwise'''
+        return self.origins[self.faces[faceId]].tolist()
+
+    def getFaceNear(self, point):
+        '''the usable face whose center is closest to point, -1 when there are none'''
+        if len(self.usableIds) == 0:
+            return -1
+        return int(self.centers.nearest(np.array([point]))[1][0])
+
+    def grow(self, seedFace: int, minSides: int, targetSides: int, rng):
+        '''merges faces onto seedFace until the outline has more than targetSides corners,
+        returns the outline as node ids or None when it never got past minSides
+
+        A face is only merged when the edges it shares with the region form one
+        unbroken run and its other corners are not on the outline yet, so the
+        region always stays a single disc with a simple outline.
+        '''
+        faces = self.faces
+        faceOf = self.faceOf
+        origins = self.origins
+        usable = self.usable
+
+        region = {seedFace}
+        # outline half edges keyed by the node they leave from
+        outline = {int(origins[h]): h for h in faces[seedFace]}
+        tried = set()
+
+        while len(outline) <= targetSides:
+            candidates = [int(faceOf[h ^ 1]) for h in outline.values()]
+            candidates = [f for f in candidates if usable[f] and f not in region and f not in tried]
+            if not candidates:
+                break
+            faceId = rng.choice(candidates)
+
+            face = faces[faceId]
+            shared = [int(faceOf[h ^ 1]) in region for h in face]
+            flips = sum(shared[i] != shared[i-1] for i in range(len(face)))
+            if flips != 2:
+                tried.add(faceId)
+                continue
+
+            # the shared run's inner corners leave the outline, everything else of the face joins it
+            first = next(i for i in range(len(face)) if shared[i] and not shared[i-1])
+            runLength = next(j for j in range(1, len(face)+1) if not shared[(first+j) % len(face)])
+            inner = [int(origins[face[(first+j) % len(face)]]) for j in range(1, runLength)]
+            added = [int(origins[face[(first+j) % len(face)]]) for j in range(runLength+1, len(face))]
+            if any(node in outline for node in added) or len(outline) - len(inner) + len(added) > self.maxSides:
+                tried.add(faceId)
+                continue
+
+            for node in inner:
+                del outline[node]
+            for i in range(len(face)):
+                if not shared[i]:
+                    outline[int(origins[face[i]])] = face[i]
+            region.add(faceId)
+            tried.clear()
+
+        if len(outline) <= minSides:
+            return None
+
+        start = next(iter(outline))
+        corners = [start]
+        node = int(self.targets[outline[start]])
+        while node != start:
+            corners.append(node)
+            node = int(self.targets[outline[node]])
+        return corners
+
+    def findContinent(self, point, minSides: int, rng):
+        '''grows a continent from the face nearest to point, falling back to random
+        other faces when it cannot get past minSides. Node ids, or None once no face can.'''
+        failed = self.failedSeeds.setdefault(minSides, set())
+        faceId = self.getFaceNear(point)
+        remaining = None
+        while faceId != -1:
+            if faceId not in failed:
+                corners = self.grow(faceId, minSides, self.getRandomTarget(minSides, rng), rng)
+                if corners is not None:
+                    return corners
+                # grow only gives up once it has run out of faces to merge
+                failed.add(faceId)
+
+            if remaining is None:
+                remaining = [f for f in self.usableIds.tolist() if f not in failed]
+            remaining = [f for f in remaining if f not in failed]
+            faceId = rng.choice(remaining) if remaining else -1
+        return None
+
+    def getRandomTarget(self, minSides: int, rng):
+        '''outline length to grow towards, mostly a few corners past minSides'''
+        return min(self.maxSides, minSides + 1 + int(rng.expovariate(2/max(1, minSides))))
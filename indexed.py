@@ -0,0 +1,65 @@
+import numpy as np
+
+# Layout of the 256 color table of an indexed (8 bit) map surface. Pixels hold what
+# they show rather than a color: plain water, a depth layer of the water, or a palette
+# slot of the land at one of a few shades. The palette only decides the colors of the
+# table, so switching palettes is one set_palette call, with every refinement kept.
+
+
+class ColorTable:
+    '''maps water depth and shaded land palette slots to surface indices and back to colors'''
+
+    waterIndex = 0
+    blackIndex = 1
+    depthStart = 2
+    # shading coefficients run from 0.5 to 1, kept at this many steps
+    shades = 16
+
+    def __init__(self, palettes):
+        self.palettes = palettes
+        # a slot is the position of a color in the palette, palettes with fewer colors wrap around
+        self.slots = max(len(palette['list']) for palette in palettes.values())
+        self.landStart = 256 - self.slots*self.shades
+        # water depth entries come in pairs, one per random offset of 1 or 2
+        self.maxLayer = (self.landStart - self.depthStart)//2 - 1
+
+    def getDepthIndices(self, layers, offsets):
+        '''indices of water depth layers with the random offsets 1 or 2 waterDepth adds'''
+        layers = np.minimum(np.asarray(layers, dtype=np.int64), self.maxLayer)
+        return self.depthStart + 2*layers + np.asarray(offsets, dtype=np.int64) - 1
+
+    def getLandIndex(self, slot: int, coefficient: float = 1):
+        shade = int(round((min(1, max(0.5, coefficient)) - 0.5)*2*(self.shades-1)))
+        return self.landStart + (slot % self.slots)*self.shades + shade
+
+    def getSlot(self, palette: str, color):
+        '''slot of a color in a palette, None when the palette does not hold it'''
+        for slot, paletteColor in enumerate(self.palettes[palette]['list']):
+            if tuple(paletteColor)[:3] == tuple(color)[:3]:
+                return slot
+        return None
+
+    def getColors(self, palette: str, blackWhite: bool = False):
+        '''the 256 colors for a palette, with blackWhite land is white and water black'''
+        info = self.palettes[palette]
+        colors = np.zeros((256, 3), dtype=np.int64)
+
+        if blackWhite:
+            colors[self.landStart:] = 255
+            return [tuple(color) for color in colors.tolist()]
+
+        water = np.array(info['water'][:3])
+        colors[self.waterIndex] = water
+        layers = np.arange(self.maxLayer+1)
+        for offset in (1, 2):
+            depth = np.clip(water[None, :] + offset - info['water_multiplier']*layers[:, None], 0, 255)
+            colors[self.getDepthIndices(layers, offset)] = depth
+
+        coefficients = 0.5 + np.arange(self.shades)/(self.shades-1)/2
+        paletteColors = info['list']
+        for slot in range(self.slots):
+            color = np.array(tuple(paletteColors[slot % len(paletteColors)])[:3])
+            start = self.landStart + slot*self.shades
+            colors[start:start+self.shades] = (coefficients[:, None]*color[None, :]).astype(np.int64)
+
+        return [tuple(color) for color in colors.tolist()]
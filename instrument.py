@@ -0,0 +1,123 @@
+import cProfile
+import io
+import json
+import pstats
+import threading
+import time
+import tracemalloc
+
+# Named spans and counters for finding where a run spends its time, e.g.
+#   profiler = Profiler()
+#   with profiler.span('nodes'):
+#       with profiler.span('edges'):    # recorded as nodes/edges
+#           ...
+#   profiler.count('edges.tests', 1000)
+#   profiler.writeReport('export/run.json')
+# Spans are meant for whole stages and loops, not single iterations of an inner loop,
+# counts there are summed in locals first and added once.
+
+
+class Span:
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+        self.seconds = 0.0
+
+    def __enter__(self):
+        stack = self.profiler.getStack()
+        stack.append(self.name)
+        self.path = '/'.join(stack)
+        self.startTime = time.perf_counter()
+        return self
+
+    def __exit__(self, *exception):
+        self.seconds = time.perf_counter()-self.startTime
+        self.profiler.getStack().pop()
+        self.profiler.addTime(self.path, self.seconds)
+        return False
+
+
+class Profiler:
+    '''collects span times and counters of one engine, optionally with cProfile and tracemalloc'''
+
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.spans = {}
+        self.counters = {}
+        self.profile = None
+        self.tracing = False
+        self.capture = {}
+
+    def getStack(self):
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        return self.local.stack
+
+    def span(self, name: str):
+        '''context manager timing the block, nested spans are named parent/child'''
+        return Span(self, name)
+
+    def addTime(self, path: str, seconds: float):
+        if not self.enabled:
+            return
+        with self.lock:
+            entry = self.spans.setdefault(path, {'calls': 0, 'total': 0.0, 'max': 0.0})
+            entry['calls'] += 1
+            entry['total'] += seconds
+            entry['max'] = max(entry['max'], seconds)
+
+    def count(self, name: str, amount: int = 1):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + amount
+
+    def reset(self):
+        with self.lock:
+            self.spans = {}
+            self.counters = {}
+            self.capture = {}
+
+    def startCapture(self, profile: bool = True, memory: bool = False):
+        '''starts cProfile on the calling thread and, with memory, tracemalloc'''
+        if profile:
+            self.profile = cProfile.Profile()
+            self.profile.enable()
+        if memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.tracing = True
+
+    def stopCapture(self, top: int = 25):
+        '''stops what startCapture started and keeps a summary for the report'''
+        if self.profile is not None:
+            self.profile.disable()
+            stream = io.StringIO()
+            pstats.Stats(self.profile, stream=stream).sort_stats('cumulative').print_stats(top)
+            self.capture['profile'] = stream.getvalue()
+            self.profile = None
+        if self.tracing:
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            tracemalloc.stop()
+            self.tracing = False
+            self.capture['memory'] = {'current': current, 'peak': peak,
+                                      'top': [str(stat) for stat in snapshot.statistics('lineno')[:top]]}
+
+    def getReport(self):
+        '''plain dict of everything collected, spans sorted by path'''
+        with self.lock:
+            report = {'spans': {path: dict(self.spans[path]) for path in sorted(self.spans)},
+                      'counters': dict(sorted(self.counters.items()))}
+        report.update(self.capture)
+        return report
+
+    def writeReport(self, filename, **extra):
+        '''writes getReport and any extra fields, e.g. seed and settings, as JSON'''
+        report = dict(extra)
+        report.update(self.getReport())
+        with open(filename, 'w') as file:
+            json.dump(report, file, indent=2)
+        return filename
@@ -4,10 +4,13 @@ from pygame_widgets.slider import Slider
 from pygame_widgets.textbox import TextBox
 from pygame_widgets.button import Button
 import pygame
+import itertools
 import math
 import random
 import time
 import numpy as np
+from spatial import PointIndex, distanceTransform
+from exporter import getWriter, printExport
 
 
 def ccw(A, B, C):
@@ -16,6 +19,8 @@ def ccw(A, B, C):
 Point = tuple[int, int]
 
 class Line:
+    __slots__ = ('start', 'end')
+
     def __init__(self, start:Point, end:Point):
         self.start = start
         self.end = end
@@ -43,110 +48,243 @@ class Line:
 
 class Graph:
 
-    def __init__(self, size=200):
+    def __init__(self, size=200, rng=random):
 
         self.size = size
-        self.matrix = np.zeros((size, size), dtype=bool)
-        self.nodes = np.zeros(size, dtype=object)
+        self.rng = rng
+        # adjacency lists plus a degree array, memory grows with edges rather than size**2
+        self.neighbors = [[] for _ in range(size)]
+        # (offsets, ids) given to setAdjacency, turned into the lists by getNeighbors on first use
+        self.pendingAdjacency = None
+        self.degrees = np.zeros(size, dtype=np.int32)
+        self.numEdges = 0
+        # node coordinates live in one contiguous (size, 2) array, active marks the ids in use
+        self.nodes = np.zeros((size, 2), dtype=np.int32)
+        self.active = np.zeros(size, dtype=bool)
+        self.index = None
         self.nextIndex = 0
         self.emptyIds = []
-        self.partitions = {"width":-1, "height":-1, "numX":0, "numY":0, "array":None}
+        self.partitions = {"width":-1, "height":-1, "numX":0, "numY":0, "xMin":0, "yMin":0, "ids":None, "offsets":None}
 
     def getMatrix(self):
-        return self.matrix
+        '''builds a dense boolean matrix, only meant for small graphs'''
+        matrix = np.zeros((self.size, self.size), dtype=bool)
+        for id, connections in enumerate(self.getNeighbors()):
+            matrix[id, connections] = True
+        return matrix
+
+    def getEdges(self):
+        '''returns every connection once as an (n, 2) array with id1 < id2'''
+        offsets, ids = self.getAdjacency()
+        sources = np.repeat(np.arange(self.size), np.diff(offsets))
+        keep = sources < ids
+        return np.stack((sources[keep], ids[keep]), axis=1).astype(np.int32)
+
+    def getDegree(self, id:int):
+        return self.degrees[id]
+
+    def getDegrees(self):
+        return self.degrees
 
     def getAllNodes(self):
         return self.nodes
     
-    def getNode(self, id:int):
-        return self.nodes[id]
+    def getNode(self, id:int) -> Point:
+        x, y = self.nodes[id]
+        return (int(x), int(y))
     
     def getNodes(self, ids:List[int]):
         return self.nodes[ids]
 
+    def getActiveIds(self):
+        return np.flatnonzero(self.active)
+
+    def resize(self, size: int):
+        '''grows the id range to size, keeping every node and connection'''
+        extra = size-self.size
+        if extra <= 0:
+            return
+        self.getNeighbors().extend([] for _ in range(extra))
+        self.degrees = np.concatenate([self.degrees, np.zeros(extra, dtype=np.int32)])
+        self.nodes = np.concatenate([self.nodes, np.zeros((extra, 2), dtype=np.int32)])
+        self.active = np.concatenate([self.active, np.zeros(extra, dtype=bool)])
+        self.size = size
+
     def addNode(self, point:Point):
 
         if len(self.emptyIds) >0 :
-            self.nodes[self.emptyIds.pop()] = point
+            id = self.emptyIds.pop()
         else:
-            self.nodes[self.nextIndex] = point
+            if self.nextIndex >= self.size:
+                raise IndexError("Attempting to add too many nodes")
+            id = self.nextIndex
             self.nextIndex += 1
+
+        self.nodes[id] = point
+        self.active[id] = True
+        # one node only moves one entry of the partition and the index, no rebuild
+        if self.partitions['ids'] is not None:
+            self.addToPartition(id)
+        if self.index is not None and not self.index.insert(self.nodes[id], id):
+            self.index = None
+        return id
     
-    def addNodes(self, positions: List[Point]):
+    def addNodes(self, positions):
 
-        while len(self.emptyIds) > 0 and len(positions) > 0:
-            self.nodes[self.emptyIds.pop()] = positions.pop()
+        positions = np.asarray(positions, dtype=np.int32).reshape(-1, 2)
 
-        if self.nextIndex+len(positions) > self.size:
+        numReused = min(len(self.emptyIds), len(positions))
+        if self.nextIndex + len(positions) - numReused > self.size:
             raise IndexError("Attempting to add too many nodes")
-        self.nodes[self.nextIndex:self.nextIndex + len(positions)] = positions
+
+        reusedIds = [self.emptyIds.pop() for _ in range(numReused)]
+        newIds = np.arange(self.nextIndex, self.nextIndex + len(positions) - numReused)
+        ids = np.concatenate((np.array(reusedIds, dtype=newIds.dtype), newIds))
+
+        self.nodes[ids] = positions
+        self.active[ids] = True
+        self.index = None
+        self.nextIndex += len(newIds)
+        return ids
+
+    def setNodes(self, nodes, active, nextIndex: int, emptyIds=()):
+        '''takes over (size, 2) node and (size,) active arrays as they are, e.g. memory maps
+        of a saved world, ids stay what they were and there are no connections'''
+        self.size = len(nodes)
+        self.nodes = nodes
+        self.active = active
+        self.nextIndex = nextIndex
+        self.emptyIds = list(emptyIds)
+        self.index = None
+        self.partitions = {"width":-1, "height":-1, "numX":0, "numY":0, "xMin":0, "yMin":0, "ids":None, "offsets":None}
+        self.setAdjacency(np.zeros(self.size+1, dtype=np.int64), np.zeros(0, dtype=np.int32))
 
     def removeNode(self, id:int):
 
+        if self.partitions['ids'] is not None:
+            self.removeFromPartition(id)
+        if self.index is not None:
+            self.index.remove(id)
         self.nodes[id] = 0
-        self.matrix[id, :] = np.zeros(self.size)
-        self.matrix[:, id] = np.zeros(self.size)
+        self.active[id] = False
+        for other in self.getConnections(id):
+            self.removeConnection(id, other)
         self.emptyIds.append(id)
 
     def addConnection(self, id1:int, id2:int):
-        self.matrix[id1, id2] = self.matrix[id2, id1] = 1
+        neighbors = self.getNeighbors()
+        if id1 == id2 or id2 in neighbors[id1]:
+            return
+        neighbors[id1].append(id2)
+        neighbors[id2].append(id1)
+        self.degrees[id1] += 1
+        self.degrees[id2] += 1
+        self.numEdges += 1
 
     def addConnections(self, ids: List[Tuple[int, int]]):
 
         for id1, id2 in ids:
-            self.matrix[id1, id2] = self.matrix[id2, id1] = 1
+            self.addConnection(id1, id2)
+
+    def removeConnections(self, ids: List[Tuple[int, int]]):
+
+        for id1, id2 in ids:
+            self.removeConnection(id1, id2)
 
     def removeConnection(self, id1: int, id2: int):
-        self.matrix[id1, id2] = self.matrix[id2, id1] = 0
+        neighbors = self.getNeighbors()
+        if id2 not in neighbors[id1]:
+            return
+        neighbors[id1].remove(id2)
+        neighbors[id2].remove(id1)
+        self.degrees[id1] -= 1
+        self.degrees[id2] -= 1
+        self.numEdges -= 1
+
+    def clearConnections(self):
+        self.neighbors = [[] for _ in range(self.size)]
+        self.pendingAdjacency = None
+        self.degrees[:] = 0
+        self.numEdges = 0
+
+    def setAdjacency(self, offsets, ids):
+        '''replaces every connection, node id's neighbours are ids[offsets[id]:offsets[id+1]]
+        in that order, the adjacency lists are only built once something asks for them'''
+        self.neighbors = None
+        self.pendingAdjacency = (offsets, ids)
+        self.degrees = np.diff(offsets).astype(np.int32)
+        self.numEdges = len(ids)//2
+
+    def getAdjacency(self):
+        '''(offsets, ids) of every node's neighbours in order, see setAdjacency'''
+        if self.neighbors is None:
+            return self.pendingAdjacency
+        offsets = np.zeros(self.size+1, dtype=np.int64)
+        np.cumsum([len(connections) for connections in self.neighbors], out=offsets[1:])
+        ids = np.fromiter(itertools.chain.from_iterable(self.neighbors), dtype=np.int32, count=offsets[-1])
+        return offsets, ids
+
+    def getNeighbors(self):
+        '''the adjacency lists, built from setAdjacency on first use'''
+        if self.neighbors is None:
+            offsets, ids = self.pendingAdjacency
+            ids = ids.tolist()
+            offsets = offsets.tolist()
+            self.neighbors = [ids[offsets[id]:offsets[id+1]] for id in range(self.size)]
+            self.pendingAdjacency = None
+        return self.neighbors
 
     def getRandomIds(self, amount:int):
-        
-        if self.size < amount:
-            return range(self.size)
-        
-        return random.sample(range(self.size), amount)
-        
-    def getConnections(self, id:int):
 
-        raw = self.matrix[id,:]
+        # removed nodes leave holes in the id range, only active ids are drawn
+        ids = self.getActiveIds().tolist()
+        if len(ids) < amount:
+            return ids
 
-        return [value*id for id, value in enumerate(raw) if value != 0]
+        return self.rng.sample(ids, amount)
+        
+    def getConnections(self, id:int):
+        return self.getNeighbors()[id].copy()
     
     def getRandomConnection(self, id:int, exclude:List[int]=[]):
 
-        connections = [x for x in self.getConnections(id) if x not in exclude]
+        connections = [x for x in self.getNeighbors()[id] if x not in exclude]
 
         if len(connections) == 0:
             return -1
 
-        return random.sample(connections, 1)[0]
+        return self.rng.sample(connections, 1)[0]
     
     def getCloseRandomConnection(self, id: int,  homeId: int, exclude: List[int] = [], numSections: int = 1):
 
-        connections = [x for x in self.getConnections(id) if x not in exclude and x in self.getCloseIds(homeId, numSections)]
+        connections = [x for x in self.getNeighbors()[id] if x not in exclude and x in self.getCloseIds(homeId, numSections)]
 
         if len(connections) == 0:
             return -1
 
-        return random.sample(connections, 1)[0]
+        return self.rng.sample(connections, 1)[0]
     
     def fillMatrixRandom(self, xMin, yMin, xMax, yMax):
 
-        while len(self.emptyIds) > 0:
-            self.nodes[self.emptyIds.pop()] = (
-                random.randint(xMin, xMax), random.randint(yMin, yMax))
-        while self.nextIndex < self.size:
-            self.nodes[self.nextIndex] = (
-                random.randint(xMin, xMax), random.randint(yMin, yMax))
-            self.nextIndex += 1
+        # numpy generator seeded from self.rng so seeded runs stay reproducible
+        generator = np.random.default_rng(self.rng.getrandbits(64))
+        amount = len(self.emptyIds) + self.size - self.nextIndex
+
+        positions = np.empty((amount, 2), dtype=np.int32)
+        positions[:, 0] = generator.integers(xMin, xMax, size=amount, endpoint=True)
+        positions[:, 1] = generator.integers(yMin, yMax, size=amount, endpoint=True)
+
+        self.addNodes(positions)
 
     def partition(self, xMin: int, xMax: int, width:int, yMin:int, yMax: int, height: int):
 
-        numXSections = (xMax-xMin)//width
-        numYSections = (yMax-yMin)//height
+        numXSections = max(1, (xMax-xMin)//width)
+        numYSections = max(1, (yMax-yMin)//height)
 
         self.partitions['numX'] = numXSections
         self.partitions['numY'] = numYSections
+        self.partitions['xMin'] = xMin
+        self.partitions['yMin'] = yMin
 
         sectionWidth = math.ceil((xMax-xMin)/numXSections)
         sectionHeight = math.ceil((yMax-yMin)/numYSections)
@@ -154,102 +292,146 @@ class Graph:
         self.partitions['width'] = sectionWidth
         self.partitions['height'] = sectionHeight
 
-        self.partitions['array'] = [[[]]*numXSections]*numYSections
-
-        for id, node in enumerate(self.nodes):
-            self.partitions['array'][node[1]//sectionHeight][node[0]//sectionWidth].append(id)
+        # node ids sorted by cell (row major), cell c holds ids[offsets[c]:offsets[c+1]]
+        ids = self.getActiveIds()
+        cells = self.getCells(self.nodes[ids])
+
+        order = np.argsort(cells, kind='stable')
+        self.partitions['ids'] = ids[order]
+        self.partitions['offsets'] = np.zeros(numXSections*numYSections+1, dtype=np.int64)
+        np.cumsum(np.bincount(cells, minlength=numXSections*numYSections), out=self.partitions['offsets'][1:])
+
+    def getSection(self, point: Point):
+        xSection = min(max(0, int(point[0]-self.partitions['xMin'])//self.partitions['width']), self.partitions['numX']-1)
+        ySection = min(max(0, int(point[1]-self.partitions['yMin'])//self.partitions['height']), self.partitions['numY']-1)
+        return xSection, ySection
+
+    def getCells(self, points):
+        xSections = np.clip((points[:, 0]-self.partitions['xMin'])//self.partitions['width'], 0, self.partitions['numX']-1)
+        ySections = np.clip((points[:, 1]-self.partitions['yMin'])//self.partitions['height'], 0, self.partitions['numY']-1)
+        return ySections.astype(np.int64)*self.partitions['numX'] + xSections
+
+    def addToPartition(self, id: int):
+        '''puts a new node into its cell, in id order like partition would'''
+        cell = int(self.getCells(self.nodes[id:id+1])[0])
+        ids = self.partitions['ids']
+        offsets = self.partitions['offsets']
+        position = offsets[cell] + np.searchsorted(ids[offsets[cell]:offsets[cell+1]], id)
+        self.partitions['ids'] = np.insert(ids, position, id)
+        offsets[cell+1:] += 1
+
+    def removeFromPartition(self, id: int):
+        cell = int(self.getCells(self.nodes[id:id+1])[0])
+        ids = self.partitions['ids']
+        offsets = self.partitions['offsets']
+        position = offsets[cell] + np.flatnonzero(ids[offsets[cell]:offsets[cell+1]] == id)[0]
+        self.partitions['ids'] = np.delete(ids, position)
+        offsets[cell+1:] -= 1
+
+    def getCellIds(self, x: int, y: int):
+        '''view of the ids in one cell'''
+        cell = y*self.partitions['numX'] + x
+        offsets = self.partitions['offsets']
+        return self.partitions['ids'][offsets[cell]:offsets[cell+1]]
+
+    def getCloseIdsToPoint(self, point: Point, numSections:int=1):
+        '''ids in the (2*numSections+1)**2 cells around point'''
+
+        xSection, ySection = self.getSection(point)
+
+        xStart = max(0, xSection-numSections)
+        xEnd = min(self.partitions['numX'], xSection+numSections+1)
+
+        ids = self.partitions['ids']
+        offsets = self.partitions['offsets']
+
+        # the cells of one row are next to each other in ids, so each row is one slice
+        rows = []
+        for y in range(max(0, ySection-numSections), min(self.partitions['numY'], ySection+numSections+1)):
+            rowStart = y*self.partitions['numX']
+            rows.append(ids[offsets[rowStart+xStart]:offsets[rowStart+xEnd]])
+
+        if len(rows) == 1:
+            return rows[0]
+        return np.concatenate(rows)
 
     def getCloseIds(self, id:int, numSections:int=1):
-        startTime = time.time()
-
-        xSection = self.nodes[id][0] // self.partitions['width']
-        ySection = self.nodes[id][1] // self.partitions['height']
-
-        xBounds = range(max(0, xSection-numSections), min(int(self.partitions['numX']), xSection+numSections))
-        yBounds = range(max(0, ySection-numSections), min(int(self.partitions['numY']), ySection+numSections))
-
-        output = []
-        for x in xBounds:
-            for y in yBounds:
-                output.extend(self.partitions['array'][y][x])
-
-        # print(f'time to get close ids: {time.time() - startTime}')
-        return output
+        return self.getCloseIdsToPoint(self.nodes[id], numSections)
 
     def getClosestDistance(self, id: int):
-        '''assumes sections are squares'''
-
-        currentX = self.nodes[id][0]
-        currentY = self.nodes[id][1]
-
-        xSection = currentX // self.partitions['width']
-        ySection = currentY // self.partitions['height']
-
-        centerX = (xSection+0.5)*self.partitions['width']
-        centerY = (ySection+0.5)*self.partitions['height']
-
-        minDistance = self.partitions['numX']*self.partitions['width']
-
-        minDistanceId = -1
-
-        extraIterationsLeft = 1
-
-        for numSections in range(0, max(int(self.partitions['numX']), self.partitions['numY'])):
-
-            xBounds = range(max(0, xSection-numSections),
-                            min(int(self.partitions['numX']), xSection+numSections))
-            yBounds = range(max(0, ySection-numSections),
-                            min(int(self.partitions['numY']), ySection+numSections))
-
-            
-            for x in xBounds:
-                for y in yBounds:
-                    checkingIds = self.partitions['array'][y][x]
-                    for id in checkingIds:
-                        checkingX = self.nodes[id][0]
-                        checkingY = self.nodes[id][1]
-                        length = Line((currentX, currentY), (checkingX, checkingY)).calculateLength()
-                        if length<minDistance:
-                            minDistance = length
-                            minDistanceId = id
-
-            if minDistance > (numSections+1)*(self.partitions['width']**2+self.partitions['height']**2)**0.5:
-                extraIterationsLeft = 2
-                break
-
-            if minDistanceId != -1:
-                extraIterationsLeft -= 1
-
-            if extraIterationsLeft == 0:
-                break
-        
-        return minDistanceId
+        '''id of the closest other node, -1 if there is none'''
+        _, closestId = self.getIndex().nearest(self.nodes[id], exclude=[id])
+        return int(closestId[0])
+
+    def getIndex(self):
+        '''nearest neighbour index over the active nodes, answers in node ids'''
+        if self.index is None:
+            ids = self.getActiveIds()
+            self.index = PointIndex(self.nodes[ids], labels=ids)
+        return self.index
+
+    def getNeighborsInRange(self, maxLength):
+        '''for every node, the other nodes within maxLength sorted closest first,
+        as (offsets, ids, rejected) where node id owns ids[offsets[id]:offsets[id+1]]
+        and rejected counts the nodes in the searched cells that were too far away'''
+
+        ids = self.getActiveIds()
+        index = PointIndex(self.nodes[ids], labels=ids, cellSize=maxLength)
+        localOffsets, closeIds, _ = index.radius(self.nodes[ids], maxLength, exclude=ids)
+
+        # active ids are ascending, so the rows are already in id order
+        counts = np.zeros(self.size, dtype=np.int64)
+        counts[ids] = np.diff(localOffsets)
+        offsets = np.zeros(self.size+1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        return offsets, closeIds, index.rejected
+
+    def hasConnection(self, id1: int, id2: int):
+        return id2 in self.getNeighbors()[id1]
 
     def display(self):
-        print(self.matrix)
+        for id, connections in enumerate(self.getNeighbors()):
+            print(f'{id}: {connections}')
 
     def reset(self, size=-1):
         if size != -1:
             self.size = size
 
-        self.matrix = np.zeros((self.size, self.size), dtype=bool)
-        self.nodes = np.zeros(self.size, dtype=object)
+        self.neighbors = [[] for _ in range(self.size)]
+        self.pendingAdjacency = None
+        self.degrees = np.zeros(self.size, dtype=np.int32)
+        self.numEdges = 0
+        self.nodes = np.zeros((self.size, 2), dtype=np.int32)
+        self.active = np.zeros(self.size, dtype=bool)
+        self.index = None
         self.nextIndex = 0
         self.emptyIds = []
-        self.partitions = {"width":-1, "height":-1, "numX":0, "numY":0, "array":None}
+        self.partitions = {"width":-1, "height":-1, "numX":0, "numY":0, "xMin":0, "yMin":0, "ids":None, "offsets":None}
+
 
+def emptyCells(numX: int, numY: int):
+    '''numY rows of numX separate lists'''
+    return [[[] for _ in range(numX)] for _ in range(numY)]
 
 class LinePartition:
+    '''segments bucketed into a grid of cells, kept as arrays
+
+    Endpoints live in one int32 (capacity, 4) array of x1, y1, x2, y2 rows indexed by
+    segment id, and every cell keeps the ids of the segments with an endpoint in it in
+    its row of cellIds. Adding a segment creates no Python objects, Line objects are
+    only made when asked for.'''
 
     def __init__(self, xMin: int, xMax: int, width: int, yMin: int, yMax: int, height: int):
 
-        numXSections = (xMax-xMin)//width
-        numYSections = (yMax-yMin)//height
+        numXSections = max(1, (xMax-xMin)//width)
+        numYSections = max(1, (yMax-yMin)//height)
 
         self.partitions = {}
 
         self.partitions['numX'] = numXSections
         self.partitions['numY'] = numYSections
+        self.partitions['xMin'] = xMin
+        self.partitions['yMin'] = yMin
 
         sectionWidth = math.ceil((xMax-xMin)/numXSections)
         sectionHeight = math.ceil((yMax-yMin)/numYSections)
@@ -257,91 +439,281 @@ class LinePartition:
         self.partitions['width'] = sectionWidth
         self.partitions['height'] = sectionHeight
 
-        
-        matrix = []
-        for _ in range(numYSections):
-            row = []
-            for __ in range(numXSections):
-                row.append([])
-            matrix.append(row)
-
-        self.partitions['array'] = matrix
-
-        # print(f'rows: {len(matrix)}')
-        # print(f'cols: {len(matrix[0])}')
-
         self.totalLines = 0
-        self.allLines = []
+        # segments from this id on were added by addSegments and are not in the cells yet
+        self.indexedLines = 0
+        self.capacity = 64
+        self.endpoints = np.zeros((self.capacity, 4), dtype=np.int32)
+        # scratch array for duplicate free queries, see getCloseLineIds
+        self.stamps = np.zeros(self.capacity, dtype=np.int64)
+
+        # ids of the segments in cell (y, x) are cellIds[y, x, :cellCounts[y, x]]
+        self.cellCapacity = 8
+        self.cellIds = np.zeros((numYSections, numXSections, self.cellCapacity), dtype=np.int32)
+        self.cellCounts = np.zeros((numYSections, numXSections), dtype=np.int32)
+
+    def getSegments(self):
+        '''(n, 4) view of the x1, y1, x2, y2 of every segment'''
+        return self.endpoints[:self.totalLines]
+
+    def getLine(self, id: int):
+        x1, y1, x2, y2 = self.endpoints[id].tolist()
+        return Line((x1, y1), (x2, y2))
 
     def getAllLines(self):
-        return self.allLines
-
-    def addLine(self, line: Line):
-
-        startXSection = line.start[0]//self.partitions['width']
-        startYSection = line.start[1] // self.partitions['height']
-
-        endXSection = line.end[0]//self.partitions['width']
-        endYSection = line.end[1] // self.partitions['height']
+        return [Line((x1, y1), (x2, y2)) for x1, y1, x2, y2 in self.getSegments().tolist()]
+
+    def grow(self, size: int):
+        self.capacity = max(2*self.capacity, size)
+        endpoints = np.zeros((self.capacity, 4), dtype=np.int32)
+        endpoints[:self.totalLines] = self.endpoints[:self.totalLines]
+        self.endpoints = endpoints
+        self.stamps = np.zeros(self.capacity, dtype=np.int64)
+
+    def growCells(self, size: int):
+        self.cellCapacity = max(2*self.cellCapacity, size)
+        cellIds = np.zeros(self.cellCounts.shape + (self.cellCapacity,), dtype=np.int32)
+        cellIds[:, :, :self.cellIds.shape[2]] = self.cellIds
+        self.cellIds = cellIds
+
+    def getSection(self, point: Point):
+        xSection = min(max(0, int(point[0]-self.partitions['xMin'])//self.partitions['width']), self.partitions['numX']-1)
+        ySection = min(max(0, int(point[1]-self.partitions['yMin'])//self.partitions['height']), self.partitions['numY']-1)
+        return xSection, ySection
+
+    def getCell(self, point: Point):
+        xSection, ySection = self.getSection(point)
+        return ySection, xSection
+
+    def addToCell(self, cell, id: int):
+        count = self.cellCounts[cell]
+        if count == self.cellCapacity:
+            self.growCells(count+1)
+        self.cellIds[cell][count] = id
+        self.cellCounts[cell] = count+1
+
+    def addSegment(self, start: Point, end: Point):
+        '''adds the segment start-end and returns its id'''
+        self.indexCells()
+        id = self.totalLines
+        if id >= self.capacity:
+            self.grow(id+1)
+        self.endpoints[id] = (start[0], start[1], end[0], end[1])
+
+        startCell = self.getCell(start)
+        endCell = self.getCell(end)
+        self.addToCell(startCell, id)
+        if endCell != startCell:
+            self.addToCell(endCell, id)
 
-        if startXSection != endXSection or startYSection != endYSection:
-
-            self.partitions['array'][startYSection][startXSection].append(line)
-            self.partitions['array'][endYSection][endXSection].append(line)
-
-            # print(
-            #     f'adding line to ({startXSection}, {startYSection}) and ({endXSection}, {endYSection})')
-        else:
-            self.partitions['array'][startYSection][startXSection].append(line)
-            # print(
-            #     f'adding line to ({startXSection}, {startYSection})')
-            
-        self.allLines.append(line)
         self.totalLines += 1
-        
-        
+        self.indexedLines = self.totalLines
+        return id
 
-    def getCloseLines(self, node: Point, numSections: int = 1):
-
-        xSection = node[0] // self.partitions['width']
-        ySection = node[1] // self.partitions['height']
-
-        xBounds = range(max(0, xSection-numSections),
-                        min(int(self.partitions['numX']), xSection+numSections+1))
-        yBounds = range(max(0, ySection-numSections),
-                        min(int(self.partitions['numY']), ySection+numSections+1))
-
-        # print(len(xBounds)*len(yBounds))
-
-        output = []
-        for x in xBounds:
-            for y in yBounds:
-                output.extend(self.partitions['array'][y][x])
-
-        # print(f'output length: {len(output)}')
-        # print(f'set output length: {len(set(output))}')
+    def addLine(self, line: Line):
+        return self.addSegment(line.start, line.end)
+
+    def addSegments(self, starts, ends):
+        '''adds many segments at once, starts and ends are (n, 2) arrays, they are only
+        put into the cells once something queries them'''
+        starts = np.asarray(starts).reshape(-1, 2)
+        ends = np.asarray(ends).reshape(-1, 2)
+        first = self.totalLines
+        if first+len(starts) > self.capacity:
+            self.grow(first+len(starts))
+        self.endpoints[first:first+len(starts), :2] = starts
+        self.endpoints[first:first+len(starts), 2:] = ends
+        self.totalLines += len(starts)
+
+    def indexCells(self):
+        '''puts the segments addSegments left out into the cells, all at once'''
+        if self.indexedLines == self.totalLines:
+            return
+        ids = np.arange(self.indexedLines, self.totalLines)
+        segments = self.endpoints[ids].astype(np.int64)
+        starts, ends = segments[:, :2], segments[:, 2:]
+
+        startCells = self.getCells(starts)
+        endCells = self.getCells(ends)
+        crossing = endCells != startCells
+        cells = np.concatenate([startCells, endCells[crossing]])
+        cellIds = np.concatenate([ids, ids[crossing]])
+
+        # same order within every cell as adding them one by one
+        order = np.lexsort((cellIds, cells))
+        cells, cellIds = cells[order], cellIds[order]
+        counts = self.cellCounts.reshape(-1)
+        slots = counts[cells] + np.arange(len(cells)) - np.searchsorted(cells, cells)
+        if slots.max() >= self.cellCapacity:
+            self.growCells(int(slots.max())+1)
+        self.cellIds.reshape(-1, self.cellCapacity)[cells, slots] = cellIds
+        counts += np.bincount(cells, minlength=len(counts)).astype(np.int32)
+
+        self.indexedLines = self.totalLines
+
+    def getCells(self, points):
+        '''row major cell of every point, points on the far edges go to the last cells like getSection'''
+        xSections = np.clip((points[:, 0]-self.partitions['xMin'])//self.partitions['width'], 0, self.partitions['numX']-1)
+        ySections = np.clip((points[:, 1]-self.partitions['yMin'])//self.partitions['height'], 0, self.partitions['numY']-1)
+        return ySections*self.partitions['numX'] + xSections
+
+    def getLineId(self, start: Point, end: Point):
+        '''id of the segment between start and end in either direction, -1 if there is none'''
+        self.indexCells()
+        cell = self.getCell(start)
+        ids = self.cellIds[cell][:self.cellCounts[cell]]
+        segments = self.endpoints[ids]
+        forward = (segments == (start[0], start[1], end[0], end[1])).all(axis=1)
+        backward = (segments == (end[0], end[1], start[0], start[1])).all(axis=1)
+        matches = np.flatnonzero(forward | backward)
+        return int(ids[matches[0]]) if len(matches) > 0 else -1
+
+    def getLineCells(self, id: int):
+        '''the cells holding segment id, one or two of them'''
+        x1, y1, x2, y2 = self.endpoints[id].tolist()
+        start = self.getCell((x1, y1))
+        end = self.getCell((x2, y2))
+        return [start] if end == start else [start, end]
+
+    def replaceInCell(self, cell, id: int, replacement: int):
+        ids = self.cellIds[cell]
+        ids[np.flatnonzero(ids[:self.cellCounts[cell]] == id)[0]] = replacement
+
+    def removeLine(self, start: Point, end: Point):
+        '''removes the segment between start and end, the last segment takes over its id'''
+        id = self.getLineId(start, end)
+        if id == -1:
+            return
+
+        for cell in self.getLineCells(id):
+            count = self.cellCounts[cell]
+            self.replaceInCell(cell, id, self.cellIds[cell][count-1])
+            self.cellCounts[cell] = count-1
+
+        last = self.totalLines-1
+        if id != last:
+            for cell in self.getLineCells(last):
+                self.replaceInCell(cell, last, id)
+            self.endpoints[id] = self.endpoints[last]
+
+        self.totalLines -= 1
+        self.indexedLines = self.totalLines
+
+    def removeSegments(self, ids):
+        '''removes many segments at once, the rest keep their order and ids shift down,
+        the cells are filled again on the next query'''
+        keep = np.ones(self.totalLines, dtype=bool)
+        keep[ids] = False
+        kept = self.endpoints[:self.totalLines][keep]
+        self.totalLines = len(kept)
+        self.endpoints[:self.totalLines] = kept
+        self.cellCounts[...] = 0
+        self.indexedLines = 0
+
+    def getCellIds(self, node: Point, numSections: int = 1):
+        '''ids in the cells around node, segments in two of them are listed twice'''
+        self.indexCells()
+
+        xSection, ySection = self.getSection(node)
+
+        xStart, xEnd = max(0, xSection-numSections), min(int(self.partitions['numX']), xSection+numSections+1)
+        yStart, yEnd = max(0, ySection-numSections), min(int(self.partitions['numY']), ySection+numSections+1)
+
+        counts = self.cellCounts[yStart:yEnd, xStart:xEnd]
+        ids = self.cellIds[yStart:yEnd, xStart:xEnd, :counts.max(initial=0)]
+        return ids[np.arange(ids.shape[2]) < counts[:, :, None]]
+
+    def getCloseLineIds(self, node: Point, numSections: int = 1):
+        '''ids of the segments in the cells around node, each once'''
+        ids = self.getCellIds(node, numSections)
+        # the last position every id is stamped with is where it is kept
+        positions = np.arange(len(ids))
+        self.stamps[ids] = positions
+        return ids[self.stamps[ids] == positions]
+
+    def getIntersectingIds(self, start: Point, end: Point, ids):
+        '''tests the segment start-end against every segment in ids at once,
+        segments sharing an endpoint do not count (same as Line.isIntersecting)'''
+
+        ax, ay = start
+        bx, by = end
+        # int64 so the cross products cannot overflow on big maps
+        segments = self.endpoints[ids].astype(np.int64)
+        cx, cy, dx, dy = segments[:, 0], segments[:, 1], segments[:, 2], segments[:, 3]
+
+        sharesEndpoint = (((ax == cx) & (ay == cy)) | ((ax == dx) & (ay == dy)) |
+                          ((bx == cx) & (by == cy)) | ((bx == dx) & (by == dy)))
+
+        # ccw(A, C, D) != ccw(B, C, D) and ccw(A, B, C) != ccw(A, B, D)
+        acd = (dy-ay)*(cx-ax) > (cy-ay)*(dx-ax)
+        bcd = (dy-by)*(cx-bx) > (cy-by)*(dx-bx)
+        abc = (cy-ay)*(bx-ax) > (by-ay)*(cx-ax)
+        abd = (dy-ay)*(bx-ax) > (by-ay)*(dx-ax)
+
+        return ids[(acd != bcd) & (abc != abd) & ~sharesEndpoint]
+
+    def isIntersectingAny(self, start: Point, end: Point, numSections: int = 1):
+        '''checks start-end against the segments around start in one numpy pass'''
+        # testing a segment twice costs less than removing the duplicates first
+        ids = self.getCellIds(start, numSections)
+        if len(ids) == 0:
+            return False
+        return len(self.getIntersectingIds(start, end, ids)) > 0
+
+    def getCrossingMask(self, start: Point, ends, numSections: int = 1):
+        '''isIntersectingAny for the segments from start to each of the (k, 2) ends,
+        one numpy pass over every pair instead of a pass per segment'''
+        ends = np.asarray(ends, dtype=np.int64).reshape(-1, 2)
+        ids = self.getCellIds(start, numSections)
+        if len(ids) == 0 or len(ends) == 0:
+            return np.zeros(len(ends), dtype=bool)
+
+        ax, ay = int(start[0]), int(start[1])
+        cx, cy, dx, dy = self.endpoints[ids].astype(np.int64).T
+        # segments at start never count, and neither do the ones added from start meanwhile,
+        # and only segments reaching into the box around all new segments can cross one
+        keep = ~(((cx == ax) & (cy == ay)) | ((dx == ax) & (dy == ay)))
+        keep &= ((np.maximum(cx, dx) >= min(ax, ends[:, 0].min())) & (np.minimum(cx, dx) <= max(ax, ends[:, 0].max())) &
+                 (np.maximum(cy, dy) >= min(ay, ends[:, 1].min())) & (np.minimum(cy, dy) <= max(ay, ends[:, 1].max())))
+        cx, cy, dx, dy = cx[keep], cy[keep], dx[keep], dy[keep]
+        bx, by = ends[:, 0, None], ends[:, 1, None]
+
+        # the same tests as getIntersectingIds, (k, m) for every end and segment
+        sharesEndpoint = ((bx == cx) & (by == cy)) | ((bx == dx) & (by == dy))
+        acd = (dy-ay)*(cx-ax) > (cy-ay)*(dx-ax)
+        bcd = (dy-by)*(cx-bx) > (cy-by)*(dx-bx)
+        abc = (cy-ay)*(bx-ax) > (by-ay)*(cx-ax)
+        abd = (dy-ay)*(bx-ax) > (by-ay)*(dx-ax)
+
+        return ((acd != bcd) & (abc != abd) & ~sharesEndpoint).any(axis=1)
 
-        # always returning every line in the LinePartition rather than just a subset that would increase efficiency
-        return list(set(output))
+    def getCloseLines(self, node: Point, numSections: int = 1):
+        segments = self.endpoints[self.getCloseLineIds(node, numSections)].tolist()
+        return [Line((x1, y1), (x2, y2)) for x1, y1, x2, y2 in segments]
 
     def reset(self):
-        self.partitions['array'] = [[[]]*self.partitions['numX']]*self.partitions['numY']
+        self.cellCounts[...] = 0
+        self.totalLines = 0
+        self.indexedLines = 0
 
     def partitionSizes(self):
-        return [[len(set(x)) for x in y] for y in self.partitions['array']]
+        self.indexCells()
+        return self.cellCounts.tolist()
 
 
 class PointPartition:
 
     def __init__(self, xMin: int, xMax: int, width: int, yMin: int, yMax: int, height: int):
 
-        numXSections = (xMax-xMin)//width
-        numYSections = (yMax-yMin)//height
+        numXSections = max(1, (xMax-xMin)//width)
+        numYSections = max(1, (yMax-yMin)//height)
 
         self.partitions = {}
 
         self.partitions['numX'] = numXSections
         self.partitions['numY'] = numYSections
+        self.partitions['xMin'] = xMin
+        self.partitions['yMin'] = yMin
 
         sectionWidth = math.ceil((xMax-xMin)/numXSections)
         sectionHeight = math.ceil((yMax-yMin)/numYSections)
@@ -349,17 +721,7 @@ class PointPartition:
         self.partitions['width'] = sectionWidth
         self.partitions['height'] = sectionHeight
 
-        matrix = []
-        for _ in range(numYSections):
-            row = []
-            for __ in range(numXSections):
-                row.append([])
-            matrix.append(row)
-
-        self.partitions['array'] = matrix
-
-        # print(f'rows: {len(matrix)}')
-        # print(f'cols: {len(matrix[0])}')
+        self.partitions['array'] = emptyCells(numXSections, numYSections)
 
         self.totalPoints = 0
         self.allPoints = []
@@ -367,11 +729,15 @@ class PointPartition:
     def getAllPoints(self):
         return self.allPoints
 
+    def getSection(self, point: Point):
+        xSection = min(max(0, int(point[0]-self.partitions['xMin'])//self.partitions['width']), self.partitions['numX']-1)
+        ySection = min(max(0, int(point[1]-self.partitions['yMin'])//self.partitions['height']), self.partitions['numY']-1)
+        return xSection, ySection
+
     def addPoint(self, point: Point):
 
-        xSection = point[0]//self.partitions['width']
-        ySection = point[1] // self.partitions['height']
-        
+        xSection, ySection = self.getSection(point)
+
         self.partitions['array'][ySection][xSection].append(point)
 
         self.allPoints.append(point)
@@ -379,8 +745,7 @@ class PointPartition:
 
     def getClosePoints(self, node: Point, numSections: int = 1):
 
-        xSection = node[0] // self.partitions['width']
-        ySection = node[1] // self.partitions['height']
+        xSection, ySection = self.getSection(node)
 
         xBounds = range(max(0, xSection-numSections),
                         min(int(self.partitions['numX']), xSection+numSections+1))
@@ -395,12 +760,159 @@ class PointPartition:
         return output
 
     def reset(self):
-        self.partitions['array'] = [
-            [[]]*self.partitions['numX']]*self.partitions['numY']
+        self.partitions['array'] = emptyCells(self.partitions['numX'], self.partitions['numY'])
+        self.totalPoints = 0
+        self.allPoints = []
 
     def partitionSizes(self):
         return [[len(x) for x in y] for y in self.partitions['array']]
 
+def createPalettes():
+
+    palettes = {}
+
+    defaultPalette = ('default', 
+                      [pygame.Color('#F0D197'), pygame.Color('#b6ad90'),
+                      pygame.Color('#a68a64'), pygame.Color('#656d4a'), 
+                      pygame.Color('#333d29'), pygame.Color('#676f54'), 
+                      pygame.Color('#7d7d70'), pygame.Color('#858A89'),
+                      pygame.Color('#faf3dd'), pygame.Color('#fcfffc')], (0, 50, 100), 10, False)
+    
+    originalPalette = ('original', 
+                       [pygame.Color('#c2c5aa'), pygame.Color('#b6ad90'),
+                       pygame.Color('#a68a64'), pygame.Color('#656d4a'), 
+                        pygame.Color('#333d29'), pygame.Color('#676f54')], (0, 50, 100), 10, False)
+    
+    parchmentPalette = ('parchment', 
+                        [pygame.Color('#ffc599'), pygame.Color('#d49961'),
+                         pygame.Color('#eda268'), pygame.Color('#cb8849'),
+                         pygame.Color('#eea561'), pygame.Color('#eda268')], (255, 209, 173), 10, False)
+
+    redPalette = ('red',
+                       [pygame.Color('#ff0022'), pygame.Color('#ff4422'),
+                        pygame.Color('#c32f27'), pygame.Color('#d8572a'),
+                        pygame.Color('#8f250c'), pygame.Color('#691e06'),
+                        pygame.Color('#a63c06'), pygame.Color('#ec7505')], (45, 10, 10), 10, False)
+    
+    palettesList = [defaultPalette, originalPalette, parchmentPalette, redPalette]
+
+    for palette in palettesList:
+
+        if palette[4]:
+
+            polarColorPalette = palette[1].copy()
+            polarColorPalette.reverse()
+            polarColorPalette.extend(palette[1])
+
+            palettes[palette[0]] = {'list': polarColorPalette, 'water': palette[2], 'water_multiplier': palette[3], 'isPolar': palette[4]}
+
+        else:
+
+            palettes[palette[0]] = {
+                'list': palette[1], 'water': palette[2], 'water_multiplier': palette[3], 'isPolar': palette[4]}
+
+    return palettes
+
+# greedy links each node to its closest non-crossing neighbours, delaunay prunes a triangulation
+connectionModes = ['greedy', 'delaunay']
+# walk retries random walks for a cycle, faces merges neighbouring faces of the planar graph
+continentModes = ['walk', 'faces']
+
+class MapSettings:
+    '''plain generation parameters, so a map can be built without any sliders'''
+
+    def __init__(self, map_width:int, win_height:int, density:int=85, maxDistance:int=55, minConnections:int=3,
+                 continentSides:int=10, numContinents:int=35, palette:str='default', waterLevels:int=8,
+                 waterWidth:int=30, shape:str='square [s]', density_coefficient=5*10**6,
+                 connectionMode:str='greedy', continentMode:str='walk') -> None:
+
+        self.map_width = map_width
+        self.win_height = win_height
+
+        self.density = density
+        self.maxDistance = maxDistance
+        self.minConnections = minConnections
+        self.continentSides = continentSides
+        self.numContinents = numContinents
+        self.waterLevels = waterLevels
+        self.waterWidth = waterWidth
+        self.shape = shape
+        self.density_coefficient = density_coefficient
+
+        self.palettes = createPalettes()
+        if palette not in self.palettes:
+            raise ValueError(f'unknown palette: {palette}')
+        self.palette = palette
+
+        if connectionMode not in connectionModes:
+            raise ValueError(f'unknown connection mode: {connectionMode}')
+        self.connectionMode = connectionMode
+
+        if continentMode not in continentModes:
+            raise ValueError(f'unknown continent mode: {continentMode}')
+        self.continentMode = continentMode
+
+    def getValues(self):
+        '''the constructor arguments, MapSettings(**settings.getValues()) is an equal copy'''
+        return {'map_width': self.map_width, 'win_height': self.win_height, 'density': self.density,
+                'maxDistance': self.maxDistance, 'minConnections': self.minConnections,
+                'continentSides': self.continentSides, 'numContinents': self.numContinents,
+                'palette': self.palette, 'waterLevels': self.waterLevels, 'waterWidth': self.waterWidth,
+                'shape': self.shape, 'density_coefficient': self.density_coefficient,
+                'connectionMode': self.connectionMode, 'continentMode': self.continentMode}
+
+    def getMinimumContinentSides(self):
+        return self.continentSides
+
+    def getMinimumConnections(self):
+        return self.minConnections
+
+    def getMaximumLength(self):
+        return self.maxDistance
+
+    def getConnectionMode(self):
+        return self.connectionMode
+
+    def getContinentMode(self):
+        return self.continentMode
+
+    def getNumContinents(self):
+        return self.numContinents
+
+    def getNumPoints(self):
+        return int(self.density * self.density_coefficient/self.map_width/self.win_height)
+
+    def getPalette(self):
+        return self.palettes[self.palette]['list']
+
+    def getWater(self):
+        return self.palettes[self.palette]['water']
+
+    def getSemiRandomColor(self, percent_height, rng=random):
+        if self.palettes[self.palette]['isPolar']:
+            value = int(percent_height*(len(self.getPalette())))
+            noise = rng.randrange(-1, 1)
+
+            color = self.getPalette()[min(len(self.getPalette())-1, max(
+                0, value+noise))]
+
+        color = self.getPalette()[rng.randint(
+            0, len(self.getPalette())-1)]
+
+        return color
+
+    def getWaterLevels(self):
+        return self.waterLevels
+
+    def getWaterWidth(self):
+        return self.waterWidth
+
+    def getWaterMultiplier(self):
+        return self.palettes[self.palette]['water_multiplier']
+
+    def getWaterMinLength(self):
+        return self.waterLevels*self.waterWidth
+
 class Text:
 
     def __init__(self, text, color, font, x, y, slider=None, values=[]):
@@ -414,16 +926,24 @@ class Text:
         
         self.slider = slider
         self.values = values
+        self.surfaces = {}
+
+    def getLabel(self):
+        if self.slider is None:
+            return self.text
+        if self.values != []:
+            return f'{self.text}{self.values[self.slider.getValue()]}'
+        return f'{self.text}{self.slider.getValue()}'
 
     def render(self, window):
-        currentText = self.font.render(self.text, True, self.color)
-        if self.slider is not None:
-            if self.values != []:
-                currentText = self.font.render(
-                    f'{self.text}{self.values[self.slider.getValue()]}', True, self.color)
-            else:
-                currentText = self.font.render(f'{self.text}{self.slider.getValue()}', True, self.color)
-        window.blit(currentText, self.rect)
+        '''draws the label, returns the rect it covered'''
+        label = self.getLabel()
+        # a label only ever shows one of the slider's values, so every surface is kept
+        surface = self.surfaces.get(label)
+        if surface is None:
+            surface = self.font.render(label, True, self.color)
+            self.surfaces[label] = surface
+        return window.blit(surface, self.rect)
 
 class WindowInfo:
 
@@ -457,49 +977,9 @@ class WindowInfo:
 
         # create palettes
         self.palette = 'default'
-        self.palettes = {}
-
-        defaultPalette = ('default', 
-                          [pygame.Color('#F0D197'), pygame.Color('#b6ad90'),
-                          pygame.Color('#a68a64'), pygame.Color('#656d4a'), 
-                          pygame.Color('#333d29'), pygame.Color('#676f54'), 
-                          pygame.Color('#7d7d70'), pygame.Color('#858A89'),
-                          pygame.Color('#faf3dd'), pygame.Color('#fcfffc')], (0, 50, 100), 10, False)
-        
-        originalPalette = ('original', 
-                           [pygame.Color('#c2c5aa'), pygame.Color('#b6ad90'),
-                           pygame.Color('#a68a64'), pygame.Color('#656d4a'), 
-                            pygame.Color('#333d29'), pygame.Color('#676f54')], (0, 50, 100), 10, False)
-        
-        parchmentPalette = ('parchment', 
-                            [pygame.Color('#ffc599'), pygame.Color('#d49961'),
-                             pygame.Color('#eda268'), pygame.Color('#cb8849'),
-                             pygame.Color('#eea561'), pygame.Color('#eda268')], (255, 209, 173), 10, False)
-
-        redPalette = ('red',
-                           [pygame.Color('#ff0022'), pygame.Color('#ff4422'),
-                            pygame.Color('#c32f27'), pygame.Color('#d8572a'),
-                            pygame.Color('#8f250c'), pygame.Color('#691e06'),
-                            pygame.Color('#a63c06'), pygame.Color('#ec7505')], (45, 10, 10), 10, False)
-        
-        palettesList = [defaultPalette, originalPalette, parchmentPalette, redPalette]
-
-        for palette in palettesList:
-
-            if palette[4]:
-
-                polarColorPalette = palette[1].copy()
-                polarColorPalette.reverse()
-                polarColorPalette.extend(palette[1])
-
-                self.palettes[palette[0]] = {'list': polarColorPalette, 'water': palette[2], 'water_multiplier': palette[3], 'isPolar': palette[4]}
-
-            else:
-
-                self.palettes[palette[0]] = {
-                    'list': palette[1], 'water': palette[2], 'water_multiplier': palette[3], 'isPolar': palette[4]}
-
-        # print(self.getPalette())
+        self.connectionMode = 'greedy'
+        self.continentMode = 'walk'
+        self.palettes = createPalettes()
 
         self.textSpacing = 25
         self.textBoxes = []
@@ -722,46 +1202,151 @@ class WindowInfo:
         width = self.sliders['water_width'].getValue()
         return levels*width
 
+    def getSettings(self):
+        return MapSettings(self.map_width, self.win_height, density=self.sliders['density'].getValue(),
+                           maxDistance=self.getMaximumLength(), minConnections=self.getMinimumConnections(),
+                           continentSides=self.getMinimumContinentSides(), numContinents=self.sliders['continents'].getValue(),
+                           palette=self.palette, waterLevels=self.getWaterLevels(), waterWidth=self.getWaterWidth(),
+                           shape=self.shapes[self.sliders['shape'].getValue()], density_coefficient=self.density_coefficient,
+                           connectionMode=self.connectionMode, continentMode=self.continentMode)
+
+class WalkState:
+    '''a random walk over a Graph that grows into a continent when it returns home
+
+    Visited nodes are kept in a dict from id to position in the path and the nodes
+    close enough to home are collected once, so every step only costs the degree
+    of the node it leaves from.
+    '''
+
+    def __init__(self, graph: Graph, homeId: int, numSections: int = 2):
+        self.graph = graph
+        self.homeId = homeId
+        self.path = [homeId]
+        self.points = [graph.getNode(homeId)]
+        self.positions = {homeId: 0}
+        self.close = set(graph.getCloseIds(homeId, numSections).tolist())
+
+    def __len__(self):
+        return len(self.path)
+
+    def __contains__(self, id: int):
+        return id in self.positions
+
+    def index(self, id: int):
+        return self.positions[id]
+
+    def append(self, id: int):
+        self.positions[id] = len(self.path)
+        self.path.append(id)
+        self.points.append(self.graph.getNode(id))
+
+    def isCandidate(self, id: int):
+        return id == self.homeId or (id not in self.positions and id in self.close)
+
+    def getRandomNext(self, rng):
+        '''uniform pick among the last node's neighbours that are close to home and not
+        visited yet, home included, -1 if there are none. The first step may go anywhere.'''
+        neighbors = self.graph.getNeighbors()[self.path[-1]]
+        if len(self.path) == 1:
+            return rng.sample(neighbors, 1)[0] if neighbors else -1
+
+        # count, then walk to the chosen one, instead of building the filtered list
+        count = 0
+        for id in neighbors:
+            if self.isCandidate(id):
+                count += 1
+        if count == 0:
+            return -1
+
+        chosen = rng.randrange(count)
+        for id in neighbors:
+            if self.isCandidate(id):
+                if chosen == 0:
+                    return id
+                chosen -= 1
+
 class WorldInfo:
 
-    def __init__(self, xMin: int, xMax: int, width: int, yMin: int, yMax: int, height: int):
+    def __init__(self, xMin: int, xMax: int, width: int, yMin: int, yMax: int, height: int, rng=random):
+
+        self.xMin = xMin
+        self.xMax = xMax
+        self.yMin = yMin
+        self.yMax = yMax
 
         self.continents = []
         self.continentPoints = PointPartition(xMin, xMax, int(width*1.5), yMin, yMax, int(height*1.5))
         self.continentColors = []
 
-        self.path = []
-        self.pathPoints = []
+        # distance from every pixel to the nearest land, [x, y] like pygame.surfarray, rebuilt when continents change
+        self.coastDistance = None
+
+        # continent id of every pixel, see getLabels, filled by the same polygon scanline fill that draws the map
+        self.labelSurface = None
+        self.labels = None
 
-        self.graph = Graph()
+        self.walk = None
+
+        self.graph = Graph(rng=rng)
 
         self.lines = LinePartition(xMin, xMax, int(width*1.5), yMin, yMax, int(height*1.5))
         
 
+    def addContinent(self, points: List[Point], color):
+        self.continents.append(points)
+        self.continentColors.append(color)
+        for point in points:
+            self.continentPoints.addPoint(point)
+        if self.labels is not None:
+            self.drawLabel(len(self.continents)-1)
+        self.coastDistance = None
+
     def clearContinents(self):
         self.continents = []
         self.continentColors = []
+        if self.labels is not None:
+            self.labelSurface.fill(0)
+        self.coastDistance = None
+
+    def drawLabel(self, index: int):
+        continent = self.continents[index]
+        if len(continent) >= 3:
+            pygame.draw.polygon(self.labelSurface, index+1, [(x-self.xMin, y-self.yMin) for x, y in continent])
+
+    def getLabels(self):
+        '''[x, y] array of which continent covers each pixel, 0 for water and i+1 for continents[i]
+
+        Built on first use and kept up to date as continents are added or cleared,
+        later continents cover earlier ones like on the map. The ids are drawn as the
+        pixel values of a 32 bit surface, the array is a view of it.
+        '''
+        if self.labels is None:
+            self.labelSurface = pygame.Surface((self.xMax-self.xMin, self.yMax-self.yMin), depth=32)
+            self.labelSurface.fill(0)
+            for index in range(len(self.continents)):
+                self.drawLabel(index)
+            self.labels = pygame.surfarray.pixels2d(self.labelSurface)
+        return self.labels
+
+    def getLandMask(self):
+        '''boolean [x, y] array, True on land'''
+        return self.getLabels() != 0
+
+    def getCoastDistance(self):
+        if self.coastDistance is None:
+            self.coastDistance = distanceTransform(self.getLandMask())
+        return self.coastDistance
 
     def clearPath(self):
-        self.path = []
-        self.pathPoints = []
+        self.walk = None
 
     def clearLines(self, xMin: int, xMax: int, width: int, yMin: int, yMax: int, height: int):
         self.lines = LinePartition(xMin, xMax, int(width*1.5), yMin, yMax, int(height*1.5))
 
-def export_window_as_png(window, width, height):
-    # Get the surface of the window
-    surface = pygame.display.get_surface()
-
-    # Create a new surface with the same dimensions as the window
-    image = pygame.Surface((width, height))
-
-    # Draw the contents of the window onto the new surface
-    image.blit(window, (0, 0))
-
-    filename = f'export/map-generator_{time.strftime("%Y-%m-%d")}_{time.time()}.png'
+def export_window_as_png(window, width, height, filename=None, compression=None, callback=printExport):
+    '''copies the pixels and hands them to the background writer, returns a Future for the filename'''
 
-    # Save the new surface as a PNG file
-    pygame.image.save(image, filename)
+    # copy the map area now, the surface keeps changing while the file is written
+    pixels = pygame.surfarray.array3d(window.subsurface((0, 0, width, height)))
 
-    print(f'Exported to {filename}')
+    return getWriter().submit(pixels, filename, compression, callback)
@@ -0,0 +1,901 @@
+import logging
+import math
+import pygame
+import random
+import threading
+import numpy as np
+import delaunay
+import raster
+from faces import FaceIndex
+from indexed import ColorTable
+from instrument import Profiler
+from mapclasses import Point, MapSettings, WalkState, WorldInfo
+from mapclasses import export_window_as_png
+from exporter import printExport
+
+black = (0, 0, 0)
+white = (255, 255, 255)
+red = (255, 0, 0)
+
+log = logging.getLogger(__name__)
+
+
+class GenerationCancelled(Exception):
+    '''raised inside a running stage once cancel() was called'''
+
+
+class MapEngine:
+    '''builds maps off-screen from a MapSettings, no window or event loop needed'''
+
+    def __init__(self, settings: MapSettings, seed=None, indexed: bool = False):
+
+        self.settings = settings
+        self.width = settings.map_width
+        self.height = settings.win_height
+
+        # every pipeline stage reseeds rng from this, so a stage's output only depends on its own inputs
+        self.seedValue = seed if seed is not None else random.getrandbits(64)
+        self.rng = random.Random(self.seedValue)
+        # continent colors come from their own stream so the palette never changes continent shapes
+        self.colorRng = random.Random(f'{self.seedValue}:colors')
+        # palette the continent colors were picked from, settings synced from the window may already name the next one
+        self.colorPalette = settings.palette
+
+        # indexed keeps an 8 bit surface of ColorTable indices, palettes then only swap its colors
+        self.indexed = indexed
+        self.colorTable = ColorTable(settings.palettes)
+        self.blackWhite = False
+        self.surface = self.createSurface()
+
+        self.world = WorldInfo(0, self.width, settings.getMaximumLength(),
+                               0, self.height, settings.getMaximumLength(), rng=self.rng)
+
+        self.timings = {}
+        # span times and counters of the stages and hot loops, see instrument.py
+        self.profiler = Profiler()
+
+        # read by other threads to show how far a run is, cancel() stops it at the next report
+        self.progress = {'stage': None, 'fraction': 0.0}
+        self.cancelEvent = threading.Event()
+
+        self.waterLayers = None
+        self.waterLayersKey = None
+        self.waterLayersSource = None
+
+        # later continents are drawn brighter, tiles turn this off and pass colors their owner shaded
+        self.shadeContinents = True
+
+        # faces of the current graph for the faces continent mode, built on first use
+        self.faceIndex = None
+        # the connection settings the current edges were built with, see updateConnections
+        self.connectionSettings = None
+
+    def seed(self, seed):
+        self.seedValue = seed
+        self.rng.seed(seed)
+        self.colorRng.seed(f'{seed}:colors')
+
+    def seedStage(self, stage: str):
+        self.rng.seed(f'{self.seedValue}:{stage}')
+
+    def report(self, stage: str, fraction: float):
+        self.progress = {'stage': stage, 'fraction': fraction}
+        self.checkCancelled(stage)
+
+    def checkCancelled(self, stage: str):
+        '''raises GenerationCancelled once cancel() was called, leaves the progress alone'''
+        if self.cancelEvent.is_set():
+            raise GenerationCancelled(stage)
+
+    def cancel(self):
+        self.cancelEvent.set()
+
+    def createSurface(self):
+        if not self.indexed:
+            surface = pygame.Surface((self.width, self.height))
+            surface.fill(white)
+            return surface
+        surface = pygame.Surface((self.width, self.height), depth=8)
+        surface.set_palette(self.colorTable.getColors(self.settings.palette, self.blackWhite))
+        surface.fill(self.colorTable.waterIndex)
+        return surface
+
+    def setIndexed(self, indexed: bool):
+        '''switches the render mode, the new surface is empty until the next redraw or render'''
+        if indexed != self.indexed:
+            self.indexed = indexed
+            self.blackWhite = False
+            self.surface = self.createSurface()
+
+    def getPixels(self):
+        '''view of the surface pixels, (width, height, 3) colors or (width, height) indices'''
+        if self.indexed:
+            return pygame.surfarray.pixels2d(self.surface)
+        return pygame.surfarray.pixels3d(self.surface)
+
+    def setPalette(self, palette: str):
+        '''switches palettes, indexed surfaces are recolored at once with everything on them kept'''
+        slots = [self.colorTable.getSlot(self.colorPalette, color) for color in self.world.continentColors]
+        self.settings.palette = palette
+        self.colorPalette = palette
+        colors = self.settings.getPalette()
+        self.world.continentColors = [colors[slot % len(colors)] if slot is not None else color
+                                      for slot, color in zip(slots, self.world.continentColors)]
+        if self.indexed:
+            self.blackWhite = False
+            self.surface.set_palette(self.colorTable.getColors(palette))
+
+    def getRaster(self):
+        '''returns a (width, height, 3) copy of the map pixels'''
+        return pygame.surfarray.array3d(self.surface)
+
+    def generateNodes(self):
+        info = self.settings
+        world = self.world
+        profiler = self.profiler
+
+        with profiler.span('graph'):
+            world.graph.reset(info.getNumPoints())
+            self.faceIndex = None
+
+            with profiler.span('fill'):
+                world.graph.fillMatrixRandom(0, 0, self.width, self.height)
+            with profiler.span('partition'):
+                world.graph.partition(0, self.width, info.getMaximumLength(), 0, self.height, info.getMaximumLength())
+
+            world.clearLines(0, self.width, info.getMaximumLength(), 0, self.height, info.getMaximumLength())
+
+            with profiler.span('edges'):
+                if info.getConnectionMode() == 'delaunay':
+                    self.connectDelaunay()
+                else:
+                    self.connectGreedy()
+            self.connectionSettings = self.getConnectionSettings()
+
+    def connectGreedy(self):
+        info = self.settings
+        world = self.world
+
+        # candidates within range for every node, closest first, the range query drops and counts
+        # the ones too far away, so no length checks are needed below
+        offsets, closeIds, rejected = world.graph.getNeighborsInRange(info.getMaximumLength())
+        closeIds = closeIds.tolist()
+        self.profiler.count('edges.rejectedLength', rejected)
+
+        needConnections = list(range(world.graph.size))
+        numSections = self.getLineSections()
+
+        iterations = 0
+        tests = 0
+        added = 0
+        while len(needConnections) > world.graph.size*0.05 and iterations < 5:
+
+            for i, currentId in enumerate(needConnections):
+                if i % 256 == 0:
+                    self.report('nodes', (iterations + i/len(needConnections))/5)
+                nodeTests, nodeAdded = self.linkNode(currentId, closeIds[offsets[currentId]:offsets[currentId+1]], numSections)
+                tests += nodeTests
+                added += nodeAdded
+
+            needConnections = [x for x in needConnections if world.graph.getDegree(x) < info.getMinimumConnections()]
+
+            iterations+=1
+
+        self.countLinks(tests, added)
+        self.profiler.count('edges.passes', iterations)
+
+    def linkNode(self, currentId: int, candidates, numSections: int = 1):
+        '''connects currentId to every candidate whose segment crosses no existing one,
+        nodes that already have enough connections are left alone.
+        Returns the number of intersection tests run and connections added.'''
+        info = self.settings
+        world = self.world
+
+        #saves a lot of time
+        if world.graph.getDegree(currentId) >= info.getMinimumConnections():
+            return 0, 0
+
+        candidates = [id for id in candidates if not world.graph.hasConnection(currentId, id)]
+        if not candidates:
+            return 0, 0
+
+        # the new segments all start at currentNode, so they never cross each other and
+        # every candidate can be tested against the existing segments at once
+        currentNode = world.graph.getNode(currentId)
+        ends = world.graph.getNodes(candidates)
+        crossing = world.lines.getCrossingMask(currentNode, ends, numSections)
+
+        added = 0
+        for checkingId, checkingNode, crosses in zip(candidates, ends.tolist(), crossing.tolist()):
+            if not crosses:
+                world.lines.addSegment(currentNode, checkingNode)
+                world.graph.addConnection(currentId, checkingId)
+                added += 1
+        return len(candidates), added
+
+    def countLinks(self, tests: int, added: int):
+        self.profiler.count('edges.tests', tests)
+        self.profiler.count('edges.added', added)
+        self.profiler.count('edges.rejectedCrossing', tests-added)
+
+    def getConnectionSettings(self):
+        info = self.settings
+        return {'maxLength': info.getMaximumLength(), 'minConnections': info.getMinimumConnections(),
+                'mode': info.getConnectionMode()}
+
+    def getLineSections(self):
+        '''cells around a node the intersection test has to look at, more than one once
+        the maximum length has grown past what the line partition was built for'''
+        partitions = self.world.lines.partitions
+        return max(1, math.ceil(int(1.5*self.settings.getMaximumLength())/min(partitions['width'], partitions['height'])))
+
+    def linkNodes(self, ids):
+        '''runs the greedy linking for just these nodes, closest candidates first'''
+        graph = self.world.graph
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return
+        index = graph.getIndex()
+        rejected = index.rejected
+        offsets, closeIds, _ = index.radius(graph.getNodes(ids), self.settings.getMaximumLength(), exclude=ids)
+        closeIds = closeIds.tolist()
+        self.profiler.count('edges.rejectedLength', index.rejected-rejected)
+        numSections = self.getLineSections()
+        tests = 0
+        added = 0
+        for i, currentId in enumerate(ids.tolist()):
+            nodeTests, nodeAdded = self.linkNode(currentId, closeIds[offsets[i]:offsets[i+1]], numSections)
+            tests += nodeTests
+            added += nodeAdded
+        self.countLinks(tests, added)
+
+    def removeConnection(self, id1: int, id2: int):
+        graph = self.world.graph
+        graph.removeConnection(id1, id2)
+        self.world.lines.removeLine(graph.getNode(id1), graph.getNode(id2))
+        self.faceIndex = None
+
+    def removeLongConnections(self, maxLength):
+        '''drops every connection longer than maxLength, returns the nodes that lost one'''
+        graph = self.world.graph
+        lines = self.world.lines
+        edges = graph.getEdges()
+        if len(edges) == 0:
+            return np.zeros(0, dtype=np.int64)
+        delta = (graph.getNodes(edges[:, 0]) - graph.getNodes(edges[:, 1])).astype(np.float64)
+        longEdges = edges[np.hypot(delta[:, 0], delta[:, 1]) > maxLength]
+        self.profiler.count('edges.rejectedLength', len(longEdges))
+        if len(longEdges) == 0:
+            return np.zeros(0, dtype=np.int64)
+
+        # the segments are the same connections, so the same length test finds them
+        segments = lines.getSegments().astype(np.float64)
+        lines.removeSegments(np.flatnonzero(np.hypot(segments[:, 0]-segments[:, 2], segments[:, 1]-segments[:, 3]) > maxLength))
+        graph.removeConnections(longEdges.tolist())
+        self.faceIndex = None
+        return np.unique(longEdges)
+
+    def updateConnections(self):
+        '''brings the edges of the current nodes in line with new connection settings
+
+        Only the maximum length and minimum connections may have changed, the nodes
+        stay where they are. Connections longer than the new maximum are removed and
+        only nodes short of connections are linked again, all on the existing line
+        partition. The delaunay mode just rebuilds its edges from the same nodes.
+        '''
+        world = self.world
+        previous = self.connectionSettings
+        current = self.getConnectionSettings()
+        if previous is None or world.graph.nextIndex == 0:
+            self.generateNodes()
+            return
+        if previous == current:
+            return
+
+        with self.profiler.span('updateConnections'):
+            self.relink(previous, current)
+        self.connectionSettings = current
+
+    def relink(self, previous, current):
+        '''the edge changes of updateConnections between two sets of connection settings'''
+        world = self.world
+        info = self.settings
+        self.faceIndex = None
+        if current['mode'] == 'delaunay' or previous['mode'] != current['mode']:
+            world.graph.clearConnections()
+            world.lines.reset()
+            if current['mode'] == 'delaunay':
+                self.connectDelaunay()
+            else:
+                self.connectGreedy()
+        else:
+            if current['maxLength'] < previous['maxLength']:
+                self.removeLongConnections(current['maxLength'])
+            if current['maxLength'] != previous['maxLength']:
+                # the walk's close ids come from this partition
+                world.graph.partition(0, self.width, current['maxLength'], 0, self.height, current['maxLength'])
+
+            graph = world.graph
+            ids = graph.getActiveIds()
+            self.linkNodes(ids[graph.getDegrees()[ids] < info.getMinimumConnections()])
+
+    def insertNode(self, point: Point):
+        '''adds one node and links it and its neighbourhood, returns its id'''
+        world = self.world
+        graph = world.graph
+        if not graph.emptyIds and graph.nextIndex >= graph.size:
+            graph.resize(graph.size + max(1, graph.size//16))
+        # addNode puts it into the partition and the nearest neighbour index in place
+        id = graph.addNode(point)
+        self.faceIndex = None
+
+        self.linkNodes([id])
+        # neighbours that were short of connections may now reach the new node
+        _, closeIds, _ = graph.getIndex().radius(graph.getNodes([id]), self.settings.getMaximumLength(), exclude=[id])
+        self.linkNodes(closeIds[graph.getDegrees()[closeIds] < self.settings.getMinimumConnections()])
+        return id
+
+    def removeNode(self, id: int):
+        '''removes a node with its connections and relinks the neighbours it leaves short'''
+        world = self.world
+        graph = world.graph
+        neighbors = graph.getConnections(id)
+        for other in neighbors:
+            self.removeConnection(id, other)
+        graph.removeNode(id)
+
+        neighbors = np.array(neighbors, dtype=np.int64)
+        self.linkNodes(neighbors[graph.getDegrees()[neighbors] < self.settings.getMinimumConnections()])
+
+    def connectDelaunay(self):
+        '''keeps the short edges of a Delaunay triangulation, planar by construction
+        so no intersection tests are needed'''
+        info = self.settings
+        world = self.world
+
+        ids = world.graph.getActiveIds()
+        nodes = world.graph.getNodes(ids)
+        self.report('nodes', 0.0)
+        with self.profiler.span('triangulate'):
+            triangulation = delaunay.getEdges(delaunay.triangulate(nodes))
+        edges = delaunay.pruneEdges(nodes, triangulation, info.getMaximumLength(), info.getMinimumConnections())
+        self.profiler.count('edges.added', len(edges))
+        self.profiler.count('edges.rejectedLength', len(triangulation)-len(edges))
+
+        for index1, index2 in edges.tolist():
+            world.graph.addConnection(int(ids[index1]), int(ids[index2]))
+        world.lines.addSegments(nodes[edges[:, 0]], nodes[edges[:, 1]])
+
+    def drawGraph(self):
+        self.surface.fill(white)
+
+        for x1, y1, x2, y2 in self.world.lines.getSegments().tolist():
+            pygame.draw.line(self.surface, black, (x1, y1), (x2, y2))
+
+        graph = self.world.graph
+        for node in graph.getNodes(graph.getActiveIds()).tolist():
+            pygame.draw.circle(self.surface, red, node, 4)
+
+    def initPath(self):
+        world = self.world
+        world.clearPath()
+        currentId = world.graph.getRandomIds(1)[0]
+        world.walk = WalkState(world.graph, currentId)
+
+    def step(self):
+        world = self.world
+        walk = world.walk
+        minContinentSides = self.settings.getMinimumContinentSides()
+
+        nextId = walk.getRandomNext(self.rng)
+        if nextId == -1:
+            return -1
+
+        if nextId in walk:
+            # only home can come up again, it closes a continent once the walk is long enough
+            firstIndex = walk.index(nextId)
+            if len(walk) > minContinentSides and firstIndex < len(walk)-minContinentSides:
+                pathPoints = walk.points[firstIndex:]
+
+                color = self.settings.getSemiRandomColor(
+                        pathPoints[0][1]/self.height, self.colorRng)
+
+                world.addContinent(pathPoints, color)
+                return 1
+            return -1
+
+        walk.append(nextId)
+
+        if len(walk) > 100:
+            return -1
+        return 0
+
+    def getFaceIndex(self):
+        if self.faceIndex is None:
+            self.faceIndex = FaceIndex(self.world.graph)
+        return self.faceIndex
+
+    def generateFaceContinent(self):
+        '''merges faces around a random spot into one continent, False once no face can
+        grow past the minimum number of sides'''
+        world = self.world
+        point = (self.rng.randint(0, self.width), self.rng.randint(0, self.height))
+        ids = self.getFaceIndex().findContinent(point, self.settings.getMinimumContinentSides(), self.rng)
+        if ids is None:
+            log.warning('no face can grow into a continent with these settings')
+            return False
+
+        pathPoints = [world.graph.getNode(id) for id in ids]
+        color = self.settings.getSemiRandomColor(pathPoints[0][1]/self.height, self.colorRng)
+        world.addContinent(pathPoints, color)
+        return True
+
+    def generateContinent(self):
+        if self.world.graph.nextIndex == 0:
+            return False
+        if self.settings.getContinentMode() == 'faces':
+            return self.generateFaceContinent()
+        timeout = 0
+        steps = 0
+        createdContinent = False
+        while not createdContinent:
+            self.initPath()
+            isStepping = True
+            while isStepping:
+                stepOutcome = self.step()
+                steps += 1
+                if stepOutcome == 1:
+                    createdContinent = True
+                    isStepping = False
+                if stepOutcome == -1:
+                    isStepping = False
+            timeout+=1
+            if timeout>200:
+                break
+        self.profiler.count('walk.steps', steps)
+        self.profiler.count('walk.retries', timeout-1 if createdContinent else timeout)
+        return createdContinent
+
+    def generateMultipleContinents(self):
+        amount = self.settings.getNumContinents()
+        with self.profiler.span('grow'):
+            for i in range(amount):
+                self.report('continents', i/amount)
+                if self.generateContinent():
+                    self.profiler.count('continents.created')
+        self.redraw()
+
+    def clearContinents(self):
+        self.world.clearContinents()
+        self.world.continentPoints.reset()
+        self.colorPalette = self.settings.palette
+
+    def updateColor(self):
+        self.colorPalette = self.settings.palette
+        self.world.continentColors = []
+        for continent in self.world.continents:
+            color = self.settings.getSemiRandomColor(continent[0][1]/self.height, self.colorRng)
+            self.world.continentColors.append(color)
+
+    def drawContinents(self):
+        world = self.world
+        for i in range(len(world.continents)):
+
+            path = world.continents[i]
+            color = world.continentColors[i]
+
+            coefficient = max((i/len(world.continents))**0.8, 0.5) if self.shadeContinents else 1
+
+            if len(path) < 3:
+                continue
+            if self.indexed:
+                slot = self.colorTable.getSlot(self.colorPalette, color)
+                index = self.colorTable.blackIndex if slot is None else self.colorTable.getLandIndex(slot, coefficient)
+                pygame.draw.polygon(self.surface, index, path)
+                continue
+            try:
+                pygame.draw.polygon(
+                    self.surface, (coefficient*pygame.Color(color).r, coefficient*pygame.Color(
+                        color).g, coefficient*pygame.Color(color).b), path)
+            except:
+                pygame.draw.polygon(
+                    self.surface, (0,0,0), path)
+
+    def redraw(self):
+        with self.profiler.span('redraw'):
+            if self.indexed:
+                self.blackWhite = False
+                self.surface.set_palette(self.colorTable.getColors(self.settings.palette))
+                self.surface.fill(self.colorTable.waterIndex)
+            else:
+                self.surface.fill(self.settings.getWater())
+            self.drawContinents()
+
+    def getWaterLayers(self):
+        '''water depth layer of every pixel, looked up from the cached coast distance'''
+        info = self.settings
+        key = (info.getWaterWidth(), info.getWaterMinLength())
+        if self.waterLayers is None or self.waterLayersKey != key or self.waterLayersSource is not self.world.coastDistance:
+            self.profiler.count('waterLayers.builds')
+            width = info.getWaterWidth()
+            firstLayerMultiplier = 1.1
+
+            distance = np.minimum(self.world.getCoastDistance(), info.getWaterMinLength())
+            layers = (distance-width*(firstLayerMultiplier-1))//width
+            layers[distance < width*firstLayerMultiplier] = 0
+
+            self.waterLayers = layers.astype(np.int32)
+            self.waterLayersKey = key
+            self.waterLayersSource = self.world.coastDistance
+        return self.waterLayers
+
+    def waterDepth(self, x, y, color):
+        info = self.settings
+        multiplier = info.getWaterMultiplier()
+        self.profiler.count('waterDepth.calls')
+
+        layer = self.getWaterLayers()[x, y]
+        offset = int(self.rng.randrange(1, 3) - multiplier*layer)
+        color[0] = max(0, min(info.getWater()[0] + offset, 255))
+        color[1] = max(0, min(info.getWater()[1] + offset, 255))
+        color[2] = max(0, min(info.getWater()[2] + offset, 255))
+
+        return (layer, color)
+
+    def sample(self, generator, amount):
+        '''random pixels with their colors read from the surface, water pixels already
+        recolored by depth the way waterDepth does it
+
+        Only water that still has the plain water color counts, water painted before
+        keeps its color and is smeared like land, which roughens the depth bands. The
+        continent labels decide what is land, so land never passes for water whatever
+        color it was given. Indexed surfaces get ColorTable indices instead of colors.'''
+        info = self.settings
+
+        self.profiler.count('refine.samples', amount)
+        xs = generator.integers(0, self.width, size=amount)
+        ys = generator.integers(0, self.height, size=amount)
+
+        if self.indexed:
+            indices = pygame.surfarray.pixels2d(self.surface)[xs, ys].astype(np.int64)
+            water = (self.world.getLabels()[xs, ys] == 0) & (indices == self.colorTable.waterIndex)
+            layers = np.where(water, self.getWaterLayers()[xs, ys], 0)
+            offsets = generator.integers(1, 3, size=amount)
+            indices[water] = self.colorTable.getDepthIndices(layers[water], offsets[water])
+            return xs, ys, indices.astype(np.uint8), water, layers
+
+        colors = pygame.surfarray.pixels3d(self.surface)[xs, ys].astype(np.int64)
+        water = (self.world.getLabels()[xs, ys] == 0) & (colors == np.array(info.getWater()[:3])).all(axis=1)
+
+        layers = np.where(water, self.getWaterLayers()[xs, ys], 0)
+        offsets = generator.integers(1, 3, size=amount) - info.getWaterMultiplier()*layers
+        colors[water] = np.clip(np.array(info.getWater()[:3])[None, :] + offsets[water, None], 0, 255)
+
+        return xs, ys, colors.astype(np.uint8), water, layers
+
+    def refine(self, shape=None, attemptsPerIteration=10000):
+        if shape is None:
+            shape = self.settings.shape
+        with self.profiler.span(f'refine {shape}'):
+            self.refineShape(shape, attemptsPerIteration)
+
+    def refineShape(self, shape, attemptsPerIteration):
+        info = self.settings
+        window = self.surface
+
+        # samples are drawn and stamped a whole size level at a time straight into the pixel array
+        generator = np.random.default_rng(self.rng.getrandbits(64))
+
+        if shape == 'dot' or shape == 'dot [d]':
+
+            for j in range(5, 1, -1):
+                self.checkCancelled('refine')
+                xs, ys, colors, water, layers = self.sample(generator, attemptsPerIteration)
+                radii = np.where(water, j*(layers+1)/2, j)
+                raster.stampDiscs(self.getPixels(), xs, ys, radii, colors)
+
+        elif shape == 'square' or shape == 'square [s]':
+
+            for j in range(6, 1, -1):
+                self.checkCancelled('refine')
+                xs, ys, colors, water, layers = self.sample(generator, attemptsPerIteration)
+                sizes = np.where(water, j*(layers+1), j)
+                raster.stampSquares(self.getPixels(), xs, ys, sizes, colors)
+
+        elif shape == 'triangle' or shape == 'triangle [p]':
+
+            for j in range(7, 2, -1):
+                self.checkCancelled('refine')
+                xs, ys, colors, water, layers = self.sample(generator, attemptsPerIteration)
+                widths = np.where(water, (j+layers*2).astype(np.int64), j)
+                spread = generator.integers(0, 2*widths[:, None, None]+2, size=(attemptsPerIteration, 3, 2))
+                corners = np.stack((xs, ys), axis=1)[:, None, :] - widths[:, None, None] + spread
+                raster.stampTriangles(self.getPixels(), corners, colors)
+
+        elif shape == 'blur' or shape == 'blur [g]':
+
+            if self.indexed:
+                # averaging indices means nothing, blurring needs the colors of an rgb surface
+                log.warning('blur needs the rgb render mode')
+                return
+
+            # only the land is blurred, the water keeps its depth shading
+            land = self.world.getLandMask()
+            blurred = pygame.surfarray.pixels3d(pygame.transform.gaussian_blur(window, 3))
+            self.getPixels()[land] = blurred[land]
+
+        elif shape == 'water' or shape == 'water [o]':
+
+            approachingEnd = False
+            while not approachingEnd:
+                for j in range(5, 1, -1):
+                    self.checkCancelled('refine')
+                    xs, ys, colors, water, layers = self.sample(generator, attemptsPerIteration)
+                    hits = water & (layers > 1)
+                    raster.stampDiscs(self.getPixels(), xs[hits], ys[hits],
+                                      j*(layers[hits]+1)/1.5, colors[hits])
+                    if hits.sum() < attemptsPerIteration/100:
+                        approachingEnd = True
+
+        elif shape == 'black-white':
+
+            if self.indexed:
+                # land indices all get white and the rest black until the next palette or redraw
+                self.blackWhite = True
+                self.surface.set_palette(self.colorTable.getColors(info.palette, True))
+                return
+
+            pixels = self.getPixels()
+            pixels[...] = np.where(self.world.getLandMask(), 255, 0)[:, :, None]
+
+    def render(self, scale=1.0):
+        '''water, continents and roughening onto the surface, scale multiplies the
+        number of samples for surfaces bigger or smaller than the default map'''
+        self.seedStage('refine')
+        self.report('raster', 0.0)
+        self.redraw()
+        self.refine('water', int(10000*scale))
+        self.drawContinents()
+        self.refine(shape='dot', attemptsPerIteration=int(500*scale))
+        for i in range(25):
+            self.report('raster', (i+2)/27)
+            self.refine(attemptsPerIteration=int(1500*scale))
+
+    def getStageInputs(self):
+        '''the settings each cached stage reads, in pipeline order'''
+        info = self.settings
+        return {
+            'nodes': {'seed': self.seedValue, 'width': self.width, 'height': self.height,
+                      'points': info.getNumPoints(), 'distance': info.getMaximumLength(),
+                      'connections': info.getMinimumConnections(), 'mode': info.getConnectionMode()},
+            'continents': {'sides': info.getMinimumContinentSides(), 'continents': info.getNumContinents(),
+                           'mode': info.getContinentMode()},
+            'distance': {},
+            'raster': {'palette': info.palette, 'levels': info.getWaterLevels(), 'waterWidth': info.getWaterWidth(),
+                       'shape': info.shape, 'indexed': self.indexed},
+        }
+
+    def restoreGraph(self, nodes, offsets, neighbors):
+        self.world.graph.reset(len(nodes))
+        self.world.graph.addNodes(nodes)
+        self.restoreAdjacency(offsets, neighbors)
+
+    def restoreAdjacency(self, offsets, neighbors):
+        '''sets the connections of the current nodes from Graph.getAdjacency arrays, so
+        every node's neighbours keep their order and walks on them stay the same, the
+        graph's adjacency lists are only built once something needs them'''
+        info = self.settings
+        world = self.world
+
+        self.faceIndex = None
+        world.graph.partition(0, self.width, info.getMaximumLength(), 0, self.height, info.getMaximumLength())
+        world.clearLines(0, self.width, info.getMaximumLength(), 0, self.height, info.getMaximumLength())
+
+        world.graph.setAdjacency(offsets, neighbors)
+        edges = world.graph.getEdges()
+        world.lines.addSegments(world.graph.getNodes(edges[:, 0]), world.graph.getNodes(edges[:, 1]))
+        self.connectionSettings = self.getConnectionSettings()
+
+    def restoreContinents(self, points, offsets):
+        self.clearContinents()
+        points = [tuple(point) for point in points.tolist()]
+        for start, end in zip(offsets[:-1], offsets[1:]):
+            self.world.addContinent(points[start:end], None)
+
+    def packContinents(self):
+        continents = self.world.continents
+        offsets = np.zeros(len(continents)+1, dtype=np.int64)
+        offsets[1:] = np.cumsum([len(continent) for continent in continents])
+        points = np.array([point for continent in continents for point in continent], dtype=np.int32).reshape(-1, 2)
+        return points, offsets
+
+    def packWorld(self, raster=True):
+        '''(header, arrays) of everything the world is made of, for worldfile.writeWorld,
+        with raster the surface pixels are included'''
+        world = self.world
+        graph = world.graph
+        points, offsets = self.packContinents()
+        adjacencyOffsets, adjacency = graph.getAdjacency()
+        # continents without a color yet are stored as transparent black
+        colors = np.array([tuple(pygame.Color(color)) if color is not None else (0, 0, 0, 0)
+                           for color in world.continentColors], dtype=np.uint8).reshape(-1, 4)
+
+        header = {'seed': self.seedValue, 'settings': self.settings.getValues(), 'indexed': self.indexed,
+                  'nextIndex': graph.nextIndex, 'connectionSettings': self.connectionSettings}
+        arrays = {'nodes': graph.nodes, 'active': graph.active, 'emptyIds': np.array(graph.emptyIds, dtype=np.int32),
+                  'adjacencyOffsets': adjacencyOffsets, 'adjacency': adjacency, 'continentPoints': points, 'continentOffsets': offsets,
+                  'continentColors': colors}
+        if world.coastDistance is not None:
+            arrays['coastDistance'] = world.coastDistance
+        if raster:
+            arrays['raster'] = np.array(self.getPixels())
+        return header, arrays
+
+    def restoreWorld(self, header, arrays, raster=True):
+        '''takes over a world from packWorld or worldfile.readWorld, the arrays are used as
+        they are where possible, with raster saved pixels are put back on the surface'''
+        self.settings = MapSettings(**header['settings'])
+        if (self.settings.map_width, self.settings.win_height) != (self.width, self.height):
+            raise ValueError(f'the world is {self.settings.map_width}x{self.settings.win_height}, '
+                             f'the engine {self.width}x{self.height}')
+        self.seed(header['seed'])
+
+        self.world.graph.setNodes(arrays['nodes'], arrays['active'], header['nextIndex'], arrays['emptyIds'].tolist())
+        self.restoreAdjacency(arrays['adjacencyOffsets'], arrays['adjacency'])
+        self.connectionSettings = header['connectionSettings']
+
+        self.restoreContinents(arrays['continentPoints'], arrays['continentOffsets'])
+        self.world.continentColors = [pygame.Color(color) if color[3] else None for color in arrays['continentColors'].tolist()]
+        if 'coastDistance' in arrays:
+            self.world.coastDistance = arrays['coastDistance']
+
+        self.setIndexed(header['indexed'])
+        if self.indexed:
+            self.blackWhite = False
+            self.surface.set_palette(self.colorTable.getColors(self.settings.palette))
+        if raster and 'raster' in arrays:
+            self.getPixels()[...] = arrays['raster']
+
+    def loadStage(self, cache, stage: str, inputs, key):
+        '''the stage's cache key and stored arrays, None for them without a cache or on a miss'''
+        if cache is None:
+            return None, None
+        key = cache.key(stage, inputs[stage], key)
+        stored = cache.load(key)
+        self.profiler.count('cache.misses' if stored is None else 'cache.hits')
+        return key, stored
+
+    def autoGenerate(self, cache=None):
+        '''runs the full pipeline and returns the world and its raster,
+        seconds spent per stage are left in self.timings and self.profiler holds
+        the spans and counters of this run
+
+        With a StageCache every stage first looks for its output under a key built from
+        its inputs and the previous stage's key, and only runs when that misses.
+        '''
+        self.timings = {}
+        self.profiler.reset()
+        inputs = self.getStageInputs()
+        key = None
+
+        with self.profiler.span('nodes') as span:
+            key, stored = self.loadStage(cache, 'nodes', inputs, key)
+            # entries from before the neighbour order was kept are generated again
+            if stored is not None and 'neighbors' in stored:
+                self.restoreGraph(stored['nodes'], stored['offsets'], stored['neighbors'])
+            else:
+                self.seedStage('nodes')
+                self.clearContinents()
+                self.generateNodes()
+                if cache is not None:
+                    graph = self.world.graph
+                    offsets, neighbors = graph.getAdjacency()
+                    cache.store(key, nodes=graph.getNodes(graph.getActiveIds()), offsets=offsets, neighbors=neighbors)
+        self.timings['nodes'] = span.seconds
+
+        with self.profiler.span('continents') as span:
+            key, stored = self.loadStage(cache, 'continents', inputs, key)
+            if stored is not None:
+                self.restoreContinents(stored['points'], stored['offsets'])
+            else:
+                self.seedStage('continents')
+                self.clearContinents()
+                self.generateMultipleContinents()
+                if cache is not None:
+                    points, offsets = self.packContinents()
+                    cache.store(key, points=points, offsets=offsets)
+
+            # cached continents come back without colors, recolor in either case so both paths match
+            self.colorRng.seed(f'{self.seedValue}:colors')
+            self.updateColor()
+        self.timings['continents'] = span.seconds
+
+        with self.profiler.span('distance') as span:
+            self.report('distance', 0.0)
+            key, stored = self.loadStage(cache, 'distance', inputs, key)
+            if stored is not None:
+                self.world.coastDistance = stored['distance']
+            else:
+                self.world.getCoastDistance()
+                if cache is not None:
+                    cache.store(key, distance=self.world.coastDistance)
+        self.timings['distance'] = span.seconds
+
+        with self.profiler.span('raster') as span:
+            key, stored = self.loadStage(cache, 'raster', inputs, key)
+            if stored is not None:
+                self.getPixels()[...] = stored['raster']
+            else:
+                self.render()
+                if cache is not None:
+                    cache.store(key, raster=np.array(self.getPixels()))
+        self.timings['refine'] = span.seconds
+
+        return self.world, self.getRaster()
+
+    def getShadedContinents(self):
+        '''(points, color) of every continent with the shading drawContinents applies'''
+        continents = []
+        world = self.world
+        for i in range(len(world.continents)):
+            coefficient = max((i/len(world.continents))**0.8, 0.5)
+            try:
+                color = pygame.Color(world.continentColors[i])
+                color = (int(coefficient*color.r), int(coefficient*color.g), int(coefficient*color.b))
+            except (ValueError, TypeError):
+                color = (0, 0, 0)
+            if len(world.continents[i]) >= 3:
+                continents.append((world.continents[i], color))
+        return continents
+
+    def export(self, filename=None, compression=None, callback=printExport):
+        '''queues the map for writing in the background, returns a Future for the filename'''
+        # only the copy and queueing, the PNG itself is written on the export threads
+        with self.profiler.span('export'):
+            return export_window_as_png(self.surface, self.width, self.height, filename, compression, callback)
+
+
+def getStampReach(settings: MapSettings):
+    '''how far from its sample a refine stamp can paint, in pixels
+
+    Water stamps grow with the depth layer, which stays below waterLevels since
+    getWaterLayers caps the coast distance at getWaterMinLength.'''
+    layers = max(0, settings.getWaterLevels()-1)
+    # the largest dot, square, triangle and water stamp of refineShape
+    return max(5*(layers+1)//2, 6*(layers+1)//2, 7+2*layers+1, int(5*(layers+1)/1.5))
+
+
+def renderArea(settings: MapSettings, continents, left: int, top: int, width: int, height: int, margin: int,
+               seed, coastDistance=None):
+    '''(width, height, 3) pixels of the area at left, top of a bigger map
+
+    continents are (points, color) in map coordinates with their colors already
+    shaded. The area is drawn with margin extra pixels on every side, so water depth
+    and roughening near its edges match the areas next to it, then cropped.
+    coastDistance optionally gives the distance field of the padded area.
+    '''
+    padded = MapSettings(width + 2*margin, height + 2*margin, palette=settings.palette,
+                         waterLevels=settings.getWaterLevels(), waterWidth=settings.getWaterWidth(), shape=settings.shape)
+    engine = MapEngine(padded, seed=seed)
+    engine.shadeContinents = False
+    left, top = left-margin, top-margin
+
+    # set directly since continents may reach past the engine's bounds
+    world = engine.world
+    for points, color in continents:
+        xs, ys = zip(*points)
+        if max(xs) < left or min(xs) >= left+padded.map_width or max(ys) < top or min(ys) >= top+padded.win_height:
+            continue
+        world.continents.append([(x-left, y-top) for x, y in points])
+        world.continentColors.append(color)
+    world.coastDistance = coastDistance
+
+    engine.render((padded.map_width*padded.win_height)/(settings.map_width*settings.win_height))
+    return engine.getRaster()[margin:margin+width, margin:margin+height]
+
+
+def generateMap(seed=None, **kwargs):
+    '''headless shortcut, takes the MapSettings keyword arguments'''
+    settings = MapSettings(kwargs.pop('map_width', 1000), kwargs.pop('win_height', 750), **kwargs)
+    engine = MapEngine(settings, seed)
+    return engine.autoGenerate()
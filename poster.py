@@ -0,0 +1,95 @@
+import os
+import time
+import numpy as np
+from exporter import writePng
+from mapclasses import MapSettings
+from mapengine import getStampReach, renderArea
+
+# exports far bigger than the window, e.g. a 16000x12000 poster of a 1000x750 map:
+#   engine.autoGenerate()
+#   exportPoster(engine, 'export/poster.png', scale=16)
+# The image is rendered a tile at a time into a numpy.memmap canvas on disk and then
+# streamed into the PNG a band of rows at a time, so memory stays at about one tile.
+
+
+def createCanvas(filename, width: int, height: int):
+    return np.memmap(f'{filename}.canvas', dtype=np.uint8, mode='w+', shape=(height, width, 3))
+
+
+def finishCanvas(filename, canvas, compression):
+    canvas.flush()
+    writePng(filename, canvas, compression)
+    path = canvas.filename
+    del canvas
+    os.remove(path)
+    print(f'Exported to {filename}')
+
+
+def getTiles(width: int, height: int, tileSize: int):
+    for top in range(0, height, tileSize):
+        for left in range(0, width, tileSize):
+            yield left, top, min(tileSize, width-left), min(tileSize, height-top)
+
+
+def sampleBilinear(field, xs, ys):
+    '''field [x, y] read at fractional coordinates, clamped to its edges'''
+    xs = np.clip(xs, 0, field.shape[0]-1)
+    ys = np.clip(ys, 0, field.shape[1]-1)
+    x0 = np.clip(xs.astype(np.int64), 0, max(0, field.shape[0]-2))
+    y0 = np.clip(ys.astype(np.int64), 0, max(0, field.shape[1]-2))
+    x1 = np.minimum(x0+1, field.shape[0]-1)
+    y1 = np.minimum(y0+1, field.shape[1]-1)
+    fx = (xs-x0)[:, None]
+    fy = (ys-y0)[None, :]
+    return ((field[np.ix_(x0, y0)]*(1-fx) + field[np.ix_(x1, y0)]*fx)*(1-fy) +
+            (field[np.ix_(x0, y1)]*(1-fx) + field[np.ix_(x1, y1)]*fx)*fy)
+
+
+def exportPoster(engine, filename=None, scale=16, tileSize=2048, compression=6):
+    '''renders the engine's continents scale times bigger, tile by tile
+
+    Coastlines are drawn sharp at the full size. The water depth comes from the map's
+    distance field, scaled up and interpolated, so no tile needs the land a whole
+    water width away, and roughening is sampled at the normal density per pixel.
+    '''
+    info = engine.settings
+    width, height = engine.width*scale, engine.height*scale
+    if filename is None:
+        filename = f'export/map-generator_{time.strftime("%Y-%m-%d_%H-%M-%S")}_poster.png'
+
+    continents = [([(x*scale, y*scale) for x, y in points], color) for points, color in engine.getShadedContinents()]
+    distance = engine.world.getCoastDistance()
+    # map sized settings with scaled water, so samples per pixel stay those of a normal map
+    settings = MapSettings(engine.width, engine.height, palette=info.palette, waterLevels=info.getWaterLevels(),
+                           waterWidth=info.getWaterWidth()*scale, shape=info.shape)
+    # the depth comes from the distance field, the margin only has to catch stamps from outside the tile
+    margin = getStampReach(settings)
+
+    canvas = createCanvas(filename, width, height)
+    for left, top, tileWidth, tileHeight in getTiles(width, height, tileSize):
+        xs = (np.arange(left-margin, left+tileWidth+margin)+0.5)/scale - 0.5
+        ys = (np.arange(top-margin, top+tileHeight+margin)+0.5)/scale - 0.5
+        coastDistance = sampleBilinear(distance, xs, ys)*scale
+
+        pixels = renderArea(settings, continents, left, top, tileWidth, tileHeight, margin,
+                            f'{engine.seedValue}:poster:{left}:{top}', coastDistance)
+        canvas[top:top+tileHeight, left:left+tileWidth] = pixels.transpose(1, 0, 2)
+
+    finishCanvas(filename, canvas, compression)
+    return filename
+
+
+def exportRegion(world, x: int, y: int, width: int, height: int, filename, compression=6):
+    '''writes any area of a TileWorld to a PNG, one world tile at a time'''
+    canvas = createCanvas(filename, width, height)
+    firstX, firstY = world.getTileAt(x, y)
+    lastX, lastY = world.getTileAt(x+width-1, y+height-1)
+    for ty in range(firstY, lastY+1):
+        for tx in range(firstX, lastX+1):
+            x0, y0 = tx*world.tileWidth, ty*world.tileHeight
+            left, top = max(x, x0), max(y, y0)
+            right, bottom = min(x+width, x0+world.tileWidth), min(y+height, y0+world.tileHeight)
+            canvas[top-y:bottom-y, left-x:right-x] = world.getTile(tx, ty)[left-x0:right-x0, top-y0:bottom-y0].transpose(1, 0, 2)
+
+    finishCanvas(filename, canvas, compression)
+    return filename
@@ -0,0 +1,74 @@
+import numpy as np
+
+# shapes are stamped straight into a (width, height, 3) pixel array, the same
+# [x, y] layout pygame.surfarray uses, one numpy assignment per group of equal sized shapes
+
+discOffsets = {}
+
+
+def getDiscOffsets(radius: int):
+    '''(dx, dy) of every pixel in a filled circle, cached per radius'''
+    if radius not in discOffsets:
+        steps = np.arange(-radius, radius+1)
+        dx, dy = np.meshgrid(steps, steps, indexing='ij')
+        inside = dx*dx + dy*dy <= radius*radius + radius
+        discOffsets[radius] = (dx[inside], dy[inside])
+    return discOffsets[radius]
+
+
+def stamp(pixels, xs, ys, colors):
+    '''writes colors[i] at every (xs[i, j], ys[i, j]) that falls inside pixels'''
+    width, height = pixels.shape[:2]
+    inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+    rows = np.nonzero(inside)[0]
+    pixels[xs[inside], ys[inside]] = colors[rows]
+
+
+def stampDiscs(pixels, xs, ys, radii, colors):
+    radii = np.asarray(radii).astype(np.int64)
+    for radius in np.unique(radii):
+        if radius < 1:
+            continue
+        group = radii == radius
+        dx, dy = getDiscOffsets(int(radius))
+        stamp(pixels, xs[group, None] + dx[None, :], ys[group, None] + dy[None, :], colors[group])
+
+
+def stampSquares(pixels, xs, ys, sizes, colors):
+    '''squares of side sizes[i] with the same corner rounding as pygame.Rect(x-s//2, y-s//2, s, s)'''
+    sizes = np.asarray(sizes).astype(np.int64)
+    for size in np.unique(sizes):
+        if size < 1:
+            continue
+        group = sizes == size
+        steps = np.arange(size)
+        dx, dy = np.meshgrid(steps, steps, indexing='ij')
+        left = xs[group] - size//2
+        top = ys[group] - size//2
+        stamp(pixels, left[:, None] + dx.ravel()[None, :], top[:, None] + dy.ravel()[None, :], colors[group])
+
+
+def stampTriangles(pixels, corners, colors):
+    '''filled triangles, corners is an (n, 3, 2) integer array'''
+    corners = np.asarray(corners, dtype=np.int64)
+    low = corners.min(axis=1)
+    spans = (corners.max(axis=1) - low).max(axis=1) + 1
+
+    for span in np.unique(spans):
+        group = np.flatnonzero(spans == span)
+        steps = np.arange(span)
+        dx, dy = np.meshgrid(steps, steps, indexing='ij')
+        xs = low[group, 0, None] + dx.ravel()[None, :]
+        ys = low[group, 1, None] + dy.ravel()[None, :]
+
+        # a pixel is inside when it is on the same side of all three edges, edges included
+        signs = []
+        for a, b in ((0, 1), (1, 2), (2, 0)):
+            ax, ay = corners[group, a, 0, None], corners[group, a, 1, None]
+            bx, by = corners[group, b, 0, None], corners[group, b, 1, None]
+            signs.append((bx-ax)*(ys-ay) - (by-ay)*(xs-ax))
+        inside = (((signs[0] >= 0) & (signs[1] >= 0) & (signs[2] >= 0)) |
+                  ((signs[0] <= 0) & (signs[1] <= 0) & (signs[2] <= 0)))
+
+        xs = np.where(inside, xs, -1)
+        stamp(pixels, xs, ys, colors[group])
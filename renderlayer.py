@@ -0,0 +1,92 @@
+import pygame
+import pygame_widgets
+
+# Sends only the parts of the window that changed to the display. Widgets are drawn
+# into the window whenever there is input, but a slider, button or label only counts
+# as changed when its value or look did, so idle frames and plain mouse moves update
+# nothing. The map is only sent when a new image was shown.
+
+
+class RenderLayer:
+
+    def __init__(self, window, info, background=(255, 255, 255)):
+        self.window = window
+        self.info = info
+        self.background = background
+
+        self.mapRect = pygame.Rect(0, 0, info.map_width, info.win_height)
+        self.panelRect = pygame.Rect(info.map_width, 0, info.slider_width, info.win_height)
+        self.statusRect = pygame.Rect(info.map_width, info.win_height-40, info.slider_width, 40)
+
+        self.states = {}
+        self.status = ''
+        self.statusDrawn = False
+        self.dirty = []
+        self.redrawPanel = True
+        self.markAll()
+
+    def markDirty(self, rect):
+        self.dirty.append(pygame.Rect(rect))
+
+    def markAll(self):
+        '''sends the whole window next frame, e.g. after it was uncovered'''
+        self.redrawPanel = True
+        self.markDirty(self.window.get_rect())
+
+    def showMap(self, surface):
+        self.window.blit(surface, self.mapRect)
+        self.markDirty(self.mapRect)
+
+    def getWidgetStates(self):
+        '''(widget, state, rect) of every slider and button'''
+        for slider in self.info.sliders.values():
+            radius = slider.handleRadius + 1
+            rect = pygame.Rect(slider.getX()-radius, slider.getY()+slider.getHeight()//2-radius,
+                               slider.getWidth()+2*radius, 2*radius)
+            yield slider, (slider.getValue(), slider.selected), rect
+        for button in self.info.buttons.values():
+            yield button, (button.colour, button.borderColour), pygame.Rect(button.getX(), button.getY(), button.getWidth(), button.getHeight())
+
+    def updatePanel(self, events):
+        '''redraws the panel when there is input, marking what changed since the last time'''
+        if not events and not self.redrawPanel:
+            return
+        self.redrawPanel = False
+
+        pygame.draw.rect(self.window, self.background, self.panelRect)
+        pygame_widgets.update(events)
+
+        for widget, state, rect in self.getWidgetStates():
+            if self.states.get(widget) != state:
+                self.states[widget] = state
+                self.markDirty(rect)
+
+        for box in self.info.textBoxes:
+            rect = box.render(self.window)
+            label = box.getLabel()
+            previous = self.states.get(box)
+            if previous is None or previous[0] != label:
+                self.states[box] = (label, rect)
+                # a shorter label has to clear what the longer one covered
+                self.markDirty(rect if previous is None else rect.union(previous[1]))
+
+        # the panel was painted over, the status has to be drawn again
+        self.statusDrawn = False
+
+    def updateStatus(self, status: str):
+        if status == self.status and self.statusDrawn:
+            return
+        if status != self.status:
+            self.status = status
+            self.markDirty(self.statusRect)
+        self.statusDrawn = True
+        pygame.draw.rect(self.window, self.background, self.statusRect)
+        if status:
+            text = self.info.font.render(status, True, (0, 0, 0))
+            self.window.blit(text, text.get_rect(center=self.statusRect.center))
+
+    def flip(self):
+        '''sends the marked rects to the display'''
+        if self.dirty:
+            pygame.display.update(self.dirty)
+            self.dirty = []
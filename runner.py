@@ -0,0 +1,85 @@
+import threading
+import time
+import traceback
+from mapengine import GenerationCancelled
+
+# runs engine work on a thread so the window keeps drawing. Only one run touches the
+# engine at a time, starting a new one cancels the current run and takes over once it
+# has stopped. poll() is called every frame on the main thread and runs the callbacks there.
+
+
+class BackgroundRunner:
+
+    def __init__(self, engine):
+        self.engine = engine
+        self.thread = None
+        self.current = None
+        self.pending = None
+        self.finished = None
+
+    def start(self, name: str, work, onDone=None, replace=True):
+        '''runs work() on the worker thread, onDone() afterwards on the main thread
+
+        With replace a running job is cancelled in favour of this one, otherwise
+        the request is dropped while something is running, e.g. for held keys.
+        '''
+        if self.isBusy():
+            if not replace:
+                return False
+            self.engine.cancel()
+            self.pending = (name, work, onDone)
+            return True
+
+        self.launch(name, work, onDone)
+        return True
+
+    def launch(self, name, work, onDone):
+        self.engine.cancelEvent.clear()
+        self.engine.progress = {'stage': name, 'fraction': 0.0}
+        self.current = {'name': name, 'onDone': onDone, 'started': time.time(), 'outcome': None}
+        self.thread = threading.Thread(target=self.run, args=(work, self.current), name=f'generate-{name}', daemon=True)
+        self.thread.start()
+
+    def run(self, work, job):
+        try:
+            work()
+            job['outcome'] = 'done'
+        except GenerationCancelled:
+            job['outcome'] = 'cancelled'
+        except Exception:
+            traceback.print_exc()
+            job['outcome'] = 'failed'
+
+    def poll(self):
+        '''call once per frame, returns True when a job finished since the last call'''
+        if self.thread is None or self.thread.is_alive():
+            return False
+
+        job = self.current
+        self.thread = None
+        self.current = None
+        self.finished = job
+        if job['outcome'] == 'done' and job['onDone'] is not None:
+            job['onDone']()
+
+        if self.pending is not None:
+            name, work, onDone = self.pending
+            self.pending = None
+            self.launch(name, work, onDone)
+        return True
+
+    def isBusy(self):
+        return self.thread is not None
+
+    def cancel(self):
+        self.pending = None
+        if self.isBusy():
+            self.engine.cancel()
+
+    def getStatus(self):
+        '''one line for the window, e.g. "continents 40% 1.2s", empty when idle'''
+        if self.current is None:
+            return ''
+        progress = self.engine.progress
+        stage = progress['stage'] or self.current['name']
+        return f"{stage} {int(100*progress['fraction'])}% {time.time()-self.current['started']:.1f}s"
@@ -0,0 +1,376 @@
+import math
+import numpy as np
+
+
+class PointIndex:
+    '''nearest neighbour index over an (n, 2) array of points
+
+    Points are bucketed into a uniform grid stored as a padded (cells, maxPerCell)
+    id table, so every query is answered for a whole array of query points with
+    a handful of numpy operations instead of a tree walk per point. Queries that
+    cannot be settled from the cells around them fall back to a brute force pass.
+    Single points can be inserted and removed in place, see insert and remove.
+    '''
+
+    def __init__(self, points, labels=None, cellSize=None, maxCandidates=1 << 22):
+
+        self.points = np.asarray(points, dtype=np.float64).reshape(-1, 2)
+        self.size = len(self.points)
+        self.labels = np.arange(self.size) if labels is None else np.asarray(labels)
+        self.maxCandidates = maxCandidates
+        # points radius found in the cells around its queries but dropped as too far, summed over all calls
+        self.rejected = 0
+
+        if self.size == 0:
+            self.xMin = self.yMin = 0.0
+            self.cellSize = 1.0 if cellSize is None else float(cellSize)
+            self.numX = self.numY = 1
+            self.table = np.full((2, 1), -1, dtype=np.int32)
+            self.setStorage()
+            return
+
+        self.xMin, self.yMin = self.points.min(axis=0)
+        xMax, yMax = self.points.max(axis=0)
+
+        if cellSize is None:
+            # about three points per cell, a square of 3x3 cells then usually holds the 8 nearest
+            area = max((xMax-self.xMin)*(yMax-self.yMin), 1.0)
+            cellSize = math.sqrt(3*area/self.size)
+        self.cellSize = max(float(cellSize), 1e-9)
+
+        self.numX = int((xMax-self.xMin)//self.cellSize) + 1
+        self.numY = int((yMax-self.yMin)//self.cellSize) + 1
+
+        cells = self.getCells(self.points)
+        order = np.argsort(cells, kind='stable')
+        counts = np.bincount(cells, minlength=self.numX*self.numY)
+        offsets = np.concatenate(([0], np.cumsum(counts)))
+
+        # points are kept in cell order so the candidates of one query sit close together in memory
+        self.points = self.points[order]
+        self.labels = self.labels[order]
+
+        # row numX*numY stays empty and is used for cells outside the grid
+        sortedCells = cells[order]
+        self.table = np.full((self.numX*self.numY+1, max(1, counts.max())), -1, dtype=np.int32)
+        self.table[sortedCells, np.arange(self.size)-offsets[sortedCells]] = np.arange(self.size)
+        self.setStorage()
+
+    def setStorage(self):
+        # float32 offsets from the grid corner halve the memory traffic of the candidate scans,
+        # exact float64 distances are recomputed for the results that are returned.
+        # One sentinel entry at the end so the -1 padding in the table reads as infinitely far away
+        self.xs = np.append((self.points[:, 0]-self.xMin).astype(np.float32), np.float32(np.inf))
+        self.ys = np.append((self.points[:, 1]-self.yMin).astype(np.float32), np.float32(np.inf))
+        self.labelOrder = np.argsort(self.labels, kind='stable')
+
+    def getPositions(self, labels):
+        '''storage position of each label, -2 for labels not in the index'''
+        labels = np.asarray(labels)
+        if len(self.labelOrder) == 0:
+            return np.full(labels.shape, -2, dtype=np.int64)
+        found = np.minimum(np.searchsorted(self.labels[self.labelOrder], labels), len(self.labelOrder)-1)
+        positions = self.labelOrder[found]
+        return np.where(self.labels[positions] == labels, positions, -2)
+
+    def insert(self, point, label):
+        '''adds one point in place, False when it lies outside the grid and the index
+        has to be built again'''
+        point = np.asarray(point, dtype=np.float64).reshape(1, 2)
+        if self.size == 0:
+            return False
+        x, y = (point[0]-(self.xMin, self.yMin))//self.cellSize
+        if not (0 <= x < self.numX and 0 <= y < self.numY):
+            return False
+
+        cell = int(self.getCells(point)[0])
+        count = int((self.table[cell] >= 0).sum())
+        if count == self.table.shape[1]:
+            self.table = np.pad(self.table, ((0, 0), (0, 1)), constant_values=-1)
+
+        # the new point takes the next position, the sentinel stays last
+        position = self.size
+        self.points = np.concatenate((self.points, point))
+        self.labels = np.append(self.labels, label)
+        self.xs = np.insert(self.xs, position, np.float32(point[0, 0]-self.xMin))
+        self.ys = np.insert(self.ys, position, np.float32(point[0, 1]-self.yMin))
+        self.labelOrder = np.insert(self.labelOrder, np.searchsorted(self.labels[self.labelOrder], label), position)
+        self.table[cell, count] = position
+        self.size += 1
+        return True
+
+    def remove(self, label):
+        '''drops the point with this label in place, its position is left as a hole
+        that reads as infinitely far away'''
+        position = int(self.getPositions([label])[0])
+        if position < 0:
+            return
+        cell = int(self.getCells(self.points[position:position+1])[0])
+        row = self.table[cell]
+        slot = np.flatnonzero(row == position)[0]
+        row[slot:-1] = row[slot+1:]
+        row[-1] = -1
+
+        self.xs[position] = self.ys[position] = np.inf
+        self.labelOrder = self.labelOrder[self.labelOrder != position]
+
+    def getCells(self, points):
+        xSections = ((points[:, 0]-self.xMin)//self.cellSize).astype(np.int64)
+        ySections = ((points[:, 1]-self.yMin)//self.cellSize).astype(np.int64)
+        return ySections*self.numX + xSections
+
+    def gather(self, queries, ring):
+        '''candidate point indices (-1 padded) in the (2*ring+1)**2 cells around each query'''
+
+        xSections = ((queries[:, 0]-self.xMin)//self.cellSize).astype(np.int64)
+        ySections = ((queries[:, 1]-self.yMin)//self.cellSize).astype(np.int64)
+
+        steps = np.arange(-ring, ring+1)
+        xs = (xSections[:, None, None] + steps[None, None, :])
+        ys = (ySections[:, None, None] + steps[None, :, None])
+        inside = (xs >= 0) & (xs < self.numX) & (ys >= 0) & (ys < self.numY)
+        cells = np.where(inside, ys*self.numX + xs, self.numX*self.numY)
+
+        return self.table[cells.reshape(len(queries), -1)].reshape(len(queries), -1)
+
+    def searchedDistance(self, queries, ring):
+        '''distance from each query to the nearest edge of its searched square
+        that still has points behind it, anything closer has been looked at'''
+
+        x = (queries[:, 0]-self.xMin)/self.cellSize
+        y = (queries[:, 1]-self.yMin)/self.cellSize
+        xSections = np.floor(x)
+        ySections = np.floor(y)
+
+        # sides of the square that reach past the grid have nothing beyond them
+        left = np.where(xSections-ring <= 0, np.inf, x-xSections+ring)
+        right = np.where(xSections+ring >= self.numX-1, np.inf, xSections+ring+1-x)
+        top = np.where(ySections-ring <= 0, np.inf, y-ySections+ring)
+        bottom = np.where(ySections+ring >= self.numY-1, np.inf, ySections+ring+1-y)
+
+        return np.minimum(np.minimum(left, right), np.minimum(top, bottom))*self.cellSize
+
+    def squaredDistances(self, queries, candidates, exclude):
+        dx = self.xs[candidates]
+        dx -= (queries[:, 0:1]-self.xMin).astype(np.float32)
+        dy = self.ys[candidates]
+        dy -= (queries[:, 1:2]-self.yMin).astype(np.float32)
+        dx *= dx
+        dy *= dy
+        dx += dy
+        if exclude is not None:
+            dx[candidates == exclude[:, None]] = np.inf
+        return dx
+
+    def exactDistances(self, queries, positions):
+        difference = self.points[positions] - queries
+        difference *= difference
+        return np.sqrt(difference[..., 0] + difference[..., 1])
+
+    def chunks(self, numQueries, width):
+        step = max(1, self.maxCandidates // max(1, width))
+        for start in range(0, numQueries, step):
+            yield slice(start, min(numQueries, start+step))
+
+    def closest(self, queries, squaredLengths, candidates, k, keep):
+        '''exact (distances, positions) of the k closest candidates per row, using the
+        float32 squared lengths to narrow each row down to keep candidates first'''
+
+        squaredLengths, candidates = self.smallest(squaredLengths, candidates, keep)
+        lengths = np.where(np.isfinite(squaredLengths),
+                           self.exactDistances(queries[:, None, :], np.maximum(candidates, 0)), np.inf)
+        return self.smallest(lengths, candidates, k)
+
+    def smallest(self, lengths, candidates, k):
+        if lengths.shape[1] > k:
+            part = np.argpartition(lengths, k-1, axis=1)[:, :k]
+            lengths = np.take_along_axis(lengths, part, axis=1)
+            candidates = np.take_along_axis(candidates, part, axis=1)
+        order = np.argsort(lengths, axis=1, kind='stable')
+        return np.take_along_axis(lengths, order, axis=1), np.take_along_axis(candidates, order, axis=1)
+
+    def kNearest(self, queries, k=1, exclude=None):
+        '''(distances, labels) of the k closest points to every query, closest first
+
+        exclude holds one label per query that is skipped, e.g. the query's own id.
+        Missing neighbours come back as distance inf and label -1.
+        '''
+
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, 2)
+        exclude = None if exclude is None else self.getPositions(exclude)
+        outLengths = np.full((len(queries), k), np.inf)
+        outIds = np.full((len(queries), k), -1, dtype=np.int64)
+
+        if self.size == 0 or len(queries) == 0:
+            return outLengths, outIds
+
+        # the float32 scan keeps a few spare candidates, the exact distances pick the final k
+        keep = k + 4
+
+        pending = np.arange(len(queries))
+        for ring in (1, 2):
+            if len(pending) == 0:
+                break
+            width = (2*ring+1)**2 * self.table.shape[1]
+            stillPending = []
+            for part in self.chunks(len(pending), width):
+                rows = pending[part]
+                candidates = self.gather(queries[rows], ring)
+                lengths = self.squaredDistances(queries[rows], candidates,
+                                                None if exclude is None else exclude[rows])
+                lengths, candidates = self.closest(queries[rows], lengths, candidates, k, keep)
+
+                if lengths.shape[1] == k:
+                    settled = lengths[:, -1] <= self.searchedDistance(queries[rows], ring)
+                else:
+                    settled = np.zeros(len(rows), dtype=bool)
+                done = rows[settled]
+                outLengths[done, :lengths.shape[1]] = lengths[settled]
+                outIds[done, :lengths.shape[1]] = candidates[settled]
+                stillPending.append(rows[~settled])
+            pending = np.concatenate(stillPending)
+
+        # brute force for the few queries near empty regions or with a large k
+        for part in self.chunks(len(pending), self.size):
+            rows = pending[part]
+            candidates = np.broadcast_to(np.arange(self.size), (len(rows), self.size))
+            lengths = self.squaredDistances(queries[rows], candidates,
+                                            None if exclude is None else exclude[rows])
+            lengths, candidates = self.closest(queries[rows], lengths, candidates, k, keep)
+            outLengths[rows, :lengths.shape[1]] = lengths
+            outIds[rows, :lengths.shape[1]] = candidates
+
+        missing = ~np.isfinite(outLengths)
+        labels = np.where(missing, -1, self.labels[np.maximum(outIds, 0)])
+        return outLengths, labels
+
+    def nearest(self, queries, exclude=None):
+        '''(distance, label) of the closest point to every query'''
+        lengths, labels = self.kNearest(queries, 1, exclude)
+        return lengths[:, 0], labels[:, 0]
+
+    def radius(self, queries, maxLength, exclude=None):
+        '''every point within maxLength of each query, closest first
+
+        Returned as (offsets, labels, distances) where query i owns
+        labels[offsets[i]:offsets[i+1]].
+        '''
+
+        queries = np.asarray(queries, dtype=np.float64).reshape(-1, 2)
+        exclude = None if exclude is None else self.getPositions(exclude)
+        counts = np.zeros(len(queries), dtype=np.int64)
+        allIds = []
+        allLengths = []
+
+        if self.size > 0:
+            ring = max(1, math.ceil(maxLength/self.cellSize))
+            width = (2*ring+1)**2 * self.table.shape[1]
+            for part in self.chunks(len(queries), width):
+                candidates = self.gather(queries[part], ring)
+                lengths = self.squaredDistances(queries[part], candidates,
+                                                None if exclude is None else exclude[part])
+                found = int(np.count_nonzero(np.isfinite(lengths)))
+                # a little slack for the float32 scan, the exact check below decides
+                lengths[lengths > (maxLength*(1+1e-6)+1e-3)**2] = np.inf
+
+                rows, columns = np.nonzero(np.isfinite(lengths))
+                ids = candidates[rows, columns]
+                exact = self.exactDistances(queries[part][rows], ids)
+                inRange = exact <= maxLength
+                self.rejected += found - int(np.count_nonzero(inRange))
+
+                order = np.lexsort((exact, rows))
+                rows, ids, exact, inRange = rows[order], ids[order], exact[order], inRange[order]
+
+                counts[part] = np.bincount(rows[inRange], minlength=len(candidates))
+                allIds.append(ids[inRange])
+                allLengths.append(exact[inRange])
+
+        offsets = np.zeros(len(queries)+1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        ids = np.concatenate(allIds) if allIds else np.zeros(0, dtype=np.int64)
+        lengths = np.concatenate(allLengths) if allLengths else np.zeros(0)
+        return offsets, self.labels[ids], lengths
+
+
+def envelopeTransform(f):
+    '''1D squared distance transform of every row of f (Felzenszwalb & Huttenlocher)
+
+    out[r, q] = min over p of (q-p)**2 + f[r, p]. The lower envelope of the
+    parabolas is built for all rows together, so the Python loop runs once per
+    column rather than once per cell.
+    '''
+
+    numRows, length = f.shape
+    rows = np.arange(numRows)
+
+    # envelope stacks per row, plus the top entry of every stack kept as flat arrays
+    locations = np.zeros((numRows, length), dtype=np.int64)
+    boundaries = np.empty((numRows, length))
+    boundaries[:, 0] = -np.inf
+    k = np.zeros(numRows, dtype=np.int64)
+
+    topLocation = np.zeros(numRows, dtype=np.int64)
+    topValue = f[:, 0].copy()
+    topBoundary = np.full(numRows, -np.inf)
+
+    for q in range(1, length):
+        value = f[:, q] + q*q
+        s = (value - (topValue + topLocation*topLocation)) / (2*(q - topLocation))
+        pop = np.flatnonzero(s <= topBoundary)
+
+        # rare case, parabolas that end up hidden are popped row by row until the new one fits
+        while len(pop) > 0:
+            k[pop] -= 1
+            topLocation[pop] = locations[pop, k[pop]]
+            topValue[pop] = f[pop, topLocation[pop]]
+            topBoundary[pop] = boundaries[pop, k[pop]]
+            s[pop] = (value[pop] - (topValue[pop] + topLocation[pop]*topLocation[pop])) / (2*(q - topLocation[pop]))
+            pop = pop[s[pop] <= topBoundary[pop]]
+
+        k += 1
+        locations[rows, k] = q
+        boundaries[rows, k] = s
+        topLocation[:] = q
+        topValue = f[:, q].copy()
+        topBoundary = s
+
+    # every q reads the parabola whose segment contains it, found with one searchsorted
+    # over all rows by shifting each row's boundaries into its own range
+    inStack = np.arange(length)[None, :] <= k[:, None]
+    stride = 2*length + 4
+    keys = (np.clip(boundaries, -1, length+1) + (rows*stride)[:, None])[inStack]
+    queries = (np.arange(length)[None, :] + (rows*stride)[:, None]).ravel()
+    segment = np.searchsorted(keys, queries, side='right') - 1
+
+    nearest = locations[inStack][segment].reshape(numRows, length)
+    return (np.arange(length)[None, :] - nearest)**2 + np.take_along_axis(f, nearest, axis=1)
+
+
+def distanceTransform(mask):
+    '''exact euclidean distance from every cell of a 2D boolean array to the nearest True cell,
+    cells are inf when mask has no True cell at all'''
+
+    mask = np.asarray(mask, dtype=bool)
+    if not mask.any():
+        return np.full(mask.shape, np.inf)
+
+    # larger than any real squared distance but small enough to keep the envelope arithmetic exact
+    far = float(4*(mask.shape[0]+mask.shape[1])**2)
+
+    # the envelope pass loops over its axis in Python, so give it the shorter one
+    transposed = mask.shape[0] < mask.shape[1]
+    if transposed:
+        mask = mask.T
+
+    # distance along axis 0 to the nearest True cell, from the last one before and the first one after
+    length = mask.shape[0]
+    positions = np.arange(length)[:, None]
+    before = np.maximum.accumulate(np.where(mask, positions, -4*length), axis=0)
+    after = np.minimum.accumulate(np.where(mask, positions, 5*length)[::-1], axis=0)[::-1]
+    columnDistance = np.minimum(positions-before, after-positions).astype(np.float64)
+
+    f = envelopeTransform(np.minimum(columnDistance*columnDistance, far))
+    if transposed:
+        f = f.T
+    return np.sqrt(f)
@@ -0,0 +1,87 @@
+import hashlib
+import json
+import os
+import zipfile
+import zlib
+import numpy as np
+
+
+class StageCache:
+    '''on-disk cache of pipeline stage outputs, one .npz per stage result
+
+    A stage's key hashes its own inputs together with the key of the stage it
+    builds on, so changing one parameter only misses from the first stage that
+    reads it onwards. Least recently used files are removed once the directory
+    grows past maxBytes.
+    '''
+
+    def __init__(self, directory='cache', maxBytes=512*1024*1024):
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, stage: str, inputs: dict, parent: str = None):
+        text = json.dumps({'stage': stage, 'inputs': inputs, 'parent': parent}, sort_keys=True)
+        return f'{stage}-{hashlib.sha256(text.encode()).hexdigest()[:32]}'
+
+    def getPath(self, key: str):
+        return os.path.join(self.directory, f'{key}.npz')
+
+    def load(self, key: str):
+        '''dict of arrays stored under key, None on a miss'''
+        path = self.getPath(key)
+        try:
+            with np.load(path) as file:
+                arrays = {name: file[name] for name in file.files}
+        except (OSError, ValueError, EOFError, KeyError, zipfile.BadZipFile, zlib.error):
+            # a corrupt or half written file is a miss, storing the stage again replaces it
+            self.misses += 1
+            return None
+
+        # the modification time doubles as the last use for eviction
+        os.utime(path)
+        self.hits += 1
+        return arrays
+
+    def store(self, key: str, **arrays):
+        path = self.getPath(key)
+        temporary = f'{path}.{os.getpid()}.tmp'
+        with open(temporary, 'wb') as file:
+            np.savez_compressed(file, **arrays)
+        # rename is atomic, so processes sharing the directory never read half a file
+        os.replace(temporary, path)
+        self.evict()
+
+    def getSize(self):
+        return sum(size for _, size, _ in self.getEntries())
+
+    def getEntries(self):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npz'):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                info = os.stat(path)
+            except OSError:
+                continue
+            entries.append((path, info.st_size, info.st_mtime))
+        return entries
+
+    def evict(self):
+        entries = sorted(self.getEntries(), key=lambda entry: entry[2])
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in entries:
+            if total <= self.maxBytes:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+    def clear(self):
+        for path, _, _ in self.getEntries():
+            os.remove(path)
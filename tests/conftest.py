@@ -0,0 +1,10 @@
+import os
+import sys
+
+# the modules live in the repository root and draw on off-screen surfaces only
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pygame
+
+pygame.init()
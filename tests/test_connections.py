@@ -0,0 +1,127 @@
+import random
+import numpy as np
+from mapclasses import LinePartition, MapSettings
+from mapengine import MapEngine
+from spatial import PointIndex
+
+
+def getEngine(**kwargs):
+    settings = MapSettings(500, 375, density_coefficient=5*10**6/8, **kwargs)
+    engine = MapEngine(settings, 3)
+    engine.seedStage('nodes')
+    engine.generateNodes()
+    return engine
+
+
+def getSegmentSet(rows):
+    return sorted(tuple(sorted([(x1, y1), (x2, y2)])) for x1, y1, x2, y2 in rows)
+
+
+def checkGraph(engine):
+    '''the invariants every edit has to keep'''
+    graph = engine.world.graph
+    lines = engine.world.lines
+    maxLength = engine.settings.getMaximumLength()
+
+    # the line partition holds exactly the connections
+    edges = graph.getEdges()
+    starts, ends = graph.getNodes(edges[:, 0]), graph.getNodes(edges[:, 1])
+    assert getSegmentSet(np.hstack((starts, ends)).tolist()) == getSegmentSet(lines.getSegments().tolist())
+    assert sum(map(len, graph.getNeighbors())) == 2*len(edges) == 2*graph.numEdges
+    assert (graph.getDegrees() == [len(connections) for connections in graph.getNeighbors()]).all()
+    assert not graph.getDegrees()[~graph.active].any()
+
+    assert (np.hypot(*(starts-ends).T.astype(np.float64)) <= maxLength).all()
+
+    # no two connections cross
+    segments = lines.getSegments()
+    everything = np.arange(len(segments))
+    for x1, y1, x2, y2 in segments.tolist():
+        assert len(lines.getIntersectingIds((x1, y1), (x2, y2), everything)) == 0
+
+    # every segment is found in the cells around its ends
+    for id, (x1, y1, x2, y2) in enumerate(segments.tolist()):
+        assert lines.getLineId((x1, y1), (x2, y2)) == id
+
+    # the partition and the index match fresh ones
+    ids, offsets = graph.partitions['ids'].copy(), graph.partitions['offsets'].copy()
+    graph.partition(0, engine.width, maxLength, 0, engine.height, maxLength)
+    assert np.array_equal(ids, graph.partitions['ids'])
+    assert np.array_equal(offsets, graph.partitions['offsets'])
+
+    active = graph.getActiveIds()
+    queries = np.random.default_rng(0).integers(0, (engine.width+1, engine.height+1), size=(50, 2))
+    fresh = PointIndex(graph.getNodes(active), labels=active)
+    offsets, ids, lengths = graph.getIndex().radius(queries, maxLength)
+    freshOffsets, freshIds, freshLengths = fresh.radius(queries, maxLength)
+    assert np.array_equal(offsets, freshOffsets)
+    assert np.array_equal(lengths, freshLengths)
+    # points at the same distance may come in another order
+    for start, end in zip(offsets[:-1], offsets[1:]):
+        assert sorted(ids[start:end].tolist()) == sorted(freshIds[start:end].tolist())
+    assert np.array_equal(graph.getIndex().nearest(queries)[0], fresh.nearest(queries)[0])
+
+
+def test_update_connections():
+    engine = getEngine()
+    checkGraph(engine)
+    for maxLength, minConnections in [(40, 3), (60, 3), (60, 5), (30, 2), (55, 3)]:
+        engine.settings.maxDistance = maxLength
+        engine.settings.minConnections = minConnections
+        engine.updateConnections()
+        assert engine.connectionSettings['maxLength'] == maxLength
+        checkGraph(engine)
+
+
+def test_insert_and_remove_nodes():
+    engine = getEngine()
+    graph = engine.world.graph
+    graph.getIndex()
+    rng = random.Random(1)
+
+    inserted = [engine.insertNode(point) for point in [(0, 0), (500, 375), (250, 0), (10, 370)]]
+    inserted += [engine.insertNode((rng.randint(0, 500), rng.randint(0, 375))) for _ in range(20)]
+    checkGraph(engine)
+    assert all(graph.active[inserted])
+
+    removed = rng.sample(graph.getActiveIds().tolist(), 30)
+    for id in removed:
+        engine.removeNode(id)
+    checkGraph(engine)
+    assert not graph.active[removed].any()
+
+    # freed ids come back, and random ids never name a removed node
+    again = engine.insertNode((100, 100))
+    assert again in removed
+    checkGraph(engine)
+    assert set(graph.getRandomIds(graph.size)) == set(graph.getActiveIds().tolist())
+    for _ in range(50):
+        assert graph.active[graph.getRandomIds(5)].all()
+
+
+def test_remove_line():
+    lines = LinePartition(0, 400, 82, 0, 300, 82)
+    rng = random.Random(0)
+    segments = []
+    for _ in range(200):
+        x, y = rng.randint(0, 400), rng.randint(0, 300)
+        segments.append(((x, y), (min(400, x+rng.randint(-80, 80)), min(300, max(0, y+rng.randint(-80, 80))))))
+    lines.addSegments([start for start, _ in segments[:100]], [end for _, end in segments[:100]])
+    for start, end in segments[100:]:
+        lines.addSegment(start, end)
+
+    for start, end in rng.sample(segments, 80):
+        lines.removeLine(end, start)
+        assert lines.getLineId(start, end) == -1
+        segments.remove((start, end))
+
+    assert lines.totalLines == len(segments)
+    assert getSegmentSet([start+end for start, end in segments]) == getSegmentSet(lines.getSegments().tolist())
+    assert lines.cellCounts.sum() == sum(len(lines.getLineCells(id)) for id in range(lines.totalLines))
+    for start, end in segments:
+        assert lines.getLineId(start, end) >= 0
+
+    lines.removeSegments(np.arange(0, lines.totalLines, 3))
+    kept = lines.getSegments().tolist()
+    for id, (x1, y1, x2, y2) in enumerate(kept):
+        assert lines.getLineId((x1, y1), (x2, y2)) == id
@@ -0,0 +1,45 @@
+import numpy as np
+from delaunay import getEdges, triangulate
+
+
+def getPoints(seed=0, size=300):
+    return np.random.default_rng(seed).integers(0, 500, size=(size, 2))
+
+
+def test_empty_circles():
+    for seed in range(3):
+        points = getPoints(seed)
+        triangles = triangulate(points)
+        a, b, c = (points[triangles[:, i]][:, None, :] for i in range(3))
+        p = points[None, :, :]
+
+        ad, bd, cd = a-p, b-p, c-p
+        adLength = (ad**2).sum(axis=2)
+        bdLength = (bd**2).sum(axis=2)
+        cdLength = (cd**2).sum(axis=2)
+        inside = (ad[..., 0]*(bd[..., 1]*cdLength - bdLength*cd[..., 1])
+                  - ad[..., 1]*(bd[..., 0]*cdLength - bdLength*cd[..., 0])
+                  + adLength*(bd[..., 0]*cd[..., 1] - bd[..., 1]*cd[..., 0]))
+        # no point lies strictly inside the circumcircle of any triangle
+        assert (inside <= 0).all()
+
+
+def test_triangles_are_counter_clockwise_and_planar():
+    points = getPoints(1)
+    triangles = triangulate(points)
+    a, b, c = (points[triangles[:, i]] for i in range(3))
+    assert (((b-a)[:, 0]*(c-a)[:, 1] - (b-a)[:, 1]*(c-a)[:, 0]) > 0).all()
+
+    # every edge borders one or two triangles
+    edges = np.sort(np.concatenate([triangles[:, [0, 1]], triangles[:, [1, 2]], triangles[:, [2, 0]]]), axis=1)
+    _, counts = np.unique(edges, axis=0, return_counts=True)
+    assert counts.max() <= 2
+    assert len(getEdges(triangles)) == len(counts)
+
+
+def test_repeated_and_few_points():
+    assert len(triangulate(np.array([[0, 0], [5, 5]]))) == 0
+    points = np.array([[0, 0], [10, 0], [0, 10], [10, 0], [10, 10]])
+    triangles = triangulate(points)
+    assert len(triangles) == 2
+    assert len(np.unique(triangles)) == 4
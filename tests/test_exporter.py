@@ -0,0 +1,43 @@
+import numpy as np
+import pygame
+from exporter import ExportWriter, writePng
+
+
+def getPixels(width=300, height=200, seed=0):
+    return np.random.default_rng(seed).integers(0, 256, size=(width, height, 3), dtype=np.uint8)
+
+
+def test_png_round_trip(tmp_path):
+    pixels = getPixels()
+    filename = str(tmp_path/'map.png')
+    # bands that do not divide the height
+    writePng(filename, pixels.transpose(1, 0, 2), rowsPerBand=64)
+    assert np.array_equal(pygame.surfarray.array3d(pygame.image.load(filename)), pixels)
+
+
+def test_writer_writes_every_image(tmp_path):
+    writer = ExportWriter(workers=2, maxPending=2)
+    done = []
+    images = [getPixels(seed=seed) for seed in range(6)]
+    # more images than may wait, so submit has to block on the writer
+    futures = [writer.submit(pixels, str(tmp_path/'out'/f'{i}.png'), callback=lambda *args: done.append(args))
+               for i, pixels in enumerate(images)]
+    writer.wait()
+    assert sorted(done) == sorted((str(tmp_path/'out'/f'{i}.png'), None) for i in range(6))
+    for i, (future, pixels) in enumerate(zip(futures, images)):
+        assert future.result() == str(tmp_path/'out'/f'{i}.png')
+        assert np.array_equal(pygame.surfarray.array3d(pygame.image.load(future.result())), pixels)
+    writer.close()
+    assert writer.getPending() == 0
+
+
+def test_writer_reports_errors(tmp_path):
+    writer = ExportWriter()
+    (tmp_path/'file').write_text('')
+    errors = []
+    future = writer.submit(getPixels(), str(tmp_path/'file'/'map.png'), callback=lambda name, error: errors.append(error))
+    assert isinstance(future.exception(), OSError)
+    assert len(errors) == 1 and isinstance(errors[0], OSError)
+    writer.close()
+    # the failed image gave its slot back
+    assert writer.getPending() == 0 and writer.slots.acquire(blocking=False)
@@ -0,0 +1,55 @@
+import random
+import numpy as np
+from delaunay import getEdges, triangulate
+from faces import FaceIndex
+from mapclasses import Graph, Line
+
+
+def getGraph(seed=0, size=300):
+    points = np.random.default_rng(seed).integers(0, 1000, size=(size, 2))
+    points = np.unique(points, axis=0)
+    graph = Graph(len(points))
+    graph.addNodes(points)
+    graph.addConnections(getEdges(triangulate(points)).tolist())
+    return graph
+
+
+def isSimple(graph, corners):
+    points = [graph.getNode(id) for id in corners]
+    sides = [Line(points[i-1], points[i]) for i in range(len(points))]
+    for i in range(len(sides)):
+        for j in range(i+1, len(sides)):
+            if sides[i].isIntersecting(sides[j]):
+                return False
+    return True
+
+
+def test_grow_gives_simple_outlines():
+    graph = getGraph()
+    faces = FaceIndex(graph, maxSides=40)
+    rng = random.Random(0)
+    grown = 0
+    for seedFace in faces.usableIds[:60].tolist():
+        for minSides, targetSides in ((3, 8), (6, 20), (10, 40)):
+            corners = faces.grow(seedFace, minSides, targetSides, rng)
+            if corners is None:
+                continue
+            grown += 1
+            assert minSides < len(corners) <= faces.maxSides
+            assert len(set(corners)) == len(corners)
+            for a, b in zip(corners, corners[1:]+corners[:1]):
+                assert graph.hasConnection(a, b)
+            assert isSimple(graph, corners)
+
+            xs, ys = graph.getNodes(corners).astype(np.int64).T
+            # counter clockwise in screen coordinates, like the faces themselves
+            assert (xs*np.roll(ys, -1) - np.roll(xs, -1)*ys).sum() > 0
+    assert grown > 100
+
+
+def test_find_continent():
+    graph = getGraph(1)
+    faces = FaceIndex(graph)
+    corners = faces.findContinent((500, 500), 12, random.Random(3))
+    assert corners is not None and len(corners) > 12
+    assert isSimple(graph, corners)
@@ -0,0 +1,43 @@
+import random
+import numpy as np
+from mapclasses import Graph
+
+
+def getGraph(size=600, width=1000, height=750, seed=0):
+    graph = Graph(size, rng=random.Random(seed))
+    graph.fillMatrixRandom(0, 0, width, height)
+    graph.partition(0, width, 82, 0, height, 82)
+    return graph
+
+
+def test_close_ids_cover_the_neighbourhood():
+    graph = getGraph()
+    ids = graph.getActiveIds()
+    nodes = graph.getNodes(ids).astype(np.int64)
+    width, height = graph.partitions['width'], graph.partitions['height']
+
+    rng = np.random.default_rng(1)
+    for numSections in (1, 2, 3):
+        for point in rng.integers(0, (1001, 751), size=(40, 2)).tolist():
+            close = graph.getCloseIdsToPoint(point, numSections)
+            assert len(np.unique(close)) == len(close)
+
+            # exactly the nodes whose cell is at most numSections cells away
+            xSection, ySection = graph.getSection(point)
+            cells = graph.getCells(nodes)
+            xs, ys = cells % graph.partitions['numX'], cells // graph.partitions['numX']
+            inside = (abs(xs-xSection) <= numSections) & (abs(ys-ySection) <= numSections)
+            assert sorted(close.tolist()) == sorted(ids[inside].tolist())
+
+            # which holds every node less than numSections cell sizes away on both axes
+            near = ((abs(nodes[:, 0]-point[0]) <= numSections*width) &
+                    (abs(nodes[:, 1]-point[1]) <= numSections*height))
+            assert set(ids[near].tolist()) <= set(close.tolist())
+
+
+def test_close_ids_on_the_edges():
+    graph = getGraph()
+    # points on or past the border read the border cells
+    for point, inside in [((1000, 750), (999, 749)), ((-20, 800), (0, 750)), ((1000, 0), (990, 0))]:
+        assert graph.getSection(point) == graph.getSection(inside)
+        assert sorted(graph.getCloseIdsToPoint(point, 1).tolist()) == sorted(graph.getCloseIdsToPoint(inside, 1).tolist())
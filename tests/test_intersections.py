@@ -0,0 +1,45 @@
+import random
+import numpy as np
+from mapclasses import Line, LinePartition
+
+
+def getSegments(seed, amount, size=120):
+    rng = random.Random(seed)
+    # a small grid makes shared endpoints, collinear and touching segments common
+    point = lambda: (rng.randint(0, size), rng.randint(0, size))
+    return [(point(), point()) for _ in range(amount)]
+
+
+def test_matches_line_intersection():
+    for seed in range(5):
+        segments = getSegments(seed, 300, size=30 if seed % 2 else 120)
+        lines = LinePartition(0, 120, 40, 0, 120, 40)
+        for start, end in segments:
+            lines.addSegment(start, end)
+
+        ids = np.arange(lines.totalLines)
+        for start, end in getSegments(seed+100, 100, size=30 if seed % 2 else 120):
+            expected = [id for id, (c, d) in enumerate(segments) if Line(start, end).isIntersecting(Line(c, d))]
+            assert lines.getIntersectingIds(start, end, ids).tolist() == expected
+            assert lines.isIntersectingAny(start, end, 3) == bool(expected)
+
+
+def test_large_coordinates():
+    # cross products of big maps overflow int32
+    lines = LinePartition(0, 100000, 20000, 0, 100000, 20000)
+    lines.addSegment((0, 0), (99999, 99998))
+    assert lines.getIntersectingIds((0, 99999), (99999, 0), np.arange(1)).tolist() == [0]
+    assert lines.getIntersectingIds((1, 0), (99999, 99997), np.arange(1)).tolist() == []
+
+
+def test_crossing_mask_matches_single_tests():
+    for seed in range(5):
+        segments = getSegments(seed, 300, size=30 if seed % 2 else 120)
+        lines = LinePartition(0, 120, 40, 0, 120, 40)
+        for start, end in segments:
+            lines.addSegment(start, end)
+
+        for start, _ in getSegments(seed+200, 40, size=30 if seed % 2 else 120) + segments[:20]:
+            ends = [end for _, end in getSegments(seed+300, 12, size=30 if seed % 2 else 120)]
+            expected = [lines.isIntersectingAny(start, end, 1) for end in ends]
+            assert lines.getCrossingMask(start, ends, 1).tolist() == expected
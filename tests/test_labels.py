@@ -0,0 +1,55 @@
+import numpy as np
+import pygame
+from mapclasses import MapSettings
+from mapengine import MapEngine
+
+
+def getEngine(seed=3):
+    engine = MapEngine(MapSettings(500, 375, density_coefficient=5*10**6/16), seed)
+    engine.seedStage('nodes')
+    engine.generateNodes()
+    return engine
+
+
+def rebuildLabels(world):
+    world.labels = None
+    return world.getLabels().copy()
+
+
+def checkLabels(engine):
+    world = engine.world
+    labels = world.getLabels().copy()
+    assert np.array_equal(labels, rebuildLabels(world))
+    assert labels.max() == len(world.continents)
+
+    # land where the drawn map is not water
+    engine.redraw()
+    water = (pygame.surfarray.pixels3d(engine.surface) == np.array(engine.settings.getWater()[:3])).all(axis=2)
+    assert np.array_equal(world.getLandMask(), ~water)
+
+
+def test_labels_follow_added_and_cleared_continents():
+    engine = getEngine()
+    world = engine.world
+    # built before any continent, so every one is drawn in as it is added
+    assert not world.getLabels().any()
+    engine.seedStage('continents')
+    engine.generateMultipleContinents()
+    assert len(world.continents) > 1
+    checkLabels(engine)
+
+    engine.clearContinents()
+    assert not world.getLabels().any()
+    engine.generateMultipleContinents()
+    checkLabels(engine)
+
+
+def test_later_continents_cover_earlier_ones():
+    world = getEngine().world
+    world.addContinent([(10, 10), (200, 10), (200, 200), (10, 200)], (100, 100, 100))
+    world.addContinent([(50, 50), (100, 50), (100, 100), (50, 100)], (150, 150, 150))
+    labels = world.getLabels()
+    assert labels[20, 20] == 1 and labels[75, 75] == 2 and labels[300, 300] == 0
+    world.addContinent([(0, 0), (120, 0), (120, 120), (0, 120)], (200, 200, 200))
+    assert labels[20, 20] == 3 and labels[75, 75] == 3 and labels[150, 150] == 1
+    assert np.array_equal(labels, rebuildLabels(world))
@@ -0,0 +1,37 @@
+import numpy as np
+import pytest
+from mapclasses import MapSettings
+from mapengine import MapEngine
+
+
+def getSettings(palette):
+    return MapSettings(500, 375, density_coefficient=5*10**6/16, palette=palette)
+
+
+@pytest.mark.parametrize('indexed', [False, True])
+def test_swap_after_sync(indexed):
+    engine = MapEngine(getSettings('default'), 3, indexed)
+    engine.autoGenerate()
+    before = [engine.colorTable.getSlot('default', color) for color in engine.world.continentColors]
+
+    # the window syncs its settings before every job, they already name the new palette
+    engine.settings = getSettings('red')
+    engine.setPalette('red')
+    engine.redraw()
+
+    after = [engine.colorTable.getSlot('red', color) for color in engine.world.continentColors]
+    assert None not in after
+    redColors = engine.settings.getPalette()
+    assert after == [slot % len(redColors) for slot in before]
+
+    raster = engine.getRaster()
+    assert (raster[~engine.world.getLandMask()] == engine.settings.getWater()[:3]).all()
+    if indexed:
+        indices = engine.getPixels()[engine.world.getLandMask()]
+        assert not (indices == engine.colorTable.blackIndex).any()
+
+    # the land shows shades of the red palette only, as a fresh red map would
+    fresh = MapEngine(getSettings('red'), 3, indexed)
+    fresh.world = engine.world
+    fresh.redraw()
+    assert np.array_equal(fresh.getRaster(), raster)
@@ -0,0 +1,34 @@
+from mapclasses import LinePartition, MapSettings, PointPartition
+from mapengine import MapEngine
+
+
+def test_points_on_the_far_edges():
+    # nodes are drawn with the bounds included, x == xMax lands past the last cell
+    lines = LinePartition(0, 400, 82, 0, 300, 82)
+    numX, numY = lines.partitions['numX'], lines.partitions['numY']
+    assert lines.getCell((400, 300)) == (numY-1, numX-1)
+    assert lines.getCell((-5, -5)) == (0, 0)
+
+    id = lines.addSegment((390, 290), (400, 300))
+    assert lines.getLineId((400, 300), (390, 290)) == id
+    assert id in lines.getCloseLineIds((400, 300)).tolist()
+
+    lines.addSegments([[0, 0], [400, 0]], [[400, 300], [0, 300]])
+    assert lines.getCloseLineIds((0, 300)).tolist() == [2]
+    assert sorted(lines.getCloseLineIds((400, 300)).tolist()) == [0, 1]
+    lines.removeLine((390, 290), (400, 300))
+    assert lines.getLineId((390, 290), (400, 300)) == -1
+
+    points = PointPartition(0, 400, 82, 0, 300, 82)
+    points.addPoint((400, 300))
+    assert points.getClosePoints((399, 299)) == [(400, 300)]
+
+
+def test_generate_other_size():
+    width, height = 400, 300
+    # same number of nodes as the default window
+    settings = MapSettings(width, height, density_coefficient=5*10**6*width*height/(1000*750))
+    engine = MapEngine(settings, 3)
+    engine.autoGenerate()
+    assert len(engine.world.continents) > 0
+    assert engine.surface.get_size() == (width, height)
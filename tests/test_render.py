@@ -0,0 +1,31 @@
+import numpy as np
+import pytest
+from mapclasses import MapSettings
+from mapengine import MapEngine, getStampReach
+
+
+@pytest.mark.parametrize('levels', [1, 3, 8, 15])
+@pytest.mark.parametrize('shape', ['dot', 'square', 'triangle', 'water'])
+def test_stamps_stay_within_reach(shape, levels):
+    size = 300
+    settings = MapSettings(size, size, waterLevels=levels, waterWidth=10)
+    engine = MapEngine(settings, 0)
+    engine.redraw()
+    layers = engine.getWaterLayers()
+    assert layers.max() == levels-1
+
+    # every sample at the center, in the deepest water for one round of sizes, so the water loop ends
+    center = size//2
+    calls = []
+    def sample(generator, amount):
+        calls.append(amount)
+        full = np.full(amount, center)
+        depth = layers.max() if len(calls) <= 5 else 0
+        return full, full, np.zeros((amount, 3), dtype=np.uint8), np.ones(amount, dtype=bool), np.full(amount, depth)
+    engine.sample = sample
+    engine.refine(shape, 200)
+
+    xs, ys = np.nonzero((engine.getRaster() == 0).all(axis=2))
+    reach = getStampReach(settings)
+    assert len(xs) > 0 or (shape == 'water' and levels <= 2)
+    assert (abs(xs-center) <= reach).all() and (abs(ys-center) <= reach).all()
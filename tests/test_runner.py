@@ -0,0 +1,38 @@
+import time
+import pytest
+from mapclasses import MapSettings
+from mapengine import GenerationCancelled, MapEngine
+from runner import BackgroundRunner
+
+
+def getEngine():
+    engine = MapEngine(MapSettings(500, 375, density_coefficient=5*10**6/16), 3)
+    engine.seedStage('nodes')
+    engine.generateNodes()
+    engine.seedStage('continents')
+    engine.generateMultipleContinents()
+    engine.redraw()
+    return engine
+
+
+@pytest.mark.parametrize('shape', ['dot', 'square', 'triangle', 'water'])
+def test_refine_stops_once_cancelled(shape):
+    engine = getEngine()
+    before = engine.getRaster()
+    engine.cancel()
+    with pytest.raises(GenerationCancelled):
+        engine.refine(shape, 10000)
+    assert (engine.getRaster() == before).all()
+
+
+def test_runner_cancels_a_long_refine():
+    engine = getEngine()
+    runner = BackgroundRunner(engine)
+    # far more samples than anyone would wait for, the run has to stop part way
+    runner.start('refine', lambda: [engine.refine('square', 10000) for _ in range(10000)])
+    time.sleep(0.2)
+    runner.cancel()
+    runner.thread.join(5)
+    assert not runner.thread.is_alive()
+    assert runner.poll()
+    assert runner.finished['outcome'] == 'cancelled'
@@ -0,0 +1,71 @@
+import random
+import numpy as np
+from mapclasses import Line, LinePartition
+
+
+def getSegments(seed=0, amount=400):
+    rng = random.Random(seed)
+    segments = []
+    for _ in range(amount):
+        x, y = rng.randint(0, 400), rng.randint(0, 300)
+        segments.append(((x, y), (min(400, max(0, x+rng.randint(-60, 60))), min(300, max(0, y+rng.randint(-60, 60))))))
+    return segments
+
+
+def getCloseIds(lines, node, numSections):
+    '''brute force: every segment with an endpoint in the cells around node'''
+    xSection, ySection = lines.getSection(node)
+    close = []
+    for id, (x1, y1, x2, y2) in enumerate(lines.getSegments().tolist()):
+        for point in ((x1, y1), (x2, y2)):
+            x, y = lines.getSection(point)
+            if abs(x-xSection) <= numSections and abs(y-ySection) <= numSections:
+                close.append(id)
+                break
+    return close
+
+
+def test_batched_adds_fill_the_cells_like_single_adds():
+    segments = getSegments()
+    single = LinePartition(0, 400, 82, 0, 300, 82)
+    for start, end in segments:
+        single.addSegment(start, end)
+    batched = LinePartition(0, 400, 82, 0, 300, 82)
+    batched.addSegments([start for start, _ in segments[:250]], [end for _, end in segments[:250]])
+    batched.addSegment(*segments[250])
+    batched.addSegments([start for start, _ in segments[251:]], [end for _, end in segments[251:]])
+
+    assert np.array_equal(batched.getSegments(), single.getSegments())
+    # cells had to grow well past their first capacity
+    assert single.cellCounts.max() > 8
+    assert batched.partitionSizes() == single.partitionSizes()
+    for cell in np.ndindex(single.cellCounts.shape):
+        count = single.cellCounts[cell]
+        assert np.array_equal(batched.cellIds[cell][:count], single.cellIds[cell][:count])
+
+
+def test_close_lines_match_brute_force():
+    lines = LinePartition(0, 400, 82, 0, 300, 82)
+    segments = getSegments(1)
+    lines.addSegments([start for start, _ in segments], [end for _, end in segments])
+    rng = random.Random(1)
+    for _ in range(50):
+        node = (rng.randint(0, 400), rng.randint(0, 300))
+        for numSections in (1, 2):
+            ids = lines.getCloseLineIds(node, numSections).tolist()
+            # each id once, no set needed
+            assert len(ids) == len(set(ids))
+            assert sorted(ids) == getCloseIds(lines, node, numSections)
+            views = lines.getCloseLines(node, numSections)
+            assert all(isinstance(line, Line) for line in views)
+            assert [line.start+line.end for line in views] == [tuple(lines.getSegments()[id].tolist()) for id in ids]
+
+
+def test_intersecting_any_matches_lines():
+    lines = LinePartition(0, 400, 82, 0, 300, 82)
+    for start, end in getSegments(2, 150):
+        lines.addSegment(start, end)
+    for start, end in getSegments(3, 200):
+        expected = any(Line(start, end).isIntersecting(line) for line in lines.getCloseLines(start, 1))
+        assert lines.isIntersectingAny(start, end, 1) == expected
+    assert [(line.start, line.end) for line in lines.getAllLines()] == getSegments(2, 150)
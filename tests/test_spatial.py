@@ -0,0 +1,92 @@
+import numpy as np
+from spatial import PointIndex, distanceTransform
+
+
+def getPoints(seed=0):
+    rng = np.random.default_rng(seed)
+    # two dense clusters and a sparse spread, so some queries need the fallback pass
+    return np.concatenate([rng.normal((200, 200), 15, size=(400, 2)),
+                           rng.normal((800, 600), 5, size=(200, 2)),
+                           rng.uniform(0, 1000, size=(100, 2))])
+
+
+def bruteForce(points, queries):
+    return np.hypot(*(queries[:, None, :] - points[None, :, :]).transpose(2, 0, 1))
+
+
+def test_nearest_matches_brute_force():
+    points = getPoints()
+    queries = np.random.default_rng(1).uniform(-100, 1100, size=(300, 2))
+    index = PointIndex(points)
+    lengths = bruteForce(points, queries)
+
+    distances, ids = index.nearest(queries)
+    assert np.allclose(distances, lengths.min(axis=1))
+    assert np.array_equal(ids, lengths.argmin(axis=1))
+
+    distances, ids = index.kNearest(queries, 7)
+    assert np.allclose(distances, np.sort(lengths, axis=1)[:, :7])
+    assert np.allclose(np.take_along_axis(lengths, ids, axis=1), distances)
+
+
+def test_nearest_with_exclude():
+    points = getPoints()
+    index = PointIndex(points, labels=np.arange(len(points))+10)
+    distances, labels = index.nearest(points, exclude=np.arange(len(points))+10)
+
+    lengths = bruteForce(points, points)
+    np.fill_diagonal(lengths, np.inf)
+    assert np.allclose(distances, lengths.min(axis=1))
+    assert np.array_equal(labels, lengths.argmin(axis=1)+10)
+
+
+def test_radius_matches_brute_force():
+    points = getPoints()
+    queries = points[::7]
+    exclude = np.arange(0, len(points), 7)
+    index = PointIndex(points)
+    lengths = bruteForce(points, queries)
+    lengths[np.arange(len(queries)), exclude] = np.inf
+
+    for maxLength in (0.5, 10, 45, 300):
+        offsets, ids, distances = index.radius(queries, maxLength, exclude=exclude)
+        for i in range(len(queries)):
+            found = ids[offsets[i]:offsets[i+1]]
+            assert sorted(found.tolist()) == np.flatnonzero(lengths[i] <= maxLength).tolist()
+            assert np.allclose(distances[offsets[i]:offsets[i+1]], lengths[i, found])
+            assert (np.diff(distances[offsets[i]:offsets[i+1]]) >= 0).all()
+
+
+def test_radius_counts_rejected_points():
+    points = getPoints()
+    queries = points[::7]
+    exclude = np.arange(0, len(points), 7)
+    maxLength = 45
+    index = PointIndex(points, cellSize=maxLength)
+    offsets, _, _ = index.radius(queries, maxLength, exclude=exclude)
+
+    # every other point in the 3x3 cells around a query was looked at
+    cells = np.stack([(points[:, 0]-index.xMin)//maxLength, (points[:, 1]-index.yMin)//maxLength], axis=1)
+    queryCells = cells[exclude]
+    searched = (np.abs(cells[None, :, :] - queryCells[:, None, :]) <= 1).all(axis=2).sum() - len(queries)
+    assert index.rejected == searched - offsets[-1] > 0
+    index.radius(queries, maxLength, exclude=exclude)
+    assert index.rejected == 2*(searched - offsets[-1])
+
+
+def test_empty_index():
+    distances, ids = PointIndex(np.zeros((0, 2))).nearest([[1, 2]])
+    assert distances[0] == np.inf and ids[0] == -1
+
+
+def test_distance_transform_is_exact():
+    rng = np.random.default_rng(2)
+    for shape, fill in [((61, 43), 0.02), ((30, 90), 0.1), ((50, 50), 0.001), ((1, 40), 0.1)]:
+        mask = rng.random(shape) < fill
+        mask[0, 0] = True
+        cells = np.argwhere(mask)
+        grid = np.indices(shape).reshape(2, -1).T
+        expected = bruteForce(cells, grid).min(axis=1).reshape(shape)
+        assert np.array_equal(distanceTransform(mask), expected)
+
+    assert np.isinf(distanceTransform(np.zeros((4, 5), dtype=bool))).all()
@@ -0,0 +1,28 @@
+import numpy as np
+from stagecache import StageCache
+
+
+def test_store_and_load(tmp_path):
+    cache = StageCache(str(tmp_path))
+    key = cache.key('nodes', {'seed': 3})
+    cache.store(key, nodes=np.arange(10))
+    assert np.array_equal(cache.load(key)['nodes'], np.arange(10))
+    assert cache.hits == 1
+    assert not any(name.endswith('.tmp') for name in (p.name for p in tmp_path.iterdir()))
+
+
+def test_corrupt_entries_are_misses(tmp_path):
+    cache = StageCache(str(tmp_path))
+    key = cache.key('nodes', {'seed': 3})
+    cache.store(key, nodes=np.arange(1000))
+    path = cache.getPath(key)
+    data = open(path, 'rb').read()
+
+    for broken in (data[:len(data)//2], data[:10], b'', b'not a zip file at all'):
+        with open(path, 'wb') as file:
+            file.write(broken)
+        assert cache.load(key) is None
+
+    assert cache.misses == 4
+    cache.store(key, nodes=np.arange(1000))
+    assert np.array_equal(cache.load(key)['nodes'], np.arange(1000))
@@ -0,0 +1,71 @@
+import numpy as np
+import pygame
+import delaunay
+from mapclasses import MapSettings
+from tiles import TileWorld
+
+
+def getSettings(**kwargs):
+    return MapSettings(200, 150, density_coefficient=5*10**6/128, waterLevels=2, waterWidth=10, **kwargs)
+
+
+def getEdgeSet(rows):
+    return set(map(tuple, rows.tolist()))
+
+
+def test_same_tiles_in_any_order():
+    first = TileWorld(getSettings(), seed=4)
+    tile = first.getTile(1, 0)
+    second = TileWorld(getSettings(), seed=4)
+    second.getTile(0, 0)
+    assert np.array_equal(second.getTile(1, 0), tile)
+    assert np.array_equal(second.getEdges(1, 0), first.getEdges(1, 0))
+    assert second.getContinents(1, 0) == first.getContinents(1, 0)
+
+
+def test_edges_match_a_bigger_window():
+    world = TileWorld(getSettings(), seed=2)
+    info = world.settings
+    # every tile 2 tiles around, so the triangulation near the middle tiles sees all nodes
+    nodes = np.concatenate([world.getNodes(tx, ty) for ty in range(-2, 3) for tx in range(-2, 3)])
+    edges = delaunay.getEdges(delaunay.triangulate(nodes))
+    edges = delaunay.pruneEdges(nodes, edges, info.getMaximumLength(), info.getMinimumConnections())
+    ends = np.concatenate([nodes[edges[:, 0]], nodes[edges[:, 1]]], axis=1)
+    swap = (ends[:, 2] < ends[:, 0]) | ((ends[:, 2] == ends[:, 0]) & (ends[:, 3] < ends[:, 1]))
+    ends[swap] = ends[swap][:, [2, 3, 0, 1]]
+    for tx, ty in ((0, 0), (1, 0), (0, 1)):
+        owned = (ends[:, 0]//world.tileWidth == tx) & (ends[:, 1]//world.tileHeight == ty)
+        assert getEdgeSet(world.getEdges(tx, ty)) == getEdgeSet(ends[owned])
+
+
+def drawContinents(continents, left, top, width, height):
+    surface = pygame.Surface((width, height))
+    for points, color in continents:
+        pygame.draw.polygon(surface, color, [(x-left, y-top) for x, y in points])
+    return pygame.surfarray.array3d(surface)
+
+
+def test_neighbours_draw_the_same_continents():
+    world = TileWorld(getSettings(), seed=5)
+    # where the padded rasters of two neighbours overlap
+    area = (world.tileWidth - world.margin, -world.margin, 2*world.margin, world.tileHeight + 2*world.margin)
+    first = drawContinents(world.getReachingContinents(0, 0), *area)
+    second = drawContinents(world.getReachingContinents(1, 0), *area)
+    assert np.array_equal(first, second)
+
+
+def test_reach_covers_a_wide_margin():
+    world = TileWorld(getSettings(), seed=1, maxTiles=4)
+    assert world.margin < world.tileWidth//2 and (world.reachX, world.reachY) == (1, 1)
+    assert world.maxTiles == 49
+
+    # water wider than a tile pulls in continents from further away
+    world = TileWorld(MapSettings(200, 150, density_coefficient=5*10**6/128, waterLevels=4, waterWidth=50), seed=1)
+    assert world.margin > world.tileWidth and world.reachX >= 2 and world.reachY >= 2
+    x0, y0 = -world.margin, -world.margin
+    x1, y1 = world.tileWidth + world.margin, world.tileHeight + world.margin
+    # the nearest tiles just out of reach
+    for tx, ty in ((-world.reachX-1, 0), (world.reachX+1, 0), (0, -world.reachY-1), (0, world.reachY+1)):
+        for points, color in world.getContinents(tx, ty):
+            xs, ys = zip(*points)
+            assert max(xs) < x0 or min(xs) >= x1 or max(ys) < y0 or min(ys) >= y1
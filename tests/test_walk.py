@@ -0,0 +1,54 @@
+import random
+from mapclasses import MapSettings, WalkState
+from mapengine import MapEngine
+
+
+def getEngine():
+    engine = MapEngine(MapSettings(500, 375, density_coefficient=5*10**6/16), 3)
+    engine.seedStage('nodes')
+    engine.generateNodes()
+    return engine
+
+
+def test_steps_pick_among_candidates():
+    graph = getEngine().world.graph
+    rng = random.Random(0)
+    for homeId in graph.getRandomIds(20):
+        walk = WalkState(graph, homeId)
+        assert walk.close == set(graph.getCloseIds(homeId, 2).tolist())
+        for _ in range(60):
+            last = walk.path[-1]
+            candidates = [id for id in graph.getNeighbors()[last]
+                          if len(walk) == 1 or id == homeId or (id not in walk and id in walk.close)]
+
+            # the same pick as drawing from the filtered list with a copy of the generator
+            reference = random.Random()
+            reference.setstate(rng.getstate())
+            nextId = walk.getRandomNext(rng)
+            if not candidates:
+                assert nextId == -1
+                break
+            expected = reference.sample(candidates, 1)[0] if len(walk) == 1 else candidates[reference.randrange(len(candidates))]
+            assert nextId == expected
+            if nextId == homeId:
+                break
+            walk.append(nextId)
+
+        assert len(set(walk.path)) == len(walk.path)
+        assert [walk.index(id) for id in walk.path] == list(range(len(walk)))
+        assert walk.points == [graph.getNode(id) for id in walk.path]
+
+
+def test_continents_are_closed_walks():
+    engine = getEngine()
+    engine.seedStage('continents')
+    engine.generateMultipleContinents()
+    graph = engine.world.graph
+    ids = {graph.getNode(id): id for id in graph.getActiveIds().tolist()}
+    assert len(engine.world.continents) > 0
+    for continent in engine.world.continents:
+        path = [ids[point] for point in continent]
+        assert len(path) > engine.settings.getMinimumContinentSides()
+        assert len(set(path)) == len(path)
+        for a, b in zip(path, path[1:]+path[:1]):
+            assert graph.hasConnection(a, b)
@@ -0,0 +1,60 @@
+import pytest
+from mapclasses import MapSettings
+from mapengine import MapEngine
+from stagecache import StageCache
+from worldfile import loadWorld, readWorld, saveWorld
+
+
+def getSettings(**kwargs):
+    # the node count grows with the coefficient over the area, this keeps a half size map small
+    return MapSettings(500, 375, density_coefficient=5*10**6/16, **kwargs)
+
+
+def generate(seed=3, **kwargs):
+    engine = MapEngine(getSettings(**kwargs), seed)
+    engine.autoGenerate()
+    return engine
+
+
+def test_round_trip(tmp_path):
+    engine = generate()
+    filename = saveWorld(engine, tmp_path / 'map.world')
+    loaded = loadWorld(filename)
+
+    assert (loaded.world.graph.getEdges() == engine.world.graph.getEdges()).all()
+    assert loaded.world.graph.getNeighbors() == engine.world.graph.getNeighbors()
+    assert loaded.world.continents == engine.world.continents
+    assert [tuple(color) for color in loaded.world.continentColors] == [tuple(color) for color in engine.world.continentColors]
+    assert (loaded.getRaster() == engine.getRaster()).all()
+
+
+def test_reload_renders_the_same(tmp_path):
+    engine = generate()
+    loaded = loadWorld(saveWorld(engine, tmp_path / 'map.world', raster=False), raster=False)
+    loaded.render()
+    assert (loaded.getRaster() == engine.getRaster()).all()
+
+
+def test_generate_continents_after_load(tmp_path):
+    engine = generate()
+    loaded = loadWorld(saveWorld(engine, tmp_path / 'map.world'))
+    loaded.clearContinents()
+    loaded.generateMultipleContinents()
+    assert len(loaded.world.continents) > 0
+
+
+def test_continents_after_cached_nodes(tmp_path):
+    cache = StageCache(tmp_path / 'cache')
+    generate(numContinents=10).autoGenerate(cache)
+    engine = MapEngine(getSettings(numContinents=20), 3)
+    engine.autoGenerate(cache)
+    assert engine.profiler.counters['cache.hits'] == 1
+    # restored neighbours keep their order, so the walks match an uncached run
+    assert engine.world.continents == generate(numContinents=20).world.continents
+
+
+def test_refuses_other_files(tmp_path):
+    filename = tmp_path / 'other.world'
+    filename.write_bytes(b'not a world at all')
+    with pytest.raises(ValueError):
+        readWorld(filename)
@@ -7,7 +7,7 @@ graph = Graph(4)
 graph.addNode((4,5))
 graph.addNode((3,5))
 graph.addConnection(0,1)
-print(graph.matrix)
+print(graph.getMatrix())
 print(graph.nodes)
 print(type(graph.getNode(1)))
 print(graph.getConnections(1))
@@ -0,0 +1,203 @@
+import random
+from collections import OrderedDict
+import numpy as np
+import pygame
+import delaunay
+from faces import FaceIndex
+from mapclasses import Graph, MapSettings
+from mapengine import getStampReach, renderArea
+
+# An unbounded world cut into tiles the size of one map. Every layer of a tile
+# only depends on the world seed, the tile coordinates and the settings, so any
+# tile can be built on its own, in any order, and thrown away again:
+#   nodes       random points from the tile seed
+#   edges       the tile's share of a Delaunay graph over the tile and its neighbours' border nodes
+#   continents  faces merged in the graph around the tile, grown at most half a tile out
+#   raster      every continent that can reach the tile, drawn with a margin for water depth
+# Each layer keeps the last maxTiles results in memory, rasters can also go to a StageCache on disk.
+# maxTiles is raised to the window one raster reads, (2*reachX+5) by (2*reachY+5) tiles: continents
+# reach tiles out, their graphs read the edges one tile further and those the nodes one more. A smaller
+# working set would build the same tiles again for every raster.
+
+
+class TileWorld:
+    '''serves map tiles of an endless world on demand, keeping only a working set in memory'''
+
+    def __init__(self, settings: MapSettings, seed=0, maxTiles: int = 64, cache=None):
+
+        self.settings = settings
+        self.seed = seed
+        self.cache = cache
+
+        self.tileWidth = settings.map_width
+        self.tileHeight = settings.win_height
+        # water depth reaches getWaterMinLength out from the coast, roughening stamps getStampReach past that
+        self.margin = settings.getWaterMinLength() + getStampReach(settings)
+        # continents grow half a tile past their own, so those of tiles this far away can touch the padded raster
+        self.reachX = -(-(self.tileWidth//2 + self.margin)//self.tileWidth)
+        self.reachY = -(-(self.tileHeight//2 + self.margin)//self.tileHeight)
+        self.maxTiles = max(maxTiles, (2*self.reachX+5)*(2*self.reachY+5))
+
+        self.layers = {'nodes': OrderedDict(), 'edges': OrderedDict(), 'continents': OrderedDict(),
+                       'raster': OrderedDict()}
+
+    def getTileSeed(self, tx: int, ty: int, stage: str):
+        return f'{self.seed}:{tx}:{ty}:{stage}'
+
+    def getTileAt(self, x: int, y: int):
+        return x//self.tileWidth, y//self.tileHeight
+
+    def getCached(self, layer: str, tx: int, ty: int, build):
+        store = self.layers[layer]
+        key = (tx, ty)
+        if key in store:
+            store.move_to_end(key)
+            return store[key]
+        value = build(tx, ty)
+        store[key] = value
+        if len(store) > self.maxTiles:
+            store.popitem(last=False)
+        return value
+
+    def getNodes(self, tx: int, ty: int):
+        '''(n, 2) world coordinates of the tile's nodes'''
+        return self.getCached('nodes', tx, ty, self.buildNodes)
+
+    def buildNodes(self, tx: int, ty: int):
+        rng = random.Random(self.getTileSeed(tx, ty, 'nodes'))
+        generator = np.random.default_rng(rng.getrandbits(64))
+        amount = self.settings.getNumPoints()
+        nodes = np.empty((amount, 2), dtype=np.int64)
+        nodes[:, 0] = generator.integers(0, self.tileWidth, size=amount) + tx*self.tileWidth
+        nodes[:, 1] = generator.integers(0, self.tileHeight, size=amount) + ty*self.tileHeight
+        return nodes
+
+    def getWindowNodes(self, tx: int, ty: int, border=None):
+        '''nodes of the tile and its 8 neighbours, or only the neighbours' nodes within border of the tile'''
+        nodes = np.concatenate([self.getNodes(tx+dx, ty+dy) for dy in (-1, 0, 1) for dx in (-1, 0, 1)])
+        if border is None:
+            return nodes
+        x0, y0 = tx*self.tileWidth, ty*self.tileHeight
+        inside = ((nodes[:, 0] >= x0-border) & (nodes[:, 0] < x0+self.tileWidth+border) &
+                  (nodes[:, 1] >= y0-border) & (nodes[:, 1] < y0+self.tileHeight+border))
+        return nodes[inside]
+
+    def getEdges(self, tx: int, ty: int):
+        '''(m, 4) x1, y1, x2, y2 of the edges this tile owns
+
+        An edge belongs to the tile holding its smaller endpoint, and only that tile
+        decides whether it survives pruning, so neighbours always agree on the seam.
+        '''
+        return self.getCached('edges', tx, ty, self.buildEdges)
+
+    def buildEdges(self, tx: int, ty: int):
+        info = self.settings
+        # the triangulation and pruning around a node only depend on nodes a few edges away,
+        # so a strip of the neighbours' border nodes is enough to get the seam right
+        nodes = self.getWindowNodes(tx, ty, 4*info.getMaximumLength())
+        edges = delaunay.getEdges(delaunay.triangulate(nodes))
+        edges = delaunay.pruneEdges(nodes, edges, info.getMaximumLength(), info.getMinimumConnections())
+
+        ends = np.concatenate([nodes[edges[:, 0]], nodes[edges[:, 1]]], axis=1)
+        # order every edge so its smaller endpoint comes first
+        swap = (ends[:, 2] < ends[:, 0]) | ((ends[:, 2] == ends[:, 0]) & (ends[:, 3] < ends[:, 1]))
+        ends[swap] = ends[swap][:, [2, 3, 0, 1]]
+        owned = (ends[:, 0]//self.tileWidth == tx) & (ends[:, 1]//self.tileHeight == ty)
+        return ends[owned]
+
+    def getGraph(self, tx: int, ty: int):
+        '''Graph over the 3x3 tiles around a tile with every edge their owners kept'''
+        nodes = self.getWindowNodes(tx, ty)
+        graph = Graph(len(nodes))
+        graph.addNodes(nodes)
+
+        ids = {}
+        for id, point in enumerate(map(tuple, nodes.tolist())):
+            ids.setdefault(point, id)
+        for dy in (-1, 0, 1):
+            for dx in (-1, 0, 1):
+                for x1, y1, x2, y2 in self.getEdges(tx+dx, ty+dy).tolist():
+                    id1, id2 = ids.get((x1, y1)), ids.get((x2, y2))
+                    if id1 is not None and id2 is not None:
+                        graph.addConnection(id1, id2)
+        return graph
+
+    def getContinents(self, tx: int, ty: int):
+        '''(points, color) of the continents seeded in this tile, colors already shaded'''
+        return self.getCached('continents', tx, ty, self.buildContinents)
+
+    def buildContinents(self, tx: int, ty: int):
+        info = self.settings
+        rng = random.Random(self.getTileSeed(tx, ty, 'continents'))
+        colorRng = random.Random(self.getTileSeed(tx, ty, 'colors'))
+        graph = self.getGraph(tx, ty)
+
+        # faces further out than half a tile may be cut by the window, and stay out of reach
+        x0, y0 = tx*self.tileWidth, ty*self.tileHeight
+        faces = FaceIndex(graph)
+        faces.limitTo(x0 - self.tileWidth//2, y0 - self.tileHeight//2,
+                      x0 + self.tileWidth*3//2, y0 + self.tileHeight*3//2)
+
+        continents = []
+        amount = info.getNumContinents()
+        for i in range(amount):
+            point = (x0 + rng.randint(0, self.tileWidth-1), y0 + rng.randint(0, self.tileHeight-1))
+            ids = faces.findContinent(point, info.getMinimumContinentSides(), rng)
+            if ids is None:
+                break
+            points = [graph.getNode(id) for id in ids]
+            color = info.getSemiRandomColor((points[0][1]-y0)/self.tileHeight, colorRng)
+            coefficient = max((i/amount)**0.8, 0.5)
+            color = pygame.Color(color)
+            continents.append((points, (int(coefficient*color.r), int(coefficient*color.g), int(coefficient*color.b))))
+        return continents
+
+    def getTile(self, tx: int, ty: int):
+        '''(tileWidth, tileHeight, 3) pixels of a tile, [x, y] like pygame.surfarray'''
+        return self.getCached('raster', tx, ty, self.loadTile)
+
+    def getStageInputs(self, tx: int, ty: int):
+        info = self.settings
+        return {'seed': str(self.seed), 'tile': [tx, ty], 'width': self.tileWidth, 'height': self.tileHeight,
+                'points': info.getNumPoints(), 'distance': info.getMaximumLength(),
+                'connections': info.getMinimumConnections(), 'sides': info.getMinimumContinentSides(),
+                'continents': info.getNumContinents(), 'palette': info.palette, 'levels': info.getWaterLevels(),
+                'waterWidth': info.getWaterWidth(), 'shape': info.shape}
+
+    def loadTile(self, tx: int, ty: int):
+        key = None
+        if self.cache is not None:
+            key = self.cache.key('tile', self.getStageInputs(tx, ty))
+            stored = self.cache.load(key)
+            if stored is not None:
+                return stored['raster']
+
+        raster = self.buildTile(tx, ty)
+        if self.cache is not None:
+            self.cache.store(key, raster=raster)
+        return raster
+
+    def getReachingContinents(self, tx: int, ty: int):
+        '''(points, color) of every continent that may be drawn within margin of the tile'''
+        # in row order of their owners, so overlaps are stacked the same way in every tile
+        return [continent for dy in range(-self.reachY, self.reachY+1) for dx in range(-self.reachX, self.reachX+1)
+                for continent in self.getContinents(tx+dx, ty+dy)]
+
+    def buildTile(self, tx: int, ty: int):
+        continents = self.getReachingContinents(tx, ty)
+        return renderArea(self.settings, continents, tx*self.tileWidth, ty*self.tileHeight,
+                          self.tileWidth, self.tileHeight, self.margin, self.getTileSeed(tx, ty, 'raster'))
+
+    def getRegion(self, x: int, y: int, width: int, height: int):
+        '''(width, height, 3) pixels of any area of the world, put together from tiles'''
+        region = np.empty((width, height, 3), dtype=np.uint8)
+        firstX, firstY = self.getTileAt(x, y)
+        lastX, lastY = self.getTileAt(x+width-1, y+height-1)
+        for ty in range(firstY, lastY+1):
+            for tx in range(firstX, lastX+1):
+                tile = self.getTile(tx, ty)
+                x0, y0 = tx*self.tileWidth, ty*self.tileHeight
+                left, top = max(x, x0), max(y, y0)
+                right, bottom = min(x+width, x0+self.tileWidth), min(y+height, y0+self.tileHeight)
+                region[left-x:right-x, top-y:bottom-y] = tile[left-x0:right-x0, top-y0:bottom-y0]
+        return region
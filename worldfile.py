@@ -0,0 +1,86 @@
+import json
+import os
+import numpy as np
+from mapclasses import MapSettings
+from mapengine import MapEngine
+
+# A world file holds everything a generated map is made of, the graph, continents,
+# their colors, the coast distance and optionally the finished pixels, so the map can
+# be drawn again in another style or exported without generating it again, e.g.
+#   saveWorld(engine, 'export/islands.world')
+#   engine = loadWorld('export/islands.world')
+#
+# Layout: magic, uint32 header length, JSON header, then every array as raw bytes
+# starting on a 64 byte boundary. The header holds the format version, the seed and
+# settings and the dtype, shape and offset of each array. Loading maps the file
+# copy-on-write, the arrays are views of it and only the pages that are used get read.
+
+magic = b'MAPWORLD'
+version = 1
+alignment = 64
+
+
+def getAligned(offset: int):
+    return -(-offset//alignment)*alignment
+
+
+def writeWorld(filename, header: dict, arrays: dict):
+    '''writes header and arrays as a world file, returns filename'''
+    arrays = {name: np.ascontiguousarray(array) for name, array in arrays.items()}
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        layout[name] = {'dtype': array.dtype.str, 'shape': list(array.shape), 'offset': offset}
+        offset = getAligned(offset + array.nbytes)
+
+    text = json.dumps(dict(header, version=version, arrays=layout)).encode()
+    start = getAligned(len(magic) + 4 + len(text))
+
+    temporary = f'{filename}.{os.getpid()}.tmp'
+    with open(temporary, 'wb') as file:
+        file.write(magic)
+        file.write(np.uint32(len(text)).tobytes())
+        file.write(text)
+        for name, array in arrays.items():
+            file.seek(start + layout[name]['offset'])
+            file.write(array.data)
+        file.truncate(start + offset)
+    # rename is atomic, a reader never sees half a file
+    os.replace(temporary, filename)
+    return filename
+
+
+def readWorld(filename):
+    '''(header, arrays) of a world file, the arrays are copy-on-write memory maps of it'''
+    with open(filename, 'rb') as file:
+        if file.read(len(magic)) != magic:
+            raise ValueError(f'{filename} is not a world file')
+        length = int(np.frombuffer(file.read(4), dtype=np.uint32)[0])
+        header = json.loads(file.read(length))
+
+    if header['version'] > version:
+        raise ValueError(f"{filename} has world file version {header['version']}, this reads up to {version}")
+
+    start = getAligned(len(magic) + 4 + length)
+    mapped = np.memmap(filename, dtype=np.uint8, mode='c')
+    arrays = {}
+    for name, info in header.pop('arrays').items():
+        dtype = np.dtype(info['dtype'])
+        shape = tuple(info['shape'])
+        first = start + info['offset']
+        arrays[name] = mapped[first:first + int(np.prod(shape))*dtype.itemsize].view(dtype).reshape(shape)
+    return header, arrays
+
+
+def saveWorld(engine, filename, raster=True):
+    '''writes the engine's world, with raster also its pixels, returns filename'''
+    header, arrays = engine.packWorld(raster)
+    return writeWorld(filename, header, arrays)
+
+
+def loadWorld(filename, raster=True):
+    '''a MapEngine with the saved world, with raster also its saved pixels'''
+    header, arrays = readWorld(filename)
+    engine = MapEngine(MapSettings(**header['settings']), header['seed'], header['indexed'])
+    engine.restoreWorld(header, arrays, raster)
+    return engine